@@ -87,8 +87,17 @@ with app.app_context():
     from middleware.ip_filter import init_ip_filter
     init_ip_filter(app)
     
+    # WAL, busy timeout and cache settings for a local SQLite database
+    from services.sqlite_tuning import configure_sqlite
+    configure_sqlite(db.engine)
+    
     try:
         db.create_all()
+        
+        # Bring tables created by older versions up to date with the models
+        from services.schema_upgrade import upgrade_schema
+        upgrade_schema(db)
+        
         logging.info("Database tables created successfully")
         
         # Создание суперадмина по умолчанию
@@ -121,13 +130,27 @@ with app.app_context():
     except Exception as e:
         logging.error(f"Failed to add server IP to whitelist: {str(e)}")
     
-    # Start the ping scheduler
-    try:
-        from services.ping_scheduler import start_scheduler
-        start_scheduler()
-        logging.info("Ping scheduler started successfully")
-    except Exception as e:
-        logging.error(f"Scheduler start failed: {str(e)}")
+    # Start the ping scheduler here, or relay events from the probe daemon
+    # when it runs in its own process (probe_daemon.py starts it there)
+    from services.probe_ipc import worker_mode, WORKER_EMBEDDED, WORKER_EXTERNAL
+    probe_worker = worker_mode()
+    if probe_worker == WORKER_EMBEDDED:
+        try:
+            from services.ping_scheduler import start_scheduler, stop_scheduler, sync_settings
+            from services.scheduler_leader import create_lock, start_leader_election
+            # Several workers (gunicorn) import the app: only the one holding the
+            # lock runs the scheduler, another takes over if it dies
+            election = start_leader_election(create_lock(db.engine, app.instance_path),
+                                             on_elected=start_scheduler, on_lost=stop_scheduler,
+                                             on_tick=sync_settings)
+            if election.is_leader:
+                logging.info("Ping scheduler started successfully")
+        except Exception as e:
+            logging.error(f"Scheduler start failed: {str(e)}")
+    elif probe_worker == WORKER_EXTERNAL:
+        from services.probe_ipc import start_event_relay
+        start_event_relay(socketio.emit)
+        logging.info("Ping scheduler runs in the probe daemon, relaying its events")
 
 # Error handlers
 @app.errorhandler(404)
@@ -1,5 +1,7 @@
+import hmac
+import os
 from functools import wraps
-from flask import redirect, url_for, flash, request, abort
+from flask import redirect, url_for, flash, request, abort, jsonify
 from flask_login import current_user
 from models import UserRole, AuditLog
 
@@ -90,4 +92,21 @@ def rate_limit(max_attempts=5, window_minutes=15):
             
             return f(*args, **kwargs)
         return decorated_function
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def agent_token_required(f):
+    """Декоратор для API агентов пинга: заголовок Authorization: Bearer <AGENT_TOKEN>.
+    Без AGENT_TOKEN в окружении распределённый опрос выключен"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = os.environ.get('AGENT_TOKEN')
+        if not token:
+            return jsonify({'error': 'distributed probing is disabled'}), 404
+        
+        provided = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(provided.encode('utf-8'), f'Bearer {token}'.encode('utf-8')):
+            return jsonify({'error': 'invalid agent token'}), 401
+        
+        return f(*args, **kwargs)
+    return decorated_function
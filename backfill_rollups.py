@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Заполнение таблицы свёрток (минута/час/день) и таблицы смен статуса
+по уже накопленным записям ping_log.
+
+Новые результаты попадают в свёртки при записи, и первая такая запись отмечает
+время своей пробы: первый запуск обрабатывает только записи до этой отметки.
+Если свёртки велись ещё до появления отметки, граница каждого разрешения - его
+самая ранняя свёртка. Границы и ход работы сохраняются в таблице backfill_state
+вместе с каждой порцией: повторный запуск (в том числе после того, как очистка
+удалила старые свёртки) и продолжение после сбоя не учтут запись дважды.
+С --rebuild свёртки удаляются и строятся заново из всего ping_log (подходит для
+полного режима хранения: в компактном ping_log хранит только смены статуса).
+Смены статуса (--transitions) восстанавливаются так же - только до самой ранней
+записанной на момент первого запуска смены.
+
+Запуск (та же база, что у веб-сервера):
+    python backfill_rollups.py [--rebuild] [--chunk 50000]
+    python backfill_rollups.py --transitions
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем директорию проекта в PATH
+project_dir = Path(__file__).parent
+sys.path.insert(0, str(project_dir))
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///network_monitor.db')
+# Планировщик в этом процессе не нужен
+os.environ['PROBE_WORKER'] = 'daemon'
+
+try:
+    from sqlalchemy import and_, func, or_, select
+    from app import app, db
+    from models import BackfillState, PingLog, PingRollup, ROLLUP_RESOLUTIONS, StatusTransition
+    from services.rollups import LIVE_MARKER, mark_rollups_live, merge_rollups, rollup_rows
+except ImportError as e:
+    print(f"❌ Ошибка импорта: {e}")
+    print("💡 Убедитесь, что установлены все зависимости:")
+    print("   pip install flask flask-sqlalchemy flask-login flask-socketio ping3 netifaces apscheduler "
+          "flask-wtf werkzeug openpyxl flask-bcrypt pyjwt")
+    sys.exit(1)
+
+
+TRANSITIONS_TARGET = 'status_transition'
+
+
+def rollup_target(resolution):
+    return f'rollup_{resolution}'
+
+
+def backfill_transitions(chunk):
+    """Смены статуса по ping_log: по каждому адресу в порядке времени, порциями"""
+    log = PingLog.__table__
+    state = BackfillState.query.filter_by(target=TRANSITIONS_TARGET).first()
+    if state is None:
+        # Граница фиксируется первым запуском: очистка потом может удалить старые смены
+        state = BackfillState(target=TRANSITIONS_TARGET,
+                              until=db.session.execute(select(func.min(StatusTransition.timestamp))).scalar())
+        db.session.add(state)
+        db.session.commit()
+    if state.completed:
+        print("✅ Смены статуса уже восстановлены")
+        return
+    until = state.until
+    if until is not None:
+        print(f"📅 Смены статуса до {until.isoformat()} (дальше они уже записываются)")
+
+    started = time.perf_counter()
+    processed = 0
+    written = 0
+    address_ids = db.session.execute(
+        select(log.c.network_address_id).where(log.c.network_address_id > state.last_id)
+        .distinct().order_by(log.c.network_address_id)
+    ).scalars().all()
+    for address_id in address_ids:
+        conditions = [log.c.network_address_id == address_id, log.c.timestamp.is_not(None)]
+        if until is not None:
+            conditions.append(log.c.timestamp < until)
+        old_status = None
+        last = None
+        transitions = []
+        while True:
+            # Постранично по (время, id), без открытого курсора; смены адреса пишутся
+            # одной транзакцией вместе с отметкой о ходе работы
+            query = select(log.c.id, log.c.timestamp, log.c.status, log.c.response_time,
+                           log.c.error_message).where(*conditions)
+            if last is not None:
+                query = query.where(or_(log.c.timestamp > last.timestamp,
+                                        and_(log.c.timestamp == last.timestamp, log.c.id > last.id)))
+            rows = db.session.execute(query.order_by(log.c.timestamp, log.c.id).limit(chunk)).all()
+            if not rows:
+                break
+
+            for row in rows:
+                if row.status != old_status:
+                    transitions.append({
+                        'network_address_id': address_id,
+                        'old_status': old_status,
+                        'new_status': row.status,
+                        'timestamp': row.timestamp,
+                        'response_time': row.response_time,
+                        'error_message': row.error_message
+                    })
+                    old_status = row.status
+            processed += len(rows)
+            last = rows[-1]
+        if transitions:
+            db.session.execute(StatusTransition.__table__.insert(), transitions)
+        state.last_id = address_id
+        db.session.commit()
+        written += len(transitions)
+        print(f"   ... {processed} записей, {processed / (time.perf_counter() - started):.0f} записей/сек")
+
+    state.completed = True
+    db.session.commit()
+    print(f"✅ Обработано записей ping_log: {processed}, смен статуса: {written}")
+
+
+def rollup_states(rebuild):
+    """Границы и ход заполнения по разрешениям; создаются первым запуском"""
+    targets = [rollup_target(resolution) for resolution in ROLLUP_RESOLUTIONS]
+    if rebuild:
+        # В одной транзакции: свёртки удалены, граница - сейчас; дальше они растут при записи
+        deleted = db.session.execute(PingRollup.__table__.delete()).rowcount
+        db.session.execute(BackfillState.__table__.delete().where(BackfillState.target.in_(targets)))
+        now = datetime.utcnow()
+        for target in targets:
+            db.session.add(BackfillState(target=target, until=now))
+        db.session.commit()
+        print(f"🗑️ Удалено свёрток: {deleted}")
+
+    states = {state.target: state for state in BackfillState.query.filter(BackfillState.target.in_(targets))}
+    missing = [resolution for resolution in ROLLUP_RESOLUTIONS if rollup_target(resolution) not in states]
+    if missing:
+        # Нет отметки - свёртки при записи ещё не велись, и граница - этот момент
+        mark_rollups_live(db.session, datetime.utcnow())
+        db.session.commit()
+        live_since = BackfillState.query.filter_by(target=LIVE_MARKER).one().until
+    for resolution in missing:
+        until = live_since
+        if until is None:
+            # Начало записи неизвестно: разрешение заполняется до своей самой ранней
+            # свёртки (у каждого свой срок хранения)
+            until = db.session.execute(
+                select(func.min(PingRollup.bucket_start)).where(PingRollup.resolution == resolution)
+            ).scalar()
+        states[rollup_target(resolution)] = BackfillState(target=rollup_target(resolution), until=until)
+        db.session.add(states[rollup_target(resolution)])
+    db.session.commit()
+    return {resolution: states[rollup_target(resolution)] for resolution in ROLLUP_RESOLUTIONS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заполнение свёрток RTT и доступности по ping_log')
+    parser.add_argument('--rebuild', action='store_true', help='Удалить свёртки и построить заново')
+    parser.add_argument('--transitions', action='store_true', help='Восстановить смены статуса вместо свёрток')
+    parser.add_argument('--chunk', type=int, default=50000, help='Записей ping_log за одну транзакцию')
+    args = parser.parse_args()
+
+    log = PingLog.__table__
+    with app.app_context():
+        db.create_all()
+
+        if args.transitions:
+            backfill_transitions(args.chunk)
+            return
+
+        states = {resolution: state for resolution, state in rollup_states(args.rebuild).items()
+                  if not state.completed}
+        if not states:
+            print("✅ Свёртки уже заполнены")
+            return
+
+        query = select(log.c.id, log.c.network_address_id, log.c.timestamp, log.c.status, log.c.response_time)
+        if all(state.until is not None for state in states.values()):
+            query = query.where(log.c.timestamp < max(state.until for state in states.values()))
+        for resolution, state in states.items():
+            if state.until is not None:
+                print(f"📅 Разрешение {resolution} сек: записи до {state.until.isoformat()} "
+                      f"(дальше свёртки уже ведутся при записи)")
+
+        started = time.perf_counter()
+        last_id = min(state.last_id for state in states.values())
+        processed = 0
+        while True:
+            # Постранично по id: без OFFSET и без загрузки всей таблицы в память
+            rows = db.session.execute(
+                query.where(log.c.id > last_id).order_by(log.c.id).limit(args.chunk)
+            ).all()
+            if not rows:
+                break
+            for resolution, state in states.items():
+                merge_rollups(db.session, rollup_rows((
+                    (row.network_address_id, row.timestamp, row.status, row.response_time)
+                    for row in rows if row.timestamp is not None and row.id > state.last_id
+                    and (state.until is None or row.timestamp < state.until)
+                ), (resolution,)))
+            last_id = rows[-1].id
+            for state in states.values():
+                state.last_id = last_id
+            # Свёртки и отметка о ходе работы - в одной транзакции
+            db.session.commit()
+            processed += len(rows)
+            print(f"   ... {processed} записей, {processed / (time.perf_counter() - started):.0f} записей/сек")
+
+        for state in states.values():
+            state.completed = True
+        db.session.commit()
+
+        total = db.session.execute(select(func.count()).select_from(PingRollup.__table__)).scalar()
+        print(f"✅ Обработано записей ping_log: {processed}, строк свёрток: {total}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Замер скорости записи результатов пинга: прежний путь через ORM
+(объект PingLog на каждый результат и обновление адресов через identity map)
+против пакетной записи Core executemany из планировщика.
+
+Запуск (по умолчанию - временная база SQLite, можно указать свою через DATABASE_URL):
+    python bench_ping_writes.py [количество адресов]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем директорию проекта в PATH
+project_dir = Path(__file__).parent
+sys.path.insert(0, str(project_dir))
+
+bench_db = None
+if 'DATABASE_URL' not in os.environ:
+    bench_db = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{bench_db}'
+# Планировщик в этом процессе не нужен
+os.environ['PROBE_WORKER'] = 'daemon'
+
+from app import app, db
+from models import NetworkAddress, PingLog
+from services import ping_scheduler
+
+BENCH_NETWORK = '198.18'  # диапазон для тестов (RFC 2544), не пересекается с реальными адресами
+
+
+def make_results(addresses, status):
+    now = datetime.now()
+    return [{
+        'ip_address': address.ip_address,
+        'status': status,
+        'response_time': 1.5 if status == 'up' else None,
+        'error_message': None,
+        'timestamp': now
+    } for address in addresses]
+
+
+def orm_write(addresses, results):
+    """Прежняя запись: ORM-объекты и поиск адреса перебором списка"""
+    for result in results:
+        address = next(addr for addr in addresses if addr.ip_address == result['ip_address'])
+        address.last_status = result['status']
+        address.last_ping_time = result['timestamp']
+        address.consecutive_failures = 0 if result['status'] == 'up' else (address.consecutive_failures or 0) + 1
+        db.session.add(PingLog(
+            network_address_id=address.id,
+            status=result['status'],
+            response_time=result['response_time'],
+            error_message=result.get('error_message')
+        ))
+    db.session.commit()
+
+
+def bulk_write(addresses, results):
+    """Текущая запись планировщика: снимок адресов, буфер записи и Core executemany"""
+    ping_scheduler._persist_results(results, addresses, dashboard_update=False)
+    ping_scheduler.result_writer.flush()
+
+
+def run(name, writer, count, status):
+    addresses = NetworkAddress.query.filter(NetworkAddress.ip_address.like(f'{BENCH_NETWORK}.%')).all()
+    results = make_results(addresses, status)
+    started = time.perf_counter()
+    writer(addresses, results)
+    duration = time.perf_counter() - started
+    print(f"{name:<24} {count:>7} rows  {duration:8.2f}s  {count / duration:10.0f} rows/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    # Отправку событий в WebSocket не измеряем
+    ping_scheduler.event_publisher = lambda event, data: None
+
+    with app.app_context():
+        db.session.execute(PingLog.__table__.delete().where(PingLog.network_address_id.in_(
+            db.session.query(NetworkAddress.id).filter(NetworkAddress.ip_address.like(f'{BENCH_NETWORK}.%'))
+        )))
+        NetworkAddress.query.filter(NetworkAddress.ip_address.like(f'{BENCH_NETWORK}.%')).delete(
+            synchronize_session=False)
+        db.session.add_all(NetworkAddress(ip_address=f'{BENCH_NETWORK}.{i // 250}.{i % 250 + 1}',
+                                          group_name='bench', last_status='unknown')
+                           for i in range(count))
+        db.session.commit()
+
+        print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+        # Чередуем статусы, чтобы каждый прогон менял статус всех адресов
+        run('ORM (before)', orm_write, count, 'up')
+        db.session.expunge_all()
+        run('Core executemany (after)', bulk_write, count, 'down')
+
+        db.session.execute(PingLog.__table__.delete().where(PingLog.network_address_id.in_(
+            db.session.query(NetworkAddress.id).filter(NetworkAddress.ip_address.like(f'{BENCH_NETWORK}.%'))
+        )))
+        NetworkAddress.query.filter(NetworkAddress.ip_address.like(f'{BENCH_NETWORK}.%')).delete(
+            synchronize_session=False)
+        db.session.commit()
+
+    if bench_db:
+        os.remove(bench_db)
+
+
+if __name__ == '__main__':
+    main()
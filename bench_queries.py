@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Замер запросов страниц с большой историей: /, /api/status, счётчики панели,
+/logs и /audit_log. Для каждого запроса печатается план СУБД и задержка -
+с индексами из моделей и (по умолчанию) без составных индексов для сравнения.
+
+База заполняется воспроизводимо (фиксированный seed): адреса из тестового
+диапазона, миллионы записей ping_log, агрегаты, смены статуса и журнал аудита.
+По умолчанию - временная база SQLite; PostgreSQL - через DATABASE_URL
+(отдельная пустая база: в ней не должно быть других адресов).
+
+Запуск:
+    python bench_queries.py [--logs 2000000] [--addresses 2000] [--repeat 5]
+    python bench_queries.py --keep --database bench.db   # база остаётся для повторных прогонов
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем директорию проекта в PATH
+project_dir = Path(__file__).parent
+sys.path.insert(0, str(project_dir))
+
+parser = argparse.ArgumentParser(description='План и задержка запросов страниц на большой истории')
+parser.add_argument('--addresses', type=int, default=2000, help='Адресов (активных - 90%%)')
+parser.add_argument('--logs', type=int, default=2000000, help='Записей ping_log')
+parser.add_argument('--audit', type=int, default=200000, help='Записей журнала аудита')
+parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого запроса')
+parser.add_argument('--database', help='Файл SQLite вместо временного (без DATABASE_URL)')
+parser.add_argument('--keep', action='store_true', help='Не удалять тестовые данные после замера')
+parser.add_argument('--no-compare', action='store_true', help='Не замерять без составных индексов')
+args = parser.parse_args()
+
+bench_db = None
+if 'DATABASE_URL' not in os.environ:
+    bench_db = args.database or os.path.join(tempfile.mkdtemp(), 'bench_queries.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(bench_db)}'
+# Планировщик в этом процессе не нужен
+os.environ['PROBE_WORKER'] = 'daemon'
+
+try:
+    from sqlalchemy import func, select, text
+    from app import app, db
+    from models import AuditLog, NetworkAddress, PingLog, PingSample, StatusTransition, User, UserRole
+except ImportError as e:
+    print(f"❌ Ошибка импорта: {e}")
+    print("💡 Убедитесь, что установлены все зависимости:")
+    print("   pip install flask flask-sqlalchemy flask-login flask-socketio ping3 netifaces apscheduler "
+          "flask-wtf werkzeug openpyxl flask-bcrypt pyjwt")
+    sys.exit(1)
+
+BENCH_NETWORK = '198.18'  # диапазон для тестов (RFC 2544), не пересекается с реальными адресами
+BENCH_USER_PREFIX = 'bench_user_'
+BENCH_SEED = 2024
+SEED_CHUNK = 50000
+HISTORY_DAYS = 30
+
+# Индексы, без которых делается сравнительный прогон (одностолбцовые индексы времени остаются)
+COMPARED_INDEXES = (
+    'ix_ping_log_address_time',
+    'ix_ping_sample_address_window',
+    'ix_network_address_status_active',
+    'ix_network_address_active_priority',
+    'ix_audit_log_timestamp',
+    'ix_audit_log_user_time'
+)
+
+
+def bench_address_ids():
+    return select(NetworkAddress.id).where(NetworkAddress.ip_address.like(f'{BENCH_NETWORK}.%'))
+
+
+def insert_chunks(table, rows):
+    """Вставка генератора строк порциями по SEED_CHUNK, каждая - в своей транзакции"""
+    chunk = []
+    total = 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= SEED_CHUNK:
+            db.session.execute(table.insert(), chunk)
+            db.session.commit()
+            total += len(chunk)
+            chunk = []
+            print(f"   ... {table.name}: {total}", end='\r')
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+        total += len(chunk)
+    print(f"   ✅ {table.name}: {total}        ")
+
+
+def seeded():
+    """Данные уже есть с теми же объёмами (прогон с --keep)"""
+    addresses = db.session.execute(select(func.count()).select_from(bench_address_ids().subquery())).scalar()
+    if addresses != args.addresses:
+        return False
+    logs = db.session.execute(select(func.count()).select_from(PingLog).where(
+        PingLog.network_address_id.in_(bench_address_ids()))).scalar()
+    return logs == args.logs
+
+
+def cleanup():
+    address_ids = bench_address_ids()
+    for model in (PingLog, PingSample, StatusTransition):
+        db.session.execute(model.__table__.delete().where(model.network_address_id.in_(address_ids)))
+    db.session.execute(NetworkAddress.__table__.delete().where(NetworkAddress.ip_address.like(f'{BENCH_NETWORK}.%')))
+    bench_users = select(User.id).where(User.username.like(f'{BENCH_USER_PREFIX}%'))
+    db.session.execute(AuditLog.__table__.delete().where(AuditLog.user_id.in_(bench_users)))
+    db.session.execute(User.__table__.delete().where(User.username.like(f'{BENCH_USER_PREFIX}%')))
+    db.session.commit()
+
+
+def seed():
+    other = db.session.execute(select(func.count()).select_from(NetworkAddress).where(
+        NetworkAddress.ip_address.notlike(f'{BENCH_NETWORK}.%'))).scalar()
+    if other:
+        print("❌ В базе есть рабочие адреса - укажите для замера отдельную базу")
+        sys.exit(1)
+
+    cleanup()
+    rng = random.Random(BENCH_SEED)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=HISTORY_DAYS)
+    span = HISTORY_DAYS * 86400
+    statuses = ('up',) * 8 + ('down', 'error')
+
+    print(f"🌱 Заполнение: {args.addresses} адресов, {args.logs} записей ping_log, {args.audit} записей аудита")
+    insert_chunks(NetworkAddress.__table__, ({
+        'ip_address': f'{BENCH_NETWORK}.{i // 250}.{i % 250 + 1}',
+        'group_name': f'bench {i % 20}',
+        'is_active': i % 10 != 0,
+        'last_status': rng.choice(statuses),
+        'last_ping_time': now,
+        'consecutive_failures': 0,
+        'priority': 1 if i % 50 == 0 else 0,
+        'created_at': start,
+        'updated_at': now
+    } for i in range(args.addresses)))
+    address_ids = db.session.execute(bench_address_ids().order_by(NetworkAddress.id)).scalars().all()
+
+    # Время растёт с id, как при записи планировщиком
+    step = span / max(args.logs, 1)
+    insert_chunks(PingLog.__table__, ({
+        'network_address_id': address_ids[i % len(address_ids)],
+        'status': status,
+        'response_time': round(rng.lognormvariate(2, 1), 3) if status == 'up' else None,
+        'error_message': None if status == 'up' else 'Request timed out',
+        'timestamp': start + timedelta(seconds=i * step)
+    } for i, status in ((i, rng.choice(statuses)) for i in range(args.logs))))
+
+    windows = max(args.logs // len(address_ids) // 10, 1)
+    insert_chunks(PingSample.__table__, ({
+        'network_address_id': address_id,
+        'window_start': start + timedelta(seconds=window * span // windows),
+        'window_seconds': 300,
+        'probes': 10,
+        'lost': rng.choice((0, 0, 0, 1, 10)),
+        'rtt_min': 1.0,
+        'rtt_avg': 5.0,
+        'rtt_max': 20.0
+    } for window in range(windows) for address_id in address_ids))
+
+    transitions = max(args.logs // 50, 1)
+    insert_chunks(StatusTransition.__table__, ({
+        'network_address_id': address_ids[i % len(address_ids)],
+        'old_status': 'up' if i % 2 else 'down',
+        'new_status': 'down' if i % 2 else 'up',
+        'timestamp': start + timedelta(seconds=i * span / transitions)
+    } for i in range(transitions)))
+
+    insert_chunks(User.__table__, ({
+        'username': f'{BENCH_USER_PREFIX}{i}',
+        'password_hash': '-',
+        'role': UserRole.USER,
+        'is_active': True,
+        'created_at': start,
+        'login_attempts': 0
+    } for i in range(20)))
+    user_ids = db.session.execute(select(User.id).where(
+        User.username.like(f'{BENCH_USER_PREFIX}%')).order_by(User.id)).scalars().all()
+    actions = ('Вход в систему', 'Выход из системы', 'Добавлен адрес', 'Изменены настройки', 'Удален адрес')
+    insert_chunks(AuditLog.__table__, ({
+        'user_id': rng.choice(user_ids),
+        'action': rng.choice(actions),
+        'details': None,
+        'ip_address': '127.0.0.1',
+        'user_agent': 'bench',
+        'timestamp': start + timedelta(seconds=i * span / max(args.audit, 1))
+    } for i in range(args.audit)))
+
+
+def analyze():
+    """Свежая статистика для планировщика запросов"""
+    db.session.commit()
+    with db.engine.connect() as connection:
+        connection.execution_options(isolation_level='AUTOCOMMIT').execute(text('ANALYZE'))
+
+
+def count_of(query):
+    """Тот же запрос, что строит Query.count()"""
+    return select(func.count()).select_from(query.statement.subquery())
+
+
+def bench_statements():
+    """Запросы маршрутов в том виде, в каком их строят routes.py и планировщик"""
+    address_id = db.session.execute(bench_address_ids().order_by(NetworkAddress.id)).scalars().first()
+    username = f'{BENCH_USER_PREFIX}7'
+    active = NetworkAddress.query.filter_by(is_active=True)
+    audit = AuditLog.query.order_by(AuditLog.timestamp.desc())
+    audit_by_user = audit.join(User).filter(User.username.contains(username))
+    statements = [
+        ('/ and /api/status: active addresses', active.statement),
+        ('dashboard: count up', count_of(NetworkAddress.query.filter_by(is_active=True, last_status='up'))),
+        ('dashboard: count down', count_of(NetworkAddress.query.filter_by(is_active=True, last_status='down'))),
+        ('scheduler: active by priority', active.order_by(NetworkAddress.priority.desc()).statement),
+        ('/logs', PingLog.query.order_by(PingLog.timestamp.desc()).limit(100).statement),
+        ('/logs?address_id', PingLog.query.filter_by(network_address_id=address_id)
+         .order_by(PingLog.timestamp.desc()).limit(100).statement),
+        ('/logs?address_id: samples', PingSample.query.filter_by(network_address_id=address_id)
+         .order_by(PingSample.window_start.desc()).limit(100).statement),
+        ('/logs?status_changes_only', StatusTransition.query.filter_by(network_address_id=address_id)
+         .order_by(StatusTransition.timestamp.desc()).limit(100).statement),
+        ('/audit_log: count', count_of(audit)),
+        ('/audit_log: page 1', audit.limit(50).offset(0).statement),
+        ('/audit_log: page 100', audit.limit(50).offset(50 * 99).statement),
+        ('/audit_log?username: page 1', audit_by_user.limit(50).offset(0).statement),
+    ]
+    return statements
+
+
+def explain(statement):
+    """План запроса: EXPLAIN QUERY PLAN в SQLite, EXPLAIN в PostgreSQL"""
+    dialect = db.engine.dialect
+    compiled = statement.compile(dialect=dialect)
+    parameters = compiled.construct_params()
+    if dialect.positional:
+        parameters = tuple(parameters[name] for name in compiled.positiontup)
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    with db.engine.connect() as connection:
+        rows = connection.exec_driver_sql(prefix + str(compiled), parameters).all()
+    if dialect.name == 'sqlite':
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def measure(statement):
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        db.session.execute(statement).all()
+        timings.append((time.perf_counter() - started) * 1000)
+        db.session.expunge_all()
+    return statistics.median(timings), max(timings)
+
+
+def run(title):
+    print(f"\n=== {title} ===")
+    results = {}
+    for name, statement in bench_statements():
+        median, worst = measure(statement)
+        results[name] = median
+        print(f"{name:<36} median {median:9.2f} ms   max {worst:9.2f} ms")
+        for line in explain(statement):
+            print(f"    {line}")
+    return results
+
+
+def main():
+    with app.app_context():
+        print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+        if seeded():
+            print("♻️ Тестовые данные уже заполнены")
+        else:
+            seed()
+        analyze()
+
+        indexed = run('С индексами')
+        if not args.no_compare:
+            indexes = [index for table in db.metadata.sorted_tables for index in table.indexes
+                       if index.name in COMPARED_INDEXES]
+            with db.engine.begin() as connection:
+                for index in indexes:
+                    index.drop(connection)
+            analyze()
+            try:
+                plain = run('Без составных индексов')
+            finally:
+                with db.engine.begin() as connection:
+                    for index in indexes:
+                        index.create(connection)
+                analyze()
+
+            print("\n=== Сравнение (медиана) ===")
+            for name, median in indexed.items():
+                print(f"{name:<36} {plain[name]:9.2f} ms -> {median:9.2f} ms  "
+                      f"x{plain[name] / max(median, 0.001):.1f}")
+
+        if not args.keep:
+            cleanup()
+
+    if bench_db and not args.keep:
+        os.remove(bench_db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Обслуживание истории: очистка по срокам хранения (то же, что делает ежечасное
+задание планировщика) и перевод таблиц PostgreSQL в секционированные по дням,
+чтобы устаревшие дни удалялись целиком.
+
+Запуск (та же база, что у веб-сервера):
+    python manage_retention.py --run
+    python manage_retention.py --partition ping_log --partition ping_sample
+    python manage_retention.py --status
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Добавляем директорию проекта в PATH
+project_dir = Path(__file__).parent
+sys.path.insert(0, str(project_dir))
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///network_monitor.db')
+# Планировщик в этом процессе не нужен
+os.environ['PROBE_WORKER'] = 'daemon'
+
+try:
+    from app import app, db
+    from models import RetentionPolicy
+    from services.retention import (PARTITIONED_TABLES, convert_to_partitioned, get_retention_status,
+                                    is_partitioned, list_partitions, run_retention)
+except ImportError as e:
+    print(f"❌ Ошибка импорта: {e}")
+    print("💡 Убедитесь, что установлены все зависимости:")
+    print("   pip install flask flask-sqlalchemy flask-login flask-socketio ping3 netifaces apscheduler "
+          "flask-wtf werkzeug openpyxl flask-bcrypt pyjwt")
+    sys.exit(1)
+
+
+def show_status():
+    with app.app_context():
+        print("📋 Сроки хранения (дней, 0 - всегда):")
+        for target, keep_days in RetentionPolicy.get_all().items():
+            print(f"   • {target}: {keep_days}")
+        with db.engine.connect() as connection:
+            for table_name in PARTITIONED_TABLES:
+                if is_partitioned(connection, table_name):
+                    partitions = list_partitions(connection, table_name)
+                    print(f"🗂️ {table_name}: {len(partitions)} секций")
+                else:
+                    print(f"🗂️ {table_name}: без секций")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сроки хранения и секционирование истории')
+    parser.add_argument('--run', action='store_true', help='Удалить историю старше сроков хранения')
+    parser.add_argument('--partition', action='append', choices=sorted(PARTITIONED_TABLES), default=[],
+                        help='Перевести таблицу в секционированную по дням (только PostgreSQL)')
+    parser.add_argument('--status', action='store_true', help='Показать сроки хранения и секции')
+    args = parser.parse_args()
+
+    if not (args.run or args.partition or args.status):
+        parser.print_help()
+        return
+
+    for table_name in args.partition:
+        if db.engine.dialect.name != 'postgresql':
+            print("❌ Секционирование доступно только для PostgreSQL")
+            sys.exit(1)
+        print(f"🔧 Перевод {table_name} в секционированную таблицу...")
+        convert_to_partitioned(db.engine, table_name)
+        print(f"✅ {table_name} секционирована по дням")
+
+    if args.run:
+        print("🗑️ Очистка истории по срокам хранения...")
+        run_retention()
+        status = get_retention_status()
+        if status['last_error']:
+            print(f"❌ Ошибка: {status['last_error']}")
+            sys.exit(1)
+        print(f"✅ Удалено строк: {status['deleted']}, секций: {len(status['dropped_partitions'])} "
+              f"за {status['last_duration']} сек")
+
+    if args.status:
+        show_status()
+
+
+if __name__ == '__main__':
+    main()
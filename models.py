@@ -1,22 +1,64 @@
 from app import db
-from datetime import datetime
-from sqlalchemy import desc
+from datetime import datetime, timedelta
+from sqlalchemy import desc, event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from enum import Enum
+from types import SimpleNamespace
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cached PingSettings snapshot; also refreshed after this many seconds in case
+# another process changed the settings
+SETTINGS_CACHE_TTL = 60
+_settings_cache = {'value': None, 'loaded_at': None}
+_settings_cache_lock = threading.Lock()
+
+# A probe agent that has not checked in for this many seconds is considered gone
+# and its shard is handed to the remaining agents
+AGENT_TIMEOUT = 90
+
+# Rollup resolutions in seconds: minute, hour and day buckets
+ROLLUP_RESOLUTIONS = (60, 3600, 86400)
+
+# Upper bounds (ms) of the RTT histogram kept in every rollup row; the last
+# bucket holds everything slower. Percentiles are interpolated inside a bucket,
+# so p95 is an estimate within the bucket width
+RTT_HISTOGRAM_BOUNDS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
 
 class NetworkAddress(db.Model):
+    __table_args__ = (
+        # Dashboard status counts; last_status first so listing all active addresses
+        # (most of the table) keeps a plain table scan
+        db.Index('ix_network_address_status_active', 'last_status', 'is_active'),
+        # Probe cycle order (active addresses, highest priority first) without a sort
+        db.Index('ix_network_address_active_priority', 'priority',
+                 postgresql_where=db.text('is_active'), sqlite_where=db.text('is_active = 1')),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     ip_address = db.Column(db.String(45), unique=True, nullable=False)  # IPv4 and IPv6 support
     group_name = db.Column(db.String(100), default='Основная')  # Group name for visual separation
     is_active = db.Column(db.Boolean, default=True)
     last_ping_time = db.Column(db.DateTime)
     last_status = db.Column(db.String(20), default='unknown')  # up, down, unknown
+    ping_interval = db.Column(db.Integer)  # seconds, overrides group and global interval when set
+    consecutive_failures = db.Column(db.Integer, default=0)  # probes without a reply in a row
+    priority = db.Column(db.Integer, default=0)  # higher is probed first when cycles overrun
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship to ping logs
     ping_logs = db.relationship('PingLog', backref='network_address', lazy=True, cascade='all, delete-orphan')
+    ping_samples = db.relationship('PingSample', backref='network_address', lazy=True, cascade='all, delete-orphan')
+    ping_rollups = db.relationship('PingRollup', backref='network_address', lazy=True, cascade='all, delete-orphan')
+    status_transitions = db.relationship('StatusTransition', backref='network_address', lazy=True,
+                                         cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<NetworkAddress {self.ip_address}>'
@@ -29,16 +71,89 @@ class NetworkAddress(db.Model):
             'is_active': self.is_active,
             'last_ping_time': self.last_ping_time.isoformat() if self.last_ping_time else None,
             'last_status': self.last_status,
+            'ping_interval': self.ping_interval,
+            'consecutive_failures': self.consecutive_failures,
+            'priority': self.priority,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+class GroupSettings(db.Model):
+    """Per-group overrides for addresses sharing a group_name"""
+    id = db.Column(db.Integer, primary_key=True)
+    group_name = db.Column(db.String(100), unique=True, nullable=False)
+    ping_interval = db.Column(db.Integer)  # seconds, overrides global interval when set
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<GroupSettings {self.group_name}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'group_name': self.group_name,
+            'ping_interval': self.ping_interval,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+    
+    @classmethod
+    def intervals(cls):
+        """Map of group name to its interval override"""
+        return {group.group_name: group.ping_interval for group in cls.query.all() if group.ping_interval}
+
+class ProbeAgent(db.Model):
+    """Remote probe agent that pulls its shard of addresses from this coordinator"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    groups = db.Column(db.Text)  # comma-separated groups the agent serves, empty = any
+    host = db.Column(db.String(45))  # address the agent connects from
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    address_count = db.Column(db.Integer, default=0)  # size of the last shard handed out
+    results_received = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ProbeAgent {self.name}>'
+    
+    def group_list(self):
+        return [group.strip() for group in (self.groups or '').split(',') if group.strip()]
+    
+    def is_alive(self, now=None):
+        now = now or datetime.utcnow()
+        return self.last_seen is not None and (now - self.last_seen).total_seconds() < AGENT_TIMEOUT
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'groups': self.group_list(),
+            'host': self.host,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None,
+            'alive': self.is_alive(),
+            'address_count': self.address_count,
+            'results_received': self.results_received,
+            'created_at': self.created_at.isoformat()
+        }
+    
+    @classmethod
+    def alive(cls):
+        """Agents that checked in within AGENT_TIMEOUT"""
+        cutoff = datetime.utcnow() - timedelta(seconds=AGENT_TIMEOUT)
+        return cls.query.filter(cls.last_seen >= cutoff).order_by(cls.name).all()
 
 class PingLog(db.Model):
+    __table_args__ = (
+        # Latest results of one address (/logs?address_id=) as a single range scan
+        db.Index('ix_ping_log_address_time', 'network_address_id', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     network_address_id = db.Column(db.Integer, db.ForeignKey('network_address.id'), nullable=False)
     status = db.Column(db.String(20), nullable=False)  # up, down, error
     response_time = db.Column(db.Float)  # in milliseconds
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # indexed for retention
     error_message = db.Column(db.Text)
     
     def __repr__(self):
@@ -56,24 +171,246 @@ class PingLog(db.Model):
     
     @classmethod
     def get_status_changes(cls, network_address_id=None, limit=100):
-        """Get logs where status changed from previous entry"""
+        """Most recent status changes, newest first (read from StatusTransition)"""
+        return StatusTransition.recent(network_address_id, limit)
+
+class StatusTransition(db.Model):
+    """A change of NetworkAddress.last_status, written together with the result that caused it"""
+    __table_args__ = (
+        db.Index('ix_status_transition_address_time', 'network_address_id', 'timestamp'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    network_address_id = db.Column(db.Integer, db.ForeignKey('network_address.id'), nullable=False)
+    old_status = db.Column(db.String(20))  # None for the first result of an address
+    new_status = db.Column(db.String(20), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    response_time = db.Column(db.Float)  # in milliseconds
+    error_message = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f'<StatusTransition {self.network_address_id} {self.old_status} -> {self.new_status}>'
+    
+    @property
+    def status(self):
+        """Status after the change, so transitions render like ping logs"""
+        return self.new_status
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'network_address_id': self.network_address_id,
+            'old_status': self.old_status,
+            'new_status': self.new_status,
+            'timestamp': self.timestamp.isoformat(),
+            'response_time': self.response_time,
+            'error_message': self.error_message
+        }
+    
+    @classmethod
+    def recent(cls, network_address_id=None, limit=100):
+        """Newest transitions first: one range scan of the (address, time) or time index"""
         query = cls.query
         if network_address_id:
             query = query.filter_by(network_address_id=network_address_id)
-        
-        # Get all logs ordered by timestamp
-        all_logs = query.order_by(cls.timestamp.desc()).limit(limit * 2).all()
-        
-        # Filter for status changes
-        status_changes = []
-        previous_status = None
-        
-        for log in reversed(all_logs):  # Process in chronological order
-            if previous_status is None or log.status != previous_status:
-                status_changes.append(log)
-                previous_status = log.status
-        
-        return list(reversed(status_changes))[:limit]  # Return in reverse chronological order
+        return query.order_by(cls.timestamp.desc()).limit(limit).all()
+
+class PingSample(db.Model):
+    """Probes of one address aggregated over a window (compact storage mode)"""
+    __table_args__ = (
+        db.Index('ix_ping_sample_address_window', 'network_address_id', 'window_start'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    network_address_id = db.Column(db.Integer, db.ForeignKey('network_address.id'), nullable=False)
+    window_start = db.Column(db.DateTime, nullable=False, index=True)
+    window_seconds = db.Column(db.Integer, nullable=False)
+    probes = db.Column(db.Integer, nullable=False)
+    lost = db.Column(db.Integer, nullable=False)  # probes that came back down or error
+    rtt_min = db.Column(db.Float)  # in milliseconds, over answered probes
+    rtt_avg = db.Column(db.Float)
+    rtt_max = db.Column(db.Float)
+    
+    def __repr__(self):
+        return f'<PingSample {self.network_address_id} - {self.window_start}>'
+    
+    @property
+    def loss(self):
+        """Lost probes in percent"""
+        return 100.0 * self.lost / self.probes if self.probes else 0.0
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'network_address_id': self.network_address_id,
+            'window_start': self.window_start.isoformat(),
+            'window_seconds': self.window_seconds,
+            'probes': self.probes,
+            'lost': self.lost,
+            'loss': round(self.loss, 2),
+            'rtt_min': self.rtt_min,
+            'rtt_avg': self.rtt_avg,
+            'rtt_max': self.rtt_max
+        }
+
+class PingRollup(db.Model):
+    """Probe statistics of one address per minute, hour or day bucket.
+    
+    Rows are added to as results are written (see services/rollups.py), so
+    history views read one row per bucket instead of every PingLog row.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('network_address_id', 'resolution', 'bucket_start', name='uq_ping_rollup_bucket'),
+        # Retention removes whole levels by age
+        db.Index('ix_ping_rollup_resolution_bucket', 'resolution', 'bucket_start'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    network_address_id = db.Column(db.Integer, db.ForeignKey('network_address.id'), nullable=False)
+    resolution = db.Column(db.Integer, nullable=False)  # bucket length in seconds, one of ROLLUP_RESOLUTIONS
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    probes = db.Column(db.Integer, nullable=False, default=0)
+    lost = db.Column(db.Integer, nullable=False, default=0)  # probes that came back down or error
+    rtt_count = db.Column(db.Integer, nullable=False, default=0)  # answered probes with a response time
+    rtt_sum = db.Column(db.Float, nullable=False, default=0.0)
+    rtt_min = db.Column(db.Float)
+    rtt_max = db.Column(db.Float)
+    # Answered probes per RTT_HISTOGRAM_BOUNDS bucket
+    hist_0 = db.Column(db.Integer, nullable=False, default=0)
+    hist_1 = db.Column(db.Integer, nullable=False, default=0)
+    hist_2 = db.Column(db.Integer, nullable=False, default=0)
+    hist_3 = db.Column(db.Integer, nullable=False, default=0)
+    hist_4 = db.Column(db.Integer, nullable=False, default=0)
+    hist_5 = db.Column(db.Integer, nullable=False, default=0)
+    hist_6 = db.Column(db.Integer, nullable=False, default=0)
+    hist_7 = db.Column(db.Integer, nullable=False, default=0)
+    hist_8 = db.Column(db.Integer, nullable=False, default=0)
+    hist_9 = db.Column(db.Integer, nullable=False, default=0)
+    hist_10 = db.Column(db.Integer, nullable=False, default=0)
+    hist_11 = db.Column(db.Integer, nullable=False, default=0)
+    hist_12 = db.Column(db.Integer, nullable=False, default=0)
+    hist_13 = db.Column(db.Integer, nullable=False, default=0)
+    
+    HISTOGRAM_COLUMNS = tuple(f'hist_{index}' for index in range(len(RTT_HISTOGRAM_BOUNDS) + 1))
+    
+    def __repr__(self):
+        return f'<PingRollup {self.network_address_id} {self.resolution}s {self.bucket_start}>'
+    
+    @property
+    def loss(self):
+        """Lost probes in percent"""
+        return 100.0 * self.lost / self.probes if self.probes else 0.0
+    
+    @property
+    def rtt_avg(self):
+        return self.rtt_sum / self.rtt_count if self.rtt_count else None
+    
+    def rtt_percentile(self, fraction):
+        """RTT percentile estimated from the histogram, clamped to the observed min/max"""
+        if not self.rtt_count:
+            return None
+        rank = fraction * self.rtt_count
+        seen = 0
+        for index, column in enumerate(self.HISTOGRAM_COLUMNS):
+            count = getattr(self, column) or 0
+            if count and seen + count >= rank:
+                lower = RTT_HISTOGRAM_BOUNDS[index - 1] if index else 0.0
+                upper = RTT_HISTOGRAM_BOUNDS[index] if index < len(RTT_HISTOGRAM_BOUNDS) else self.rtt_max
+                lower = max(lower, self.rtt_min)
+                upper = min(upper, self.rtt_max)
+                share = (rank - seen) / count
+                # Bucket bounds grow geometrically, so interpolate on a log scale
+                if lower > 0:
+                    return lower * (upper / lower) ** share
+                return lower + (upper - lower) * share
+            seen += count
+        return self.rtt_max
+    
+    @property
+    def rtt_p95(self):
+        return self.rtt_percentile(0.95)
+    
+    def to_dict(self):
+        rtt_avg = self.rtt_avg
+        rtt_p95 = self.rtt_p95
+        return {
+            'network_address_id': self.network_address_id,
+            'resolution': self.resolution,
+            'bucket_start': self.bucket_start.isoformat(),
+            'probes': self.probes,
+            'loss': round(self.loss, 2),
+            'rtt_min': self.rtt_min,
+            'rtt_avg': round(rtt_avg, 3) if rtt_avg is not None else None,
+            'rtt_max': self.rtt_max,
+            'rtt_p95': round(rtt_p95, 3) if rtt_p95 is not None else None
+        }
+    
+    @classmethod
+    def series(cls, network_address_id, start, end, resolution):
+        """Rollup rows of one address in [start, end) at the given resolution"""
+        return cls.query.filter(
+            cls.network_address_id == network_address_id,
+            cls.resolution == resolution,
+            cls.bucket_start >= start,
+            cls.bucket_start < end
+        ).order_by(cls.bucket_start).all()
+
+class BackfillState(db.Model):
+    """Progress of a one-off backfill from ping_log (backfill_rollups.py).
+    
+    The bound is fixed by the first run: rows before it are backfilled, later ones
+    were written live. Progress is committed with each chunk, so neither a rerun
+    nor a resume after a crash merges a ping_log row twice.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    target = db.Column(db.String(50), unique=True, nullable=False)  # rollup_<resolution> or status_transition
+    until = db.Column(db.DateTime)  # None = the whole ping_log
+    last_id = db.Column(db.Integer, nullable=False, default=0)  # last ping_log id (address id for transitions) done
+    completed = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<BackfillState {self.target} until {self.until}>'
+
+class RetentionPolicy(db.Model):
+    """How many days of history to keep per table, rollup level or deactivated address"""
+    id = db.Column(db.Integer, primary_key=True)
+    target = db.Column(db.String(50), unique=True, nullable=False)
+    keep_days = db.Column(db.Integer, nullable=False, default=0)  # 0 = keep forever
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Targets and their default retention in days
+    DEFAULTS = {
+        'ping_log': 30,
+        'ping_sample': 180,
+        'rollup_minute': 14,
+        'rollup_hour': 400,
+        'rollup_day': 0,
+        'status_transition': 0,
+        'inactive_address': 30  # history of addresses removed from monitoring, counted from removal
+    }
+    
+    def __repr__(self):
+        return f'<RetentionPolicy {self.target}={self.keep_days}d>'
+    
+    def to_dict(self):
+        return {
+            'target': self.target,
+            'keep_days': self.keep_days,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    @classmethod
+    def get_all(cls):
+        """Policies of every target as {target: keep_days}, creating missing ones with defaults"""
+        policies = {policy.target: policy for policy in cls.query.all()}
+        missing = [target for target in cls.DEFAULTS if target not in policies]
+        if missing:
+            for target in missing:
+                policies[target] = cls(target=target, keep_days=cls.DEFAULTS[target])
+                db.session.add(policies[target])
+            db.session.commit()
+        return {target: policies[target].keep_days for target in cls.DEFAULTS}
 
 class NetworkInterface(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -103,6 +440,17 @@ class PingSettings(db.Model):
     max_retries = db.Column(db.Integer, default=3)
     max_threads = db.Column(db.Integer, default=50)  # concurrent ping threads
     batch_size = db.Column(db.Integer, default=100)  # addresses per batch
+    adaptive_timeout = db.Column(db.Boolean, default=False)  # per-host timeout from smoothed RTT
+    probe_rate = db.Column(db.Integer, default=0)  # probes per second, 0 = unlimited
+    probe_burst = db.Column(db.Integer, default=50)  # probes sent back-to-back after idle
+    subnet_rate = db.Column(db.Integer, default=0)  # probes per second per /24, 0 = unlimited
+    probe_processes = db.Column(db.Integer, default=1)  # worker processes for large sweeps, 1 = in-process
+    schedule_mode = db.Column(db.String(20), default='burst')  # 'burst' or 'staggered' over the interval
+    backoff_enabled = db.Column(db.Boolean, default=False)  # probe long-dead hosts less often
+    backoff_threshold = db.Column(db.Integer, default=5)  # consecutive failures before backing off
+    backoff_max_interval = db.Column(db.Integer, default=3600)  # seconds, cap of the grown interval
+    storage_mode = db.Column(db.String(20), default='full')  # 'full' (every probe) or 'compact' (changes + samples)
+    sample_window = db.Column(db.Integer, default=300)  # seconds aggregated into one PingSample in compact mode
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -118,6 +466,17 @@ class PingSettings(db.Model):
             'max_retries': self.max_retries,
             'max_threads': self.max_threads,
             'batch_size': self.batch_size,
+            'adaptive_timeout': self.adaptive_timeout,
+            'probe_rate': self.probe_rate,
+            'probe_burst': self.probe_burst,
+            'subnet_rate': self.subnet_rate,
+            'probe_processes': self.probe_processes,
+            'schedule_mode': self.schedule_mode,
+            'backoff_enabled': self.backoff_enabled,
+            'backoff_threshold': self.backoff_threshold,
+            'backoff_max_interval': self.backoff_max_interval,
+            'storage_mode': self.storage_mode,
+            'sample_window': self.sample_window,
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
@@ -132,6 +491,58 @@ class PingSettings(db.Model):
             db.session.add(settings)
             db.session.commit()
         return settings
+    
+    @classmethod
+    def get_cached(cls):
+        """Read-only snapshot of the current settings, cached in memory.
+        
+        The cache is dropped whenever a commit writes PingSettings; use
+        get_current() to change settings. While the database is unreachable
+        the last snapshot is served, so probing goes on.
+        """
+        with _settings_cache_lock:
+            cached = _settings_cache['value']
+            loaded_at = _settings_cache['loaded_at']
+            if loaded_at is not None and time.monotonic() - loaded_at < SETTINGS_CACHE_TTL:
+                return cached
+        
+        try:
+            settings = cls.get_current()
+        except SQLAlchemyError as e:
+            if cached is None:
+                raise
+            db.session.rollback()
+            logger.warning(f"Ping settings unavailable, using the cached ones: {str(e)}")
+            with _settings_cache_lock:
+                _settings_cache['loaded_at'] = time.monotonic()
+            return cached
+        snapshot = SimpleNamespace(**{column.name: getattr(settings, column.name) for column in cls.__table__.columns})
+        
+        with _settings_cache_lock:
+            _settings_cache['value'] = snapshot
+            _settings_cache['loaded_at'] = time.monotonic()
+        return snapshot
+    
+    @staticmethod
+    def invalidate_cache():
+        # The snapshot itself is kept as a fallback for a database outage
+        with _settings_cache_lock:
+            _settings_cache['loaded_at'] = None
+
+@event.listens_for(PingSettings, 'after_insert')
+@event.listens_for(PingSettings, 'after_update')
+def _mark_ping_settings_changed(mapper, connection, target):
+    # Flushed but not committed yet: drop the cache once the commit succeeds
+    Session.object_session(target).info['ping_settings_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_ping_settings_cache(session):
+    if session.info.pop('ping_settings_changed', False):
+        PingSettings.invalidate_cache()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_ping_settings_change(session):
+    session.info.pop('ping_settings_changed', None)
 
 class UserRole(Enum):
     """Роли пользователей"""
@@ -237,13 +648,18 @@ class User(UserMixin, db.Model):
 
 class AuditLog(db.Model):
     """Журнал аудита для отслеживания действий пользователей"""
+    __table_args__ = (
+        # Фильтр по пользователю с сортировкой по времени
+        db.Index('ix_audit_log_user_time', 'user_id', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     action = db.Column(db.String(255), nullable=False)
     details = db.Column(db.Text)
     ip_address = db.Column(db.String(45))
     user_agent = db.Column(db.String(255))
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # журнал сортируется по времени
     
     user = db.relationship('User', backref='audit_logs')
     
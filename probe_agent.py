@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Удалённый агент пинга: забирает у координатора (веб-сервера) свою долю адресов,
+пингует их тем же движком, что и сервер, и отправляет результаты пачками.
+
+Несколько агентов можно запустить на одной машине отдельными процессами:
+    AGENT_TOKEN=secret python probe_agent.py --coordinator http://127.0.0.1:8247 --name agent-1
+    AGENT_TOKEN=secret python probe_agent.py --coordinator http://127.0.0.1:8247 --name agent-2
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем директорию проекта в PATH
+project_dir = Path(__file__).parent
+sys.path.insert(0, str(project_dir))
+
+try:
+    import requests
+    from services.agent_sharding import AGENT_HEARTBEAT_INTERVAL
+    from services.probe_pool import init_probe_pool, shutdown_probe_pool
+except ImportError as e:
+    print(f"❌ Ошибка импорта: {e}")
+    print("💡 Убедитесь, что установлены все зависимости:")
+    print("   pip install requests ping3 netifaces")
+    sys.exit(1)
+
+logger = logging.getLogger('probe_agent')
+
+# Сколько результатов отправлять одним запросом и как долго их копить (сек)
+RESULT_BATCH_SIZE = 500
+RESULT_BATCH_INTERVAL = 1.0
+
+# Сколько неотправленных результатов хранить, пока координатор недоступен
+MAX_PENDING_RESULTS = 50000
+
+REQUEST_TIMEOUT = 30
+
+
+class ProbeAgent:
+    """Цикл агента: доля адресов по расписанию, пинг, отправка результатов"""
+
+    def __init__(self, coordinator: str, name: str, token: str, groups=None):
+        self.coordinator = coordinator.rstrip('/')
+        self.name = name
+        self.groups = groups or []
+        self.http = requests.Session()
+        self.http.headers['Authorization'] = f'Bearer {token}'
+
+        # id -> адрес из доли и время следующего пинга
+        self.shard = {}
+        self.due = {}
+        self.heartbeat_interval = AGENT_HEARTBEAT_INTERVAL
+        self.next_heartbeat = 0.0
+        self.pending = deque(maxlen=MAX_PENDING_RESULTS)
+        self.registered = False
+        self.running = True
+        self.service = None
+
+    def _url(self, path: str) -> str:
+        return f"{self.coordinator}/api/agents{path}"
+
+    def _apply_settings(self, settings):
+        self.heartbeat_interval = settings.pop('heartbeat_interval', AGENT_HEARTBEAT_INTERVAL)
+        # Тот же пул и сервис пинга, что у сервера; повторный вызов применяет новые настройки
+        self.service = init_probe_pool(SimpleNamespace(**settings))
+
+    def register(self):
+        response = self.http.post(self._url('/register'), json={'name': self.name, 'groups': self.groups},
+                                  timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        self._apply_settings(response.json()['settings'])
+        self.registered = True
+        logger.info(f"Agent {self.name} registered at {self.coordinator}")
+
+    def pull_shard(self):
+        """Новая доля адресов: переехавшие к другим агентам забываются, новые пингуются сразу"""
+        response = self.http.get(self._url(f'/{self.name}/shard'), timeout=REQUEST_TIMEOUT)
+        if response.status_code == 404:
+            # Координатор забыл агента (например, после leave) - регистрируемся заново
+            self.registered = False
+            return
+        response.raise_for_status()
+        data = response.json()
+        self._apply_settings(data['settings'])
+
+        shard = {address['id']: address for address in data['addresses']}
+        now = time.monotonic()
+        added = [address_id for address_id in shard if address_id not in self.shard]
+        removed = [address_id for address_id in self.shard if address_id not in shard]
+        for address_id in removed:
+            self.due.pop(address_id, None)
+        for address_id in added:
+            self.due[address_id] = now
+        self.shard = shard
+
+        if added or removed:
+            logger.info(f"Shard rebalanced: {len(shard)} addresses (+{len(added)}, -{len(removed)})")
+
+    def heartbeat(self):
+        """Регистрация при необходимости, новая доля (запрос доли - это и heartbeat) и
+        отправка результатов. Вызывается и посреди прохода: проход дольше AGENT_TIMEOUT
+        не должен выбрасывать агента из кольца"""
+        try:
+            if not self.registered:
+                self.register()
+            self.pull_shard()
+            self.push_results()
+        except requests.RequestException as e:
+            logger.warning(f"Coordinator unavailable: {str(e)}")
+        self.next_heartbeat = time.monotonic() + self.heartbeat_interval
+
+    def push_results(self):
+        """Отправка накопленных результатов пачками; при ошибке они остаются в очереди"""
+        while self.pending:
+            batch = [self.pending[index] for index in range(min(RESULT_BATCH_SIZE, len(self.pending)))]
+            try:
+                response = self.http.post(self._url(f'/{self.name}/results'), json={'results': batch},
+                                          timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                logger.warning(f"Results not delivered, {len(self.pending)} pending: {str(e)}")
+                return
+            for _ in batch:
+                self.pending.popleft()
+
+    def probe_due(self):
+        now = time.monotonic()
+        due_ids = [address_id for address_id, due_at in self.due.items() if due_at <= now]
+        if not due_ids:
+            return
+
+        # Высокий приоритет - первым
+        due_ids.sort(key=lambda address_id: -self.shard[address_id]['priority'])
+        index = {self.shard[address_id]['ip_address']: address_id for address_id in due_ids}
+        for address_id in due_ids:
+            self.due[address_id] = now + self.shard[address_id]['interval']
+
+        last_push = time.monotonic()
+        for result in self.service.iter_results(list(index)):
+            self.pending.append({
+                'id': index[result['ip_address']],
+                'status': result['status'],
+                'response_time': result['response_time'],
+                'error_message': result.get('error_message'),
+                'timestamp': result['timestamp'].isoformat()
+            })
+            if time.monotonic() >= self.next_heartbeat:
+                self.heartbeat()
+                last_push = time.monotonic()
+            elif len(self.pending) >= RESULT_BATCH_SIZE or time.monotonic() - last_push >= RESULT_BATCH_INTERVAL:
+                self.push_results()
+                last_push = time.monotonic()
+        self.push_results()
+
+    def leave(self):
+        try:
+            self.http.post(self._url(f'/{self.name}/leave'), timeout=REQUEST_TIMEOUT)
+        except requests.RequestException:
+            pass  # координатор сам заметит по таймауту
+
+    def run(self):
+        while self.running:
+            if time.monotonic() >= self.next_heartbeat:
+                self.heartbeat()
+
+            if self.service is not None:
+                self.probe_due()
+
+            next_due = min(self.due.values(), default=self.next_heartbeat)
+            time.sleep(max(0.0, min(next_due, self.next_heartbeat, time.monotonic() + 1) - time.monotonic()))
+
+        self.push_results()
+        self.leave()
+        shutdown_probe_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Агент распределённого пинга')
+    parser.add_argument('--coordinator', default=os.environ.get('AGENT_COORDINATOR', 'http://127.0.0.1:8247'),
+                        help='URL веб-сервера мониторинга')
+    parser.add_argument('--name', default=os.environ.get('AGENT_NAME', f"{socket.gethostname()}-{os.getpid()}"),
+                        help='Уникальное имя агента')
+    parser.add_argument('--groups', default=os.environ.get('AGENT_GROUPS', ''),
+                        help='Группы адресов через запятую, которые пингует только этот агент')
+    args = parser.parse_args()
+
+    token = os.environ.get('AGENT_TOKEN')
+    if not token:
+        print("❌ Не задан AGENT_TOKEN (должен совпадать с AGENT_TOKEN веб-сервера)")
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO)
+    groups = [group.strip() for group in args.groups.split(',') if group.strip()]
+    agent = ProbeAgent(args.coordinator, args.name, token, groups)
+
+    def shutdown(signum, frame):
+        agent.running = False
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    print(f"📡 Агент пинга {args.name} -> {args.coordinator}")
+    print("🔧 Для остановки нажмите Ctrl+C")
+    agent.run()
+    print("🛑 Агент пинга остановлен")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Отдельный процесс пинга: планировщик, пул проб и запись результатов в БД
+работают здесь, а веб-процесс (PROBE_WORKER=external) только обслуживает
+HTTP/WebSocket и связывается с этим процессом через localhost
+"""
+
+import os
+import signal
+import sys
+from pathlib import Path
+
+# Добавляем директорию проекта в PATH
+project_dir = Path(__file__).parent
+sys.path.insert(0, str(project_dir))
+
+# Те же настройки, что и у веб-процесса (start_local.py): база должна быть общей
+os.environ.setdefault('DATABASE_URL', 'sqlite:///network_monitor.db')
+# app.py не запускает планировщик в этом режиме - это делает демон после подключения канала событий
+os.environ['PROBE_WORKER'] = 'daemon'
+
+try:
+    from app import app, db
+    from models import PingSettings
+    from services import ping_scheduler
+    from services.probe_control import start_scheduler, stop_scheduler, get_scheduler_status
+    from services.probe_ipc import ProbeDaemonError, ProbeIpcServer, key_file
+    from services.scheduler_leader import create_lock, start_leader_election
+except ImportError as e:
+    print(f"❌ Ошибка импорта: {e}")
+    print("💡 Убедитесь, что установлены все зависимости:")
+    print("   pip install flask flask-sqlalchemy flask-login flask-socketio ping3 netifaces apscheduler "
+          "flask-wtf werkzeug openpyxl flask-bcrypt pyjwt")
+    sys.exit(1)
+
+
+def _on_elected():
+    # Настройки меняет веб-процесс: кэш этого процесса о них не знает
+    PingSettings.invalidate_cache()
+    ping_scheduler.start_scheduler()
+
+
+def _start():
+    # Через выбор лидера: планировщик не запустится, пока его держит другой процесс
+    PingSettings.invalidate_cache()
+    start_scheduler()
+
+
+def _reconfigure():
+    PingSettings.invalidate_cache()
+    ping_scheduler.reconfigure_scheduler()
+
+
+HANDLERS = {
+    'ping_now': ping_scheduler.ping_now,
+    'refresh_schedule': ping_scheduler.refresh_schedule,
+    'reconfigure': _reconfigure,
+    'start': _start,
+    'stop': stop_scheduler,
+    'status': get_scheduler_status,
+}
+
+
+def main():
+    try:
+        server = ProbeIpcServer(HANDLERS)
+    except OSError as e:
+        print(f"❌ Не удалось открыть порт связи с веб-процессом: {e}")
+        print("💡 Проверьте, что демон пинга не запущен и порт PROBE_DAEMON_PORT свободен")
+        sys.exit(1)
+    except ProbeDaemonError as e:
+        print(f"❌ Нет ключа связи с веб-процессом: {e}")
+        print(f"💡 Задайте случайный PROBE_DAEMON_AUTHKEY или удалите PROBE_DAEMON_AUTHKEY, "
+              f"чтобы ключ создался в {key_file()}")
+        sys.exit(1)
+
+    # Результаты пинга уходят в веб-процесс, а он рассылает их в WebSocket
+    ping_scheduler.event_publisher = server.publish
+    # Та же блокировка, что у веб-процессов в режиме embedded: демон не запустит
+    # второй планировщик рядом с ними, а займёт их место, когда они завершатся
+    with app.app_context():
+        lock = create_lock(db.engine, app.instance_path)
+    election = start_leader_election(lock, on_elected=_on_elected, on_lost=ping_scheduler.stop_scheduler,
+                                     on_tick=ping_scheduler.sync_settings)
+
+    def shutdown(signum, frame):
+        print("\n🛑 Демон пинга остановлен")
+        ping_scheduler.stop_scheduler()
+        election.stop()
+        server.close()
+        # Исключение из обработчика прерывает ожидание accept() в основном потоке
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    print("=" * 60)
+    print("📡 ДЕМОН ПИНГА")
+    print("=" * 60)
+    print(f"🔌 Связь с веб-процессом: {server.address[0]}:{server.address[1]}")
+    if not election.is_leader:
+        print("⏳ Планировщик пинга работает в другом процессе, демон ждёт его завершения")
+    print("💡 Запустите веб-процесс с PROBE_WORKER=external")
+    print("🔧 Для остановки нажмите Ctrl+C")
+    print("=" * 60)
+
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
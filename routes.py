@@ -1,17 +1,17 @@
 from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, session
 from flask_login import login_user, logout_user, login_required, current_user
 from app import app, db
-from models import NetworkAddress, PingLog, NetworkInterface, PingSettings, User, UserRole, AuditLog
+from models import NetworkAddress, PingLog, PingSample, PingRollup, ROLLUP_RESOLUTIONS, RetentionPolicy, StatusTransition, NetworkInterface, PingSettings, GroupSettings, ProbeAgent, User, UserRole, AuditLog
 from services.network_service import NetworkService
-from services.ping_scheduler import scheduler
-from auth_decorators import viewer_required, user_required, admin_required, superadmin_required, audit_log, rate_limit
+from auth_decorators import viewer_required, user_required, admin_required, superadmin_required, audit_log, rate_limit, agent_token_required
 from auth_forms import LoginForm, CreateUserForm, EditUserForm, ChangePasswordForm, ForcePasswordChangeForm, ResetPasswordForm, UnlockUserForm, AuditLogFilterForm
 from services.ip_whitelist_service import IPWhitelistService
+from services.scheduler_leader import NotLeaderError
 import logging
 import tempfile
 import os
 from openpyxl import Workbook, load_workbook
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import wraps
 
 logger = logging.getLogger(__name__)
@@ -359,7 +359,19 @@ def index():
             grouped_addresses[group_name] = []
         grouped_addresses[group_name].append(address)
     
-    return render_template('index.html', addresses=addresses, grouped_addresses=grouped_addresses)
+    return render_template('index.html', addresses=addresses, grouped_addresses=grouped_addresses,
+                           group_intervals=GroupSettings.intervals(),
+                           default_interval=PingSettings.get_cached().ping_interval)
+
+def _parse_ping_interval(value):
+    """Interval override from a form field: None when empty, ValueError when out of range"""
+    if value is None or not value.strip():
+        return None
+    
+    interval = int(value)
+    if interval < 5 or interval > 3600:
+        raise ValueError('ping interval out of range')
+    return interval
 
 @app.route('/add_address', methods=['POST'])
 @user_required
@@ -373,6 +385,12 @@ def add_address():
         flash('IP адрес обязателен', 'error')
         return redirect(url_for('index'))
     
+    try:
+        ping_interval = _parse_ping_interval(request.form.get('ping_interval'))
+    except ValueError:
+        flash('Интервал пинга должен быть от 5 до 3600 секунд', 'error')
+        return redirect(url_for('index'))
+    
     # Check if address already exists
     existing = NetworkAddress.query.filter_by(ip_address=ip_address).first()
     if existing:
@@ -388,7 +406,8 @@ def add_address():
         # Add new address
         new_address = NetworkAddress(
             ip_address=ip_address,
-            group_name=group_name
+            group_name=group_name,
+            ping_interval=ping_interval
         )
         db.session.add(new_address)
         db.session.commit()
@@ -403,6 +422,84 @@ def add_address():
     
     return redirect(url_for('index'))
 
+@app.route('/set_ping_interval/<int:address_id>', methods=['POST'])
+@user_required
+def set_ping_interval(address_id):
+    """Set or clear the probe interval override of one address"""
+    try:
+        address = NetworkAddress.query.get_or_404(address_id)
+        address.ping_interval = _parse_ping_interval(request.form.get('ping_interval'))
+        db.session.commit()
+        
+        from services.probe_control import refresh_schedule
+        refresh_schedule()
+        
+        flash('Интервал пинга адреса обновлён', 'success')
+        logger.info(f"Set ping interval of {address.ip_address} to {address.ping_interval or 'default'}")
+    except ValueError:
+        flash('Интервал пинга должен быть от 5 до 3600 секунд', 'error')
+    except Exception as e:
+        logger.error(f"Error setting ping interval: {str(e)}")
+        flash('Ошибка обновления интервала пинга', 'error')
+        db.session.rollback()
+    
+    return redirect(url_for('index'))
+
+@app.route('/toggle_priority/<int:address_id>', methods=['POST'])
+@user_required
+def toggle_priority(address_id):
+    """Switch an address between normal and high probe priority"""
+    try:
+        address = NetworkAddress.query.get_or_404(address_id)
+        address.priority = 0 if address.priority else 1
+        db.session.commit()
+        
+        from services.probe_control import refresh_schedule
+        refresh_schedule()
+        
+        flash(f'Приоритет {address.ip_address}: {"высокий" if address.priority else "обычный"}', 'success')
+        logger.info(f"Set priority of {address.ip_address} to {address.priority}")
+    except Exception as e:
+        logger.error(f"Error setting priority: {str(e)}")
+        flash('Ошибка изменения приоритета', 'error')
+        db.session.rollback()
+    
+    return redirect(url_for('index'))
+
+@app.route('/set_group_interval', methods=['POST'])
+@user_required
+def set_group_interval():
+    """Set or clear the probe interval override of a group"""
+    group_name = request.form.get('group_name')
+    
+    if not group_name:
+        flash('Группа обязательна', 'error')
+        return redirect(url_for('index'))
+    
+    try:
+        ping_interval = _parse_ping_interval(request.form.get('ping_interval'))
+        
+        group = GroupSettings.query.filter_by(group_name=group_name).first()
+        if group is None:
+            group = GroupSettings(group_name=group_name)
+            db.session.add(group)
+        group.ping_interval = ping_interval
+        db.session.commit()
+        
+        from services.probe_control import refresh_schedule
+        refresh_schedule()
+        
+        flash(f'Интервал пинга группы {group_name} обновлён', 'success')
+        logger.info(f"Set ping interval of group {group_name} to {ping_interval or 'default'}")
+    except ValueError:
+        flash('Интервал пинга должен быть от 5 до 3600 секунд', 'error')
+    except Exception as e:
+        logger.error(f"Error setting group ping interval: {str(e)}")
+        flash('Ошибка обновления интервала пинга', 'error')
+        db.session.rollback()
+    
+    return redirect(url_for('index'))
+
 @app.route('/remove_address/<int:address_id>')
 @user_required
 def remove_address(address_id):
@@ -431,15 +528,22 @@ def logs():
     addresses = NetworkAddress.query.filter_by(is_active=True).all()
     
     if status_changes_only:
-        ping_logs = PingLog.get_status_changes(address_id, limit)
+        ping_logs = StatusTransition.recent(address_id, limit)
     else:
         query = PingLog.query
         if address_id:
             query = query.filter_by(network_address_id=address_id)
         ping_logs = query.order_by(PingLog.timestamp.desc()).limit(limit).all()
     
+    # Aggregated samples written in compact storage mode
+    sample_query = PingSample.query
+    if address_id:
+        sample_query = sample_query.filter_by(network_address_id=address_id)
+    ping_samples = sample_query.order_by(PingSample.window_start.desc()).limit(limit).all()
+    
     return render_template('logs.html', 
                          ping_logs=ping_logs, 
+                         ping_samples=ping_samples,
                          addresses=addresses,
                          selected_address_id=address_id,
                          status_changes_only=status_changes_only,
@@ -452,7 +556,8 @@ def settings():
     # Get current ping settings
     ping_settings = PingSettings.get_current()
     
-    return render_template('settings.html', ping_settings=ping_settings)
+    return render_template('settings.html', ping_settings=ping_settings,
+                           retention_policies=RetentionPolicy.get_all())
 
 
 
@@ -462,25 +567,14 @@ def ping_now(address_id):
     """Manually trigger a ping for a specific address"""
     try:
         address = NetworkAddress.query.get_or_404(address_id)
-        network_service = NetworkService()
-        
-        # Perform ping
-        result = network_service.ping_address(address.ip_address)
         
-        # Update address status
-        address.last_status = result['status']
-        address.last_ping_time = result['timestamp']
-        
-        # Log the result
-        ping_log = PingLog(
-            network_address_id=address.id,
-            status=result['status'],
-            response_time=result['response_time'],
-            error_message=result.get('error_message')
-        )
-        
-        db.session.add(ping_log)
-        db.session.commit()
+        # Ping on the shared probe pool (in the probe daemon if it runs separately); the
+        # result is written like a scheduled probe and returns a backed-off host to its interval
+        from services.probe_control import ping_now as ping_address_now
+        result = ping_address_now(address.id)
+        if result is None:
+            flash('Address not found', 'error')
+            return redirect(url_for('index'))
         
         flash(f'Ping completed: {address.ip_address} is {result["status"]}', 'success')
         logger.info(f"Manual ping completed for {address.ip_address}: {result['status']}")
@@ -499,14 +593,165 @@ def api_status():
     addresses = NetworkAddress.query.filter_by(is_active=True).all()
     return jsonify([addr.to_dict() for addr in addresses])
 
+@app.route('/api/history/<int:address_id>')
+@viewer_required
+def api_history(address_id):
+    """RTT and loss history of an address from the rollup tables.
+    
+    The period is ?days= back from now (default 1, up to 366); the resolution
+    (minute, hour or day) is picked so the series stays within a few thousand points.
+    """
+    from services.rollups import bucket_start, history_resolution
+    address = NetworkAddress.query.get_or_404(address_id)
+    days = max(1, min(request.args.get('days', 1, type=int), 366))
+    
+    end = datetime.utcnow()
+    start = end - timedelta(days=days)
+    resolution = request.args.get('resolution', type=int) or history_resolution(start, end)
+    if resolution not in ROLLUP_RESOLUTIONS:
+        return jsonify({'error': 'unknown resolution'}), 400
+    
+    rollups = PingRollup.series(address.id, bucket_start(start, resolution), end, resolution)
+    return jsonify({
+        'address_id': address.id,
+        'ip_address': address.ip_address,
+        'resolution': resolution,
+        'points': [rollup.to_dict() for rollup in rollups]
+    })
+
+@app.route('/api/probe_pool')
+@viewer_required
+def api_probe_pool():
+    """API endpoint for probe pool utilisation"""
+    from services.probe_control import get_scheduler_status
+    return jsonify(get_scheduler_status())
+
+@app.route('/api/agents')
+@viewer_required
+def api_agents():
+    """API endpoint for the registered probe agents"""
+    return jsonify([agent.to_dict() for agent in ProbeAgent.query.order_by(ProbeAgent.name).all()])
+
+def _agent_settings():
+    """Probe settings handed to agents with their shard"""
+    from services.agent_sharding import AGENT_HEARTBEAT_INTERVAL
+    settings = PingSettings.get_cached()
+    agent_settings = {field: getattr(settings, field) for field in (
+        'timeout', 'max_retries', 'max_threads', 'batch_size', 'adaptive_timeout',
+        'probe_rate', 'probe_burst', 'subnet_rate', 'probe_processes'
+    )}
+    agent_settings['heartbeat_interval'] = AGENT_HEARTBEAT_INTERVAL
+    return agent_settings
+
+@app.route('/api/agents/register', methods=['POST'])
+@agent_token_required
+def register_agent():
+    """Register a probe agent or renew its heartbeat"""
+    from services.agent_sharding import LOCAL_NODE
+    
+    data = request.get_json(silent=True) or {}
+    name = (data.get('name') or '').strip()
+    if not name or len(name) > 100 or name == LOCAL_NODE:
+        return jsonify({'error': 'invalid agent name'}), 400
+    
+    groups = [str(group).strip() for group in data.get('groups') or [] if str(group).strip()]
+    
+    try:
+        agent = ProbeAgent.query.filter_by(name=name).first()
+        if agent is None:
+            agent = ProbeAgent(name=name)
+            db.session.add(agent)
+            logger.info(f"Probe agent {name} joined from {request.remote_addr}")
+        agent.groups = ','.join(groups) or None
+        agent.host = request.remote_addr
+        agent.last_seen = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error registering probe agent {name}: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'registration failed'}), 500
+    
+    # Rebalance the coordinator's own shard on its next tick
+    from services.probe_control import refresh_schedule
+    refresh_schedule()
+    
+    return jsonify({'agent': agent.to_dict(), 'settings': _agent_settings()})
+
+@app.route('/api/agents/<name>/shard')
+@agent_token_required
+def agent_shard(name):
+    """Addresses assigned to a probe agent; also counts as its heartbeat"""
+    agent = ProbeAgent.query.filter_by(name=name).first()
+    if agent is None:
+        return jsonify({'error': 'agent is not registered'}), 404
+    
+    try:
+        agent.last_seen = datetime.utcnow()
+        db.session.commit()
+        
+        from services.ping_scheduler import agent_shard as shard_for
+        shard = shard_for(name)
+        
+        agent.address_count = len(shard)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error building shard for probe agent {name}: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'shard unavailable'}), 500
+    
+    return jsonify({'addresses': shard, 'settings': _agent_settings()})
+
+@app.route('/api/agents/<name>/results', methods=['POST'])
+@agent_token_required
+def agent_results(name):
+    """Store a batch of probe results pushed by an agent"""
+    agent = ProbeAgent.query.filter_by(name=name).first()
+    if agent is None:
+        return jsonify({'error': 'agent is not registered'}), 404
+    
+    results = (request.get_json(silent=True) or {}).get('results')
+    if not isinstance(results, list):
+        return jsonify({'error': 'results must be a list'}), 400
+    
+    try:
+        from services.ping_scheduler import store_agent_results
+        stored = store_agent_results(results)
+        
+        agent.results_received = (agent.results_received or 0) + stored
+        agent.last_seen = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error storing results of probe agent {name}: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'results not stored'}), 500
+    
+    return jsonify({'stored': stored})
+
+@app.route('/api/agents/<name>/leave', methods=['POST'])
+@agent_token_required
+def agent_leave(name):
+    """Unregister an agent that shuts down so its shard moves at once"""
+    agent = ProbeAgent.query.filter_by(name=name).first()
+    if agent is not None:
+        db.session.delete(agent)
+        db.session.commit()
+        logger.info(f"Probe agent {name} left")
+        
+        from services.probe_control import refresh_schedule
+        refresh_schedule()
+    
+    return jsonify({'ok': True})
+
 @app.route('/scheduler/start')
 @admin_required
 def start_scheduler():
     """Start the ping scheduler"""
     try:
-        from services.ping_scheduler import start_scheduler
+        from services.probe_control import start_scheduler
         start_scheduler()
         flash('Scheduler started', 'success')
+    except NotLeaderError:
+        flash('The scheduler is owned by another web server worker, retry the request', 'warning')
     except Exception as e:
         logger.error(f"Error starting scheduler: {str(e)}")
         flash('Error starting scheduler', 'error')
@@ -518,11 +763,13 @@ def start_scheduler():
 def stop_scheduler():
     """Stop the ping scheduler"""
     try:
-        if scheduler and scheduler.running:
-            scheduler.shutdown()
+        from services.probe_control import stop_scheduler
+        if stop_scheduler():
             flash('Планировщик остановлен', 'success')
         else:
             flash('Планировщик не запущен', 'info')
+    except NotLeaderError:
+        flash('Планировщик работает в другом воркере веб-сервера, повторите запрос', 'warning')
     except Exception as e:
         logger.error(f"Error stopping scheduler: {str(e)}")
         flash('Ошибка остановки планировщика', 'error')
@@ -539,6 +786,17 @@ def update_ping_settings():
         max_retries = request.form.get('max_retries', 3, type=int)
         max_threads = request.form.get('max_threads', 50, type=int)
         batch_size = request.form.get('batch_size', 100, type=int)
+        probe_processes = request.form.get('probe_processes', 1, type=int)
+        adaptive_timeout = request.form.get('adaptive_timeout') == 'on'
+        probe_rate = request.form.get('probe_rate', 0, type=int)
+        probe_burst = request.form.get('probe_burst', 50, type=int)
+        subnet_rate = request.form.get('subnet_rate', 0, type=int)
+        schedule_mode = request.form.get('schedule_mode', 'burst')
+        backoff_enabled = request.form.get('backoff_enabled') == 'on'
+        backoff_threshold = request.form.get('backoff_threshold', 5, type=int)
+        backoff_max_interval = request.form.get('backoff_max_interval', 3600, type=int)
+        storage_mode = request.form.get('storage_mode', 'full')
+        sample_window = request.form.get('sample_window', 300, type=int)
         
         # Validation
         if ping_interval < 5 or ping_interval > 3600:
@@ -561,6 +819,42 @@ def update_ping_settings():
             flash('Размер пакета должен быть от 10 до 1000', 'error')
             return redirect(url_for('settings'))
         
+        if probe_processes < 1 or probe_processes > 32:
+            flash('Количество процессов должно быть от 1 до 32', 'error')
+            return redirect(url_for('settings'))
+        
+        if probe_rate < 0 or probe_rate > 100000:
+            flash('Скорость отправки должна быть от 0 до 100000 пакетов/сек', 'error')
+            return redirect(url_for('settings'))
+        
+        if probe_burst < 1 or probe_burst > 10000:
+            flash('Размер пачки должен быть от 1 до 10000', 'error')
+            return redirect(url_for('settings'))
+        
+        if subnet_rate < 0 or subnet_rate > 10000:
+            flash('Лимит на подсеть должен быть от 0 до 10000 пакетов/сек', 'error')
+            return redirect(url_for('settings'))
+        
+        if schedule_mode not in ('burst', 'staggered'):
+            flash('Неизвестный режим опроса', 'error')
+            return redirect(url_for('settings'))
+        
+        if backoff_threshold < 1 or backoff_threshold > 100:
+            flash('Порог отказов должен быть от 1 до 100', 'error')
+            return redirect(url_for('settings'))
+        
+        if backoff_max_interval < ping_interval or backoff_max_interval > 86400:
+            flash('Максимальный интервал должен быть не меньше интервала пинга и не больше 86400 секунд', 'error')
+            return redirect(url_for('settings'))
+        
+        if storage_mode not in ('full', 'compact'):
+            flash('Неизвестный режим хранения', 'error')
+            return redirect(url_for('settings'))
+        
+        if sample_window < 60 or sample_window > 86400:
+            flash('Окно агрегации должно быть от 60 до 86400 секунд', 'error')
+            return redirect(url_for('settings'))
+        
         # Update settings
         settings = PingSettings.get_current()
         settings.ping_interval = ping_interval
@@ -568,15 +862,26 @@ def update_ping_settings():
         settings.max_retries = max_retries
         settings.max_threads = max_threads
         settings.batch_size = batch_size
+        settings.probe_processes = probe_processes
+        settings.adaptive_timeout = adaptive_timeout
+        settings.probe_rate = probe_rate
+        settings.probe_burst = probe_burst
+        settings.subnet_rate = subnet_rate
+        settings.schedule_mode = schedule_mode
+        settings.backoff_enabled = backoff_enabled
+        settings.backoff_threshold = backoff_threshold
+        settings.backoff_max_interval = backoff_max_interval
+        settings.storage_mode = storage_mode
+        settings.sample_window = sample_window
         
         db.session.commit()
         
-        # Restart scheduler with new settings
-        from services.ping_scheduler import restart_scheduler
-        restart_scheduler()
+        # Apply to the running scheduler and probe pool in place
+        from services.probe_control import reconfigure_scheduler
+        reconfigure_scheduler()
         
         flash('Настройки пинга обновлены', 'success')
-        logger.info(f"Updated ping settings: interval={ping_interval}s, timeout={timeout}s, retries={max_retries}, threads={max_threads}, batch={batch_size}")
+        logger.info(f"Updated ping settings: interval={ping_interval}s, timeout={timeout}s, retries={max_retries}, threads={max_threads}, batch={batch_size}, processes={probe_processes}, adaptive_timeout={adaptive_timeout}, pacing={probe_rate}pps/burst {probe_burst}/subnet {subnet_rate}pps, mode={schedule_mode}, backoff={backoff_enabled}/{backoff_threshold}/{backoff_max_interval}s, storage={storage_mode}/{sample_window}s")
         
     except Exception as e:
         logger.error(f"Error updating ping settings: {str(e)}")
@@ -585,6 +890,35 @@ def update_ping_settings():
     
     return redirect(url_for('settings'))
 
+@app.route('/update_retention_policies', methods=['POST'])
+@admin_required
+def update_retention_policies():
+    """Update how many days of history each table and rollup level keeps"""
+    try:
+        keep_days = {}
+        for target in RetentionPolicy.DEFAULTS:
+            days = request.form.get(target, type=int)
+            if days is None or days < 0 or days > 36500:
+                flash('Срок хранения должен быть от 0 до 36500 дней', 'error')
+                return redirect(url_for('settings'))
+            keep_days[target] = days
+        
+        RetentionPolicy.get_all()
+        for policy in RetentionPolicy.query.all():
+            if policy.target in keep_days:
+                policy.keep_days = keep_days[policy.target]
+        db.session.commit()
+        
+        flash('Сроки хранения истории обновлены', 'success')
+        logger.info(f"Updated retention policies: {keep_days}")
+        
+    except Exception as e:
+        logger.error(f"Error updating retention policies: {str(e)}")
+        flash('Ошибка обновления сроков хранения', 'error')
+        db.session.rollback()
+    
+    return redirect(url_for('settings'))
+
 @app.route('/optimize_ping_settings', methods=['POST'])
 @admin_required
 def optimize_ping_settings():
@@ -606,6 +940,10 @@ def optimize_ping_settings():
         
         db.session.commit()
         
+        # Resize the shared probe pool in place
+        from services.probe_control import reconfigure_scheduler
+        reconfigure_scheduler()
+        
         flash(f'Настройки оптимизированы для {address_count} адресов: {recommended["max_threads"]} потоков, пакет {recommended["batch_size"]}', 'success')
         logger.info(f"Auto-optimized settings for {address_count} addresses: {recommended}")
         
@@ -627,7 +965,7 @@ def export_database():
         # Export Network Addresses
         ws1 = wb.active
         ws1.title = "Network Addresses"
-        ws1.append(['ID', 'IP Address', 'Group Name', 'Active', 'Last Status', 'Last Ping Time', 'Created At'])
+        ws1.append(['ID', 'IP Address', 'Group Name', 'Active', 'Last Status', 'Last Ping Time', 'Created At', 'Ping Interval', 'Priority'])
         
         addresses = NetworkAddress.query.all()
         for addr in addresses:
@@ -638,7 +976,9 @@ def export_database():
                 addr.is_active,
                 addr.last_status,
                 addr.last_ping_time.isoformat() if addr.last_ping_time else None,
-                addr.created_at.isoformat()
+                addr.created_at.isoformat(),
+                addr.ping_interval,
+                addr.priority
             ])
         
         # Export Ping Logs
@@ -657,6 +997,26 @@ def export_database():
                 log.error_message
             ])
         
+        # Export aggregated samples (compact storage)
+        ws_samples = wb.create_sheet("Ping Samples")
+        ws_samples.append(['ID', 'Network Address ID', 'IP Address', 'Window Start', 'Window Seconds',
+                           'Probes', 'Lost', 'RTT Min', 'RTT Avg', 'RTT Max'])
+        
+        samples = PingSample.query.join(NetworkAddress).order_by(PingSample.window_start.desc()).limit(10000).all()
+        for sample in samples:
+            ws_samples.append([
+                sample.id,
+                sample.network_address_id,
+                sample.network_address.ip_address,
+                sample.window_start.isoformat(),
+                sample.window_seconds,
+                sample.probes,
+                sample.lost,
+                sample.rtt_min,
+                sample.rtt_avg,
+                sample.rtt_max
+            ])
+        
         # Export Network Interfaces
         ws3 = wb.create_sheet("Network Interfaces")
         ws3.append(['ID', 'Name', 'IP Address', 'Subnet', 'Selected', 'Created At'])
@@ -722,6 +1082,9 @@ def import_database():
                 if row[1]:  # IP Address column
                     ip_address = str(row[1])
                     group_name = str(row[2]) if row[2] else "Основная"
+                    # Ping Interval column is absent in older exports
+                    ping_interval = row[7] if len(row) > 7 and isinstance(row[7], int) and 5 <= row[7] <= 3600 else None
+                    priority = row[8] if len(row) > 8 and isinstance(row[8], int) else 0
                     
                     # Check if address already exists
                     existing = NetworkAddress.query.filter_by(ip_address=ip_address).first()
@@ -730,7 +1093,9 @@ def import_database():
                         if NetworkService.validate_ip(ip_address):
                             new_address = NetworkAddress(
                                 ip_address=ip_address,
-                                group_name=group_name
+                                group_name=group_name,
+                                ping_interval=ping_interval,
+                                priority=priority
                             )
                             db.session.add(new_address)
                             imported_count += 1
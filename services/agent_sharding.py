@@ -0,0 +1,84 @@
+import bisect
+import hashlib
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Имя узла-координатора в кольце (адреса, которые пингует сам веб-сервер)
+LOCAL_NODE = 'coordinator'
+
+# Виртуальных точек на узел: чем больше, тем ровнее распределение
+DEFAULT_REPLICAS = 100
+
+# Как часто агент забирает свою долю адресов (это же - отметка, что он жив), сек
+AGENT_HEARTBEAT_INTERVAL = 30
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Консистентное хеширование: при добавлении или уходе узла
+    переезжает только его доля ключей (~1/N), остальные остаются на месте"""
+
+    def __init__(self, nodes: Iterable[str], replicas: int = DEFAULT_REPLICAS):
+        self.nodes = sorted(set(nodes))
+        ring = sorted((_point(f"{node}#{replica}"), node) for node in self.nodes for replica in range(replicas))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def __bool__(self):
+        return bool(self.nodes)
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _point(key)) % len(self._points)
+        return self._owners[index]
+
+
+class ShardMap:
+    """Распределение адресов между агентами.
+
+    Агент, указавший группы, получает адреса только этих групп (площадка,
+    до которой достаёт лишь он); остальные адреса делятся консистентным
+    хешированием IP между агентами без групп и координатором.
+    """
+
+    def __init__(self, agents: Iterable[Tuple[str, List[str]]], include_local: bool = True):
+        general = [LOCAL_NODE] if include_local else []
+        by_group: Dict[str, List[str]] = {}
+        names = []
+
+        for name, groups in agents:
+            names.append(name)
+            if groups:
+                for group in groups:
+                    by_group.setdefault(group, []).append(name)
+            else:
+                general.append(name)
+
+        # Если все агенты привязаны к группам, а координатор не пингует - прочие адреса делят все агенты
+        self._general = HashRing(general or names)
+        self._groups = {group: HashRing(nodes) for group, nodes in by_group.items()}
+        self.agents = sorted(names)
+
+    @classmethod
+    def from_agents(cls, agents, include_local: Optional[bool] = None) -> 'ShardMap':
+        """Карта по записям ProbeAgent; include_local по умолчанию из COORDINATOR_PROBES"""
+        if include_local is None:
+            include_local = coordinator_probes()
+        return cls([(agent.name, agent.group_list()) for agent in agents], include_local)
+
+    @property
+    def distributed(self) -> bool:
+        return bool(self.agents)
+
+    def owner(self, ip_address: str, group_name: Optional[str] = None) -> str:
+        ring = self._groups.get(group_name) or self._general
+        return ring.node_for(ip_address) or LOCAL_NODE
+
+
+def coordinator_probes() -> bool:
+    """Пингует ли координатор свою долю адресов (COORDINATOR_PROBES=0 - только агенты)"""
+    return os.environ.get('COORDINATOR_PROBES', '1').strip().lower() not in ('0', 'false', 'no')
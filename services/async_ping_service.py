@@ -1,43 +1,241 @@
+import asyncio
 import concurrent.futures
+import contextlib
+import itertools
+import math
+import multiprocessing
+import queue
+import sys
 import threading
 import time
-from typing import List, Dict, Any
+import types
+import zlib
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
 
-from services.network_service import NetworkService
+from services.network_service import NetworkService, DEFAULT_TIMEOUT
+from services.icmp_multiplexer import IcmpMultiplexer, AsyncIcmpMultiplexer
+from services.rtt_estimator import RttEstimator
+from services.probe_pacer import ProbePacer, DEFAULT_BURST, subnet_key
 
 logger = logging.getLogger(__name__)
 
+# Движки пинга: потоки с ping3 или один мультиплексированный ICMP сокет
+ENGINE_THREADS = 'threads'
+ENGINE_ICMP = 'icmp'
+ENGINE_AUTO = 'auto'
+
+# Число одновременных проб в asyncio-режиме (корутины-воркеры, а не потоки)
+DEFAULT_MAX_CONCURRENCY = 1024
+
+# Если за это время не завершилась ни одна проба, окно считается зависшим
+WINDOW_STALL_TIMEOUT = 30
+
+# Маркер конца потока результатов в iter_results
+_STREAM_END = object()
+
+# Сколько готовых результатов ждёт потребителя iter_results; при заполнении новые
+# пробы не стартуют, пока запись в БД не догонит (память не растёт с размером прохода)
+STREAM_BUFFER_SIZE = 1024
+# Как часто заблокированный производитель проверяет, не остановлен ли поток (сек)
+STREAM_PUT_INTERVAL = 0.1
+
+# Шардированный режим: адреса делятся между процессами, у каждого свой сокет и цикл проб.
+# На меньшем числе адресов запуск процессов и передача результатов не окупаются
+SHARD_MIN_ADDRESSES = 2000
+MAX_PROCESSES = 32
+
+# Процесс шарда отправляет результаты пачками не реже чем раз в SHARD_CHUNK_INTERVAL сек
+SHARD_CHUNK_SIZE = 256
+SHARD_CHUNK_INTERVAL = 0.2
+
+# Как часто проверять, не упал ли процесс шарда, пока нет результатов (сек)
+SHARD_POLL_INTERVAL = 1.0
+
+
+def _shard_context():
+    """Процессы шардов не форкаются из веб-процесса: его потоки (планировщик, запись
+    результатов, WebSocket) в момент fork могли держать блокировки. forkserver форкает
+    их из отдельного чистого процесса, где его нет (Windows) - spawn"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # Сервер заранее загружает код шардов, а не скрипт запуска
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+@contextlib.contextmanager
+def _bare_main():
+    """spawn и forkserver выполняют скрипт запуска (__main__) в каждом новом процессе,
+    а с ним - всё веб-приложение вместе с планировщиком. На время запуска процессов
+    шардов __main__ подменяется пустым модулем, и они импортируют только свой код"""
+    main_module = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main_module
+
+
+# Очередь результатов в процессе шарда (задаётся при его запуске)
+_shard_results = None
+
+
+def _init_shard_worker(results_queue):
+    global _shard_results
+    _shard_results = results_queue
+
+
+def _run_shard(sweep_id: int, shard_id: int, ip_addresses: List[str], settings: Dict[str, Any], rtt_state):
+    """Проход по доле адресов в процессе шарда; результаты (позиция, результат)
+    уходят в общую очередь пачками, в конце - маркер None"""
+    service = AsyncPingService(**settings)
+    service.rtt_estimator.load(rtt_state)
+    chunk = []
+    last_put = time.monotonic()
+    
+    try:
+        for position, result in service._iter_window(ip_addresses):
+            chunk.append((position, result))
+            if len(chunk) >= SHARD_CHUNK_SIZE or time.monotonic() - last_put >= SHARD_CHUNK_INTERVAL:
+                _shard_results.put((sweep_id, shard_id, chunk))
+                chunk = []
+                last_put = time.monotonic()
+    finally:
+        if chunk:
+            _shard_results.put((sweep_id, shard_id, chunk))
+        _shard_results.put((sweep_id, shard_id, None))
+    
+    return len(ip_addresses)
+
 class AsyncPingService:
     """Асинхронный сервис для многопоточного пинга большого количества адресов"""
     
-    def __init__(self, max_threads: int = 50, batch_size: int = 100):
+    def __init__(self, max_threads: int = 50, batch_size: int = 100, engine: str = ENGINE_AUTO,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 executor: Optional[concurrent.futures.Executor] = None,
+                 timeout: float = DEFAULT_TIMEOUT, max_retries: int = 1, adaptive_timeout: bool = False,
+                 probe_rate: int = 0, probe_burst: int = DEFAULT_BURST, subnet_rate: int = 0,
+                 processes: int = 1):
         self.max_threads = max_threads
         self.batch_size = batch_size
+        self.max_concurrency = max(1, max_concurrency)
         self.network_service = NetworkService()
         self._lock = threading.Lock()
+        self.engine = self._resolve_engine(engine)
+        # Общий долгоживущий пул (см. services.probe_pool); без него пул создаётся на каждый проход
+        self.executor = executor
+        # timeout - предельный таймаут ответа (сек), max_retries - число попыток (как в PingSettings)
+        self.timeout = timeout
+        self.max_retries = max(1, max_retries)
+        self.adaptive_timeout = adaptive_timeout
+        self.rtt_estimator = RttEstimator()
+        # Темп отправки проб: пакетов в секунду всего и на подсеть /24 (0 - без ограничения)
+        self.pacer = ProbePacer(probe_rate, probe_burst, subnet_rate)
+        # Число процессов для больших проходов (1 - всё в этом процессе)
+        self.processes = max(1, min(processes, MAX_PROCESSES))
+        self._shard_pool = None
+        self._shard_pool_size = 0
+        self._shard_queue = None
+        self._sweep_ids = itertools.count()
+        # Проходы по шардам идут по одному: у пула одна очередь результатов, а задачи
+        # второго прохода всё равно ждали бы, пока процессы заняты первым
+        self._sweep_lock = threading.Lock()
+    
+    def _probe_options(self, ip_address: str) -> Dict[str, Any]:
+        """Таймаут первой попытки и число повторов для адреса"""
+        timeout = self.timeout
+        if self.adaptive_timeout:
+            timeout = self.rtt_estimator.timeout_for(ip_address, self.timeout)
+        
+        return {
+            'timeout': timeout,
+            'retries': self.max_retries - 1,
+            'max_timeout': self.timeout
+        }
+    
+    def _sweep_options(self, ip_addresses: List[str]) -> Dict[str, Any]:
+        """Параметры IcmpMultiplexer.iter_ping для прохода по списку адресов"""
+        options = {'retries': self.max_retries - 1, 'max_timeout': self.timeout}
+        if self.adaptive_timeout:
+            options['timeouts'] = [self.rtt_estimator.timeout_for(ip, self.timeout) for ip in ip_addresses]
+        return options
+    
+    def _observe(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Учёт результата в адаптивной оценке таймаута: RTT ответившего адреса,
+        а для не ответившего - удвоение его таймаута"""
+        if self.adaptive_timeout:
+            if result['status'] == 'up' and result['response_time'] is not None:
+                self.rtt_estimator.observe(result['ip_address'], result['response_time'] / 1000)
+            elif result['status'] == 'down':
+                self.rtt_estimator.timed_out(result['ip_address'], self.timeout)
+        return result
+    
+    def _stall_timeout(self) -> float:
+        """Сколько ждать хоть одного результата, прежде чем считать окно зависшим"""
+        # Каждая попытка длится не дольше self.timeout
+        return max(WINDOW_STALL_TIMEOUT, self.timeout * self.max_retries + 5)
+    
+    @contextlib.contextmanager
+    def _executor_for(self, workers: int):
+        """Общий пул, если он задан, иначе временный пул на время прохода"""
+        if self.executor is not None:
+            yield self.executor
+            return
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            yield executor
+    
+    @staticmethod
+    def _resolve_engine(engine: str) -> str:
+        """Выбор движка: ICMP мультиплексор, если доступен сокет, иначе потоки"""
+        if engine == ENGINE_THREADS:
+            return ENGINE_THREADS
+        
+        if IcmpMultiplexer.is_available():
+            return ENGINE_ICMP
         
+        if engine == ENGINE_ICMP:
+            logger.warning("ICMP socket is not available, falling back to threaded ping engine")
+        return ENGINE_THREADS
+        
+    @staticmethod
+    def _error_result(ip_address: str, error_message: str) -> Dict[str, Any]:
+        return {
+            'ip_address': ip_address,
+            'status': 'error',
+            'response_time': None,
+            'error_message': error_message,
+            'timestamp': datetime.utcnow()
+        }
+    
     def ping_single_address(self, ip_address: str) -> Dict[str, Any]:
         """Пинг одного IP адреса"""
         try:
-            result = self.network_service.ping_address(ip_address)
-            return result
+            result = self.network_service.ping_address(ip_address, pacer=self.pacer,
+                                                       **self._probe_options(ip_address))
+            return self._observe(result)
         except Exception as e:
             logger.error(f"Error pinging {ip_address}: {str(e)}")
-            return {
-                'ip_address': ip_address,
-                'status': 'error',
-                'response_time': None,
-                'error_message': str(e),
-                'timestamp': datetime.utcnow()
-            }
+            return self._error_result(ip_address, str(e))
     
     def ping_batch_async(self, ip_addresses: List[str]) -> List[Dict[str, Any]]:
         """Асинхронный пинг пакета IP адресов"""
         if not ip_addresses:
             return []
         
+        if self.engine == ENGINE_ICMP:
+            return self.ping_batch_multiplexed(ip_addresses)
+        
+        return self.ping_batch_threaded(ip_addresses)
+    
+    def ping_batch_threaded(self, ip_addresses: List[str]) -> List[Dict[str, Any]]:
+        """Пинг пакета IP адресов через пул потоков (по потоку на адрес)"""
+        if not ip_addresses:
+            return []
+        
         # Ограничиваем количество потоков разумными пределами
         actual_threads = min(self.max_threads, len(ip_addresses), 200)
         
@@ -47,7 +245,7 @@ class AsyncPingService:
         start_time = time.time()
         
         try:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=actual_threads) as executor:
+            with self._executor_for(actual_threads) as executor:
                 # Создаем future для каждого IP
                 future_to_ip = {
                     executor.submit(self.ping_single_address, ip): ip 
@@ -55,7 +253,7 @@ class AsyncPingService:
                 }
                 
                 # Собираем результаты
-                for future in concurrent.futures.as_completed(future_to_ip, timeout=30):
+                for future in concurrent.futures.as_completed(future_to_ip, timeout=self._stall_timeout()):
                     ip_address = future_to_ip[future]
                     try:
                         result = future.result()
@@ -91,59 +289,467 @@ class AsyncPingService:
         
         return results
     
+    def ping_batch_multiplexed(self, ip_addresses: List[str]) -> List[Dict[str, Any]]:
+        """Пинг пакета IPv4 адресов через один ICMP сокет без пула потоков"""
+        ipv4_addresses = [ip for ip in ip_addresses if IcmpMultiplexer.supports(ip)]
+        other_addresses = [ip for ip in ip_addresses if not IcmpMultiplexer.supports(ip)]
+        
+        logger.info(f"Starting multiplexed ICMP ping for {len(ipv4_addresses)} addresses")
+        
+        start_time = time.time()
+        
+        try:
+            with IcmpMultiplexer(timeout=self.timeout, pacer=self.pacer) as multiplexer:
+                results = multiplexer.ping_many(ipv4_addresses, **self._sweep_options(ipv4_addresses))
+            for result in results:
+                self._observe(result)
+        except OSError as e:
+            logger.error(f"ICMP multiplexer failed, falling back to threads: {str(e)}")
+            self.engine = ENGINE_THREADS
+            return self.ping_batch_threaded(ip_addresses)
+        
+        # IPv6 и имена хостов пингуем по-старому через ping3
+        results.extend(self.ping_batch_threaded(other_addresses))
+        
+        logger.info(f"Multiplexed ping completed in {time.time() - start_time:.2f}s for {len(results)} addresses")
+        
+        return results
+    
+    def _iter_threaded(self, ip_addresses: List[str]):
+        """Скользящее окно на пуле потоков: новый пинг стартует, как только освободился поток.
+
+        Отдаёт (индекс во входном списке, результат) по мере завершения.
+        """
+        if not ip_addresses:
+            return
+        
+        window = max(1, min(self.max_threads, len(ip_addresses), 200))
+        stall_timeout = self._stall_timeout()
+        
+        with self._executor_for(window) as executor:
+            in_flight = {}
+            next_index = 0
+            
+            while next_index < len(ip_addresses) or in_flight:
+                while next_index < len(ip_addresses) and len(in_flight) < window:
+                    future = executor.submit(self.ping_single_address, ip_addresses[next_index])
+                    in_flight[future] = next_index
+                    next_index += 1
+                
+                done, _ = concurrent.futures.wait(
+                    in_flight, timeout=stall_timeout,
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                
+                if not done:
+                    # Ни один пинг не завершился за разумное время - не держим окно бесконечно
+                    logger.warning(f"No ping completed within {stall_timeout}s, "
+                                  f"dropping {len(in_flight)} stalled probes")
+                    for future, index in in_flight.items():
+                        future.cancel()
+                        yield index, self._error_result(ip_addresses[index], 'Timeout during async ping')
+                    in_flight.clear()
+                    continue
+                
+                for future in done:
+                    index = in_flight.pop(future)
+                    try:
+                        yield index, future.result()
+                    except Exception as e:
+                        logger.error(f"Error processing result for {ip_addresses[index]}: {str(e)}")
+                        yield index, self._error_result(ip_addresses[index], f"Thread error: {str(e)}")
+    
+    def _iter_window(self, ip_addresses: List[str]):
+        """Непрерывная очередь проб выбранным движком: (индекс, результат) по мере готовности"""
+        order = self.pacer.order(ip_addresses)
+        if order is not None:
+            # Чередуем подсети, чтобы лимит на подсеть не тормозил всю очередь
+            for position, result in self._iter_window_ordered([ip_addresses[i] for i in order]):
+                yield order[position], result
+            return
+        
+        yield from self._iter_window_ordered(ip_addresses)
+    
+    def _iter_window_ordered(self, ip_addresses: List[str]):
+        if self.engine != ENGINE_ICMP:
+            yield from self._iter_threaded(ip_addresses)
+            return
+        
+        ipv4_indexes = [i for i, ip in enumerate(ip_addresses) if IcmpMultiplexer.supports(ip)]
+        other_indexes = [i for i, ip in enumerate(ip_addresses) if not IcmpMultiplexer.supports(ip)]
+        
+        yielded = set()
+        try:
+            with IcmpMultiplexer(timeout=self.timeout, pacer=self.pacer) as multiplexer:
+                ipv4_addresses = [ip_addresses[i] for i in ipv4_indexes]
+                for position, result in multiplexer.iter_ping(ipv4_addresses, **self._sweep_options(ipv4_addresses)):
+                    yielded.add(ipv4_indexes[position])
+                    yield ipv4_indexes[position], self._observe(result)
+        except OSError as e:
+            logger.error(f"ICMP multiplexer failed, falling back to threads: {str(e)}")
+            self.engine = ENGINE_THREADS
+            # Уже отданные результаты записаны - повторно пингуем только остальные адреса
+            remaining = [i for i in range(len(ip_addresses)) if i not in yielded]
+            for position, result in self._iter_threaded([ip_addresses[i] for i in remaining]):
+                yield remaining[position], result
+            return
+        
+        # IPv6 и имена хостов пингуем по-старому через ping3
+        other_addresses = [ip_addresses[i] for i in other_indexes]
+        for position, result in self._iter_threaded(other_addresses):
+            yield other_indexes[position], result
+    
+    def _use_shards(self, total: int) -> bool:
+        return self.processes > 1 and total >= SHARD_MIN_ADDRESSES
+    
+    def _shard_executor(self):
+        """Долгоживущий пул процессов шардов; пересоздаётся при смене их числа"""
+        with self._lock:
+            if self._shard_pool is None or self._shard_pool_size != self.processes:
+                if self._shard_pool is not None:
+                    self._shard_pool.shutdown(wait=False, cancel_futures=True)
+                context = _shard_context()
+                self._shard_queue = context.Queue()
+                self._shard_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=context,
+                    initializer=_init_shard_worker, initargs=(self._shard_queue,)
+                )
+                self._shard_pool_size = self.processes
+                logger.info(f"Started {self.processes} probe shard processes")
+            return self._shard_pool, self._shard_queue
+    
+    def _shard_settings(self) -> Dict[str, Any]:
+        """Настройки сервиса в процессе шарда: общий темп и потоки делятся поровну,
+        лимит подсети - нет, потому что подсеть целиком попадает в один шард"""
+        return {
+            'engine': self.engine,
+            'max_threads': max(1, self.max_threads // self.processes),
+            'batch_size': self.batch_size,
+            'timeout': self.timeout,
+            'max_retries': self.max_retries,
+            'adaptive_timeout': self.adaptive_timeout,
+            'probe_rate': self.pacer.rate / self.processes if self.pacer.rate else 0,
+            'probe_burst': max(1, self.pacer.burst // self.processes),
+            'subnet_rate': self.pacer.subnet_rate
+        }
+    
+    def _iter_sharded(self, ip_addresses: List[str]):
+        """Проход, разделённый по подсетям между процессами: (индекс, результат)
+        по мере готовности из всех шардов. Одновременные проходы ждут друг друга"""
+        with self._sweep_lock:
+            yield from self._iter_shards(ip_addresses)
+    
+    def _iter_shards(self, ip_addresses: List[str]):
+        executor, results_queue = self._shard_executor()
+        sweep_id = next(self._sweep_ids)
+        settings = self._shard_settings()
+        
+        shards = [[] for _ in range(self.processes)]
+        for index, ip_address in enumerate(ip_addresses):
+            shards[zlib.crc32(subnet_key(ip_address).encode('utf-8')) % self.processes].append(index)
+        shards = [indexes for indexes in shards if indexes]
+        
+        futures = {}
+        # Пул запускает недостающие процессы внутри submit
+        with _bare_main():
+            for shard_id, indexes in enumerate(shards):
+                shard_addresses = [ip_addresses[i] for i in indexes]
+                future = executor.submit(_run_shard, sweep_id, shard_id, shard_addresses, settings,
+                                         self.rtt_estimator.export(shard_addresses))
+                futures[future] = shard_id
+        
+        done_positions = [bytearray(len(indexes)) for indexes in shards]
+        finished = set()
+        
+        def unfinished(shard_id, reason):
+            # Адреса, по которым шард не успел ответить, отдаются ошибками
+            finished.add(shard_id)
+            for position, done in enumerate(done_positions[shard_id]):
+                if not done:
+                    index = shards[shard_id][position]
+                    yield index, self._error_result(ip_addresses[index], reason)
+        
+        while len(finished) < len(shards):
+            try:
+                item_sweep, shard_id, chunk = results_queue.get(timeout=SHARD_POLL_INTERVAL)
+            except queue.Empty:
+                for future, shard_id in futures.items():
+                    if shard_id not in finished and future.done() and future.exception() is not None:
+                        logger.error(f"Probe shard {shard_id} failed: {future.exception()}")
+                        if isinstance(future.exception(), concurrent.futures.BrokenExecutor):
+                            with self._lock:
+                                self._shard_pool = None
+                        yield from unfinished(shard_id, f"Shard process error: {future.exception()}")
+                continue
+            
+            if item_sweep != sweep_id:
+                continue  # хвост прохода, который потребитель бросил раньше
+            
+            if chunk is None:
+                yield from unfinished(shard_id, 'Shard finished without a result')
+                continue
+            
+            for position, result in chunk:
+                done_positions[shard_id][position] = 1
+                yield shards[shard_id][position], self._observe(result)
+    
     def ping_all_async(self, ip_addresses: List[str], progress_callback=None) -> List[Dict[str, Any]]:
-        """Асинхронный пинг всех IP адресов с разбивкой на пакеты"""
+        """Асинхронный пинг всех IP адресов непрерывной очередью без барьеров между пакетами.
+        
+        batch_size задаёт только шаг, с которым вызывается progress_callback.
+        """
         if not ip_addresses:
             return []
         
-        # Разбиваем на пакеты для оптимизации памяти и контроля
-        batches = [
-            ip_addresses[i:i + self.batch_size] 
-            for i in range(0, len(ip_addresses), self.batch_size)
-        ]
+        total = len(ip_addresses)
+        total_batches = math.ceil(total / self.batch_size)
         
-        logger.info(f"Processing {len(ip_addresses)} addresses in {len(batches)} batches")
+        sharded = self._use_shards(total)
+        logger.info(f"Processing {total} addresses with sliding window ({self.engine} engine"
+                    f"{f', {self.processes} processes' if sharded else ''})")
         
-        all_results = []
+        all_results: List[Dict[str, Any]] = [None] * total
+        completed = 0
         total_start_time = time.time()
         
-        for batch_num, batch in enumerate(batches, 1):
-            logger.info(f"Processing batch {batch_num}/{len(batches)} ({len(batch)} addresses)")
-            
-            batch_results = self.ping_batch_async(batch)
-            all_results.extend(batch_results)
+        # Результаты шардов приходят вперемешку и раскладываются по исходным индексам
+        source = self._iter_sharded(ip_addresses) if sharded else self._iter_window(ip_addresses)
+        for index, result in source:
+            all_results[index] = result
+            completed += 1
             
             # Вызываем callback для обновления прогресса
-            if progress_callback:
-                progress = (batch_num / len(batches)) * 100
-                progress_callback(progress, batch_num, len(batches))
+            if progress_callback and (completed % self.batch_size == 0 or completed == total):
+                progress_callback((completed / total) * 100, math.ceil(completed / self.batch_size), total_batches)
+        
+        self._log_summary(all_results, time.time() - total_start_time)
+        
+        return all_results
+    
+    async def _aiter_indexed(self, ip_addresses: List[str]):
+        """Asyncio-конвейер проб: (индекс во входном списке, результат) по мере готовности"""
+        if not ip_addresses:
+            return
+        
+        loop = asyncio.get_running_loop()
+        total = len(ip_addresses)
+        # Воркер с готовым результатом ждёт места, а не копит результаты в памяти
+        finished = asyncio.Queue(maxsize=max(self.max_concurrency, STREAM_BUFFER_SIZE))
+        
+        multiplexer = None
+        if self.engine == ENGINE_ICMP:
+            try:
+                multiplexer = await AsyncIcmpMultiplexer(timeout=self.timeout, pacer=self.pacer).__aenter__()
+            except OSError as e:
+                logger.error(f"ICMP socket unavailable, asyncio mode will use executor: {str(e)}")
+        
+        order = self.pacer.order(ip_addresses) or range(total)
+        pending = ((index, ip_addresses[index]) for index in order)
+        
+        async def worker():
+            # Каждый воркер берёт следующий адрес сразу после завершения предыдущего
+            for index, ip_address in pending:
+                if multiplexer is not None and IcmpMultiplexer.supports(ip_address):
+                    result = self._observe(await multiplexer.ping(ip_address, **self._probe_options(ip_address)))
+                else:
+                    # IPv6 и имена хостов - через ping3 в пуле исполнителя
+                    result = await loop.run_in_executor(self.executor, self.ping_single_address, ip_address)
+                await finished.put((index, result))
+        
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.max_concurrency, total))]
+        
+        try:
+            for _ in range(total):
+                yield await finished.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if multiplexer is not None:
+                await multiplexer.__aexit__(None, None, None)
+    
+    async def aiter_results(self, ip_addresses: List[str]):
+        """Асинхронный итератор: отдаёт результат каждой пробы сразу после её завершения"""
+        async for _, result in self._aiter_indexed(ip_addresses):
+            yield result
+    
+    async def ping_all_asyncio(self, ip_addresses: List[str], progress_callback=None) -> List[Dict[str, Any]]:
+        """Пинг всех IP адресов в цикле событий asyncio; параллелизм ограничен числом воркеров"""
+        if not ip_addresses:
+            return []
+        
+        total = len(ip_addresses)
+        total_batches = math.ceil(total / self.batch_size)
+        results: List[Dict[str, Any]] = [None] * total
+        completed = 0
+        
+        logger.info(f"Starting asyncio ping for {total} addresses, concurrency {self.max_concurrency}")
+        start_time = time.time()
+        
+        async for index, result in self._aiter_indexed(ip_addresses):
+            results[index] = result
+            completed += 1
             
-            # Небольшая пауза между пакетами для снижения нагрузки
-            if batch_num < len(batches):
-                time.sleep(0.1)
+            # Прогресс сообщаем с той же гранулярностью, что и в пакетном режиме
+            if progress_callback and (completed % self.batch_size == 0 or completed == total):
+                progress_callback((completed / total) * 100, math.ceil(completed / self.batch_size), total_batches)
         
-        total_duration = time.time() - total_start_time
+        self._log_summary(results, time.time() - start_time)
         
-        # Статистика
-        success_count = sum(1 for r in all_results if r['status'] == 'up')
-        failed_count = sum(1 for r in all_results if r['status'] == 'down')
-        error_count = sum(1 for r in all_results if r['status'] == 'error')
+        return results
+    
+    def ping_all_sync(self, ip_addresses: List[str], progress_callback=None) -> List[Dict[str, Any]]:
+        """Синхронная обёртка над ping_all_asyncio для вызова из потоков планировщика"""
+        if not ip_addresses:
+            return []
+        return asyncio.run(self.ping_all_asyncio(ip_addresses, progress_callback))
+    
+    def iter_results(self, ip_addresses: List[str], progress_callback=None):
+        """Синхронный генератор результатов по мере завершения проб.
         
-        logger.info(f"Async ping completed: {len(all_results)} total, "
-                   f"{success_count} up, {failed_count} down, {error_count} errors "
-                   f"in {total_duration:.2f}s")
+        Цикл событий работает в отдельном потоке, поэтому медленный потребитель
+        (запись в БД, WebSocket) не искажает время ответа и не задерживает пробы.
+        """
+        if not ip_addresses:
+            return
         
-        return all_results
+        total = len(ip_addresses)
+        total_batches = math.ceil(total / self.batch_size)
+        
+        if self._use_shards(total):
+            logger.info(f"Streaming ping for {total} addresses in {self.processes} processes")
+            stream = (result for _, result in self._iter_sharded(ip_addresses))
+        else:
+            logger.info(f"Streaming ping for {total} addresses, concurrency {self.max_concurrency}")
+            stream = self._iter_stream(ip_addresses)
+        
+        start_time = time.time()
+        counts = {'up': 0, 'down': 0, 'error': 0}
+        completed = 0
+        
+        with contextlib.closing(stream):
+            for item in stream:
+                completed += 1
+                counts[item['status']] = counts.get(item['status'], 0) + 1
+                yield item
+                
+                if progress_callback and (completed % self.batch_size == 0 or completed == total):
+                    progress_callback((completed / total) * 100, math.ceil(completed / self.batch_size), total_batches)
+        
+        logger.info(f"Async ping completed: {completed} total, "
+                   f"{counts['up']} up, {counts['down']} down, {counts['error']} errors "
+                   f"in {time.time() - start_time:.2f}s")
     
-    def update_settings(self, max_threads: int, batch_size: int):
+    def _iter_stream(self, ip_addresses: List[str]):
+        """Результаты asyncio-конвейера из потока с циклом событий"""
+        results_queue = queue.Queue(maxsize=STREAM_BUFFER_SIZE)
+        stop_event = threading.Event()
+        
+        async def pump():
+            async for item in self.aiter_results(ip_addresses):
+                # Очередь полна - ждём потребителя, не блокируя цикл событий (идущие пробы досчитываются)
+                while True:
+                    try:
+                        results_queue.put_nowait(item)
+                        break
+                    except queue.Full:
+                        if stop_event.is_set():
+                            return
+                        await asyncio.sleep(STREAM_PUT_INTERVAL)
+                if stop_event.is_set():
+                    break
+        
+        def put_final(item):
+            # Потребитель мог уже уйти - тогда маркер конца никому не нужен
+            while not stop_event.is_set():
+                try:
+                    results_queue.put(item, timeout=STREAM_PUT_INTERVAL)
+                    return
+                except queue.Full:
+                    continue
+        
+        def run_loop():
+            try:
+                asyncio.run(pump())
+            except Exception as e:
+                logger.error(f"Error in streaming ping loop: {str(e)}")
+                put_final(e)
+            finally:
+                put_final(_STREAM_END)
+        
+        producer = threading.Thread(target=run_loop, name='ping-stream', daemon=True)
+        producer.start()
+        
+        try:
+            while True:
+                item = results_queue.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop_event.set()
+    
+    @staticmethod
+    def _log_summary(results: List[Dict[str, Any]], duration: float):
+        """Итоговая статистика прохода"""
+        success_count = sum(1 for r in results if r['status'] == 'up')
+        failed_count = sum(1 for r in results if r['status'] == 'down')
+        error_count = sum(1 for r in results if r['status'] == 'error')
+        
+        logger.info(f"Async ping completed: {len(results)} total, "
+                   f"{success_count} up, {failed_count} down, {error_count} errors "
+                   f"in {duration:.2f}s")
+    
+    def update_settings(self, max_threads: int, batch_size: int, timeout: Optional[float] = None,
+                        max_retries: Optional[int] = None, adaptive_timeout: Optional[bool] = None,
+                        probe_rate: Optional[int] = None, probe_burst: Optional[int] = None,
+                        subnet_rate: Optional[int] = None, processes: Optional[int] = None):
         """Обновление настроек сервиса"""
         with self._lock:
+            previous = (self.max_threads, self.batch_size, self.timeout, self.max_retries, self.adaptive_timeout,
+                        self.processes)
+            pacing = (self.pacer.rate, self.pacer.burst, self.pacer.subnet_rate)
+            
             # Ограничиваем разумными пределами
             self.max_threads = max(1, min(max_threads, 200))
             self.batch_size = max(10, min(batch_size, 1000))
+            if timeout is not None:
+                self.timeout = max(0.1, min(timeout, 30))
+            if max_retries is not None:
+                self.max_retries = max(1, min(max_retries, 10))
+            if adaptive_timeout is not None:
+                self.adaptive_timeout = adaptive_timeout
+            if processes is not None:
+                # Пул процессов шардов пересоздаётся при следующем большом проходе
+                self.processes = max(1, min(processes, MAX_PROCESSES))
             
-        logger.info(f"Updated async ping settings: max_threads={self.max_threads}, "
-                   f"batch_size={self.batch_size}")
+            current = (self.max_threads, self.batch_size, self.timeout, self.max_retries, self.adaptive_timeout,
+                       self.processes)
+            
+            new_pacing = (
+                pacing[0] if probe_rate is None else probe_rate,
+                pacing[1] if probe_burst is None else probe_burst,
+                pacing[2] if subnet_rate is None else subnet_rate
+            )
+            if new_pacing != pacing:
+                self.pacer.configure(*new_pacing)
+                logger.info(f"Updated probe pacing: {self.pacer.rate} pps, burst {self.pacer.burst}, "
+                           f"{self.pacer.subnet_rate} pps per subnet")
+        
+        if current != previous:
+            logger.info(f"Updated async ping settings: max_threads={self.max_threads}, "
+                       f"batch_size={self.batch_size}, timeout={self.timeout}s, "
+                       f"attempts={self.max_retries}, adaptive_timeout={self.adaptive_timeout}, "
+                       f"processes={self.processes}")
+    
+    def close(self):
+        """Остановка процессов шардов"""
+        with self._lock:
+            pool, self._shard_pool = self._shard_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
     
     def get_recommended_settings(self, address_count: int) -> Dict[str, int]:
         """Получение рекомендуемых настроек для количества адресов"""
@@ -0,0 +1,365 @@
+import asyncio
+import heapq
+import ipaddress
+import logging
+import os
+import select
+import socket
+import struct
+import time
+from collections import deque
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+# Заголовок ICMP: type, code, checksum, identifier, sequence
+ICMP_HEADER_FORMAT = '!BBHHH'
+ICMP_HEADER_SIZE = struct.calcsize(ICMP_HEADER_FORMAT)
+
+# Полезная нагрузка echo-запроса (как у стандартного ping - 56 байт)
+PAYLOAD_SIZE = 56
+
+# Буфер приёма сокета: при массовом опросе ответы приходят пачками
+SOCKET_RCVBUF = 4 * 1024 * 1024
+
+# Максимум запросов "в полёте" на один сокет по умолчанию
+DEFAULT_MAX_IN_FLIGHT = 1024
+
+
+def icmp_checksum(data: bytes) -> int:
+    """Контрольная сумма ICMP (RFC 1071)"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier: int, sequence: int, payload: bytes = b'') -> bytes:
+    """Сборка пакета ICMP echo request"""
+    header = struct.pack(ICMP_HEADER_FORMAT, ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = icmp_checksum(header + payload)
+    header = struct.pack(ICMP_HEADER_FORMAT, ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence)
+    return header + payload
+
+
+def parse_echo_reply(packet: bytes) -> Optional[Tuple[int, int]]:
+    """Разбор ICMP echo reply, возвращает (identifier, sequence) или None"""
+    # Raw-сокет (и datagram-сокет на macOS) отдаёт пакет вместе с IP-заголовком
+    if packet and packet[0] >> 4 == 4:
+        packet = packet[(packet[0] & 0x0F) * 4:]
+
+    if len(packet) < ICMP_HEADER_SIZE:
+        return None
+
+    icmp_type, _code, _checksum, identifier, sequence = struct.unpack(
+        ICMP_HEADER_FORMAT, packet[:ICMP_HEADER_SIZE]
+    )
+    if icmp_type != ICMP_ECHO_REPLY:
+        return None
+    return identifier, sequence
+
+
+class IcmpMultiplexer:
+    """Опрос множества адресов через один ICMP сокет с сопоставлением ответов по identifier/sequence"""
+
+    def __init__(self, timeout: float = 3.0, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, pacer=None):
+        self.timeout = timeout
+        self.max_in_flight = max(1, max_in_flight)
+        # ProbePacer: темп отправки запросов (None - без ограничения)
+        self.pacer = pacer
+        self.identifier = os.getpid() & 0xFFFF
+        self._sequence = 0
+        self._sock = None
+        # Datagram ICMP сокет: ядро само подменяет identifier и фильтрует чужие ответы
+        self._is_raw = False
+
+    @staticmethod
+    def supports(ip_address: str) -> bool:
+        """Мультиплексор работает только с IPv4 адресами"""
+        try:
+            return isinstance(ipaddress.ip_address(ip_address), ipaddress.IPv4Address)
+        except ValueError:
+            return False
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """Проверка возможности открыть ICMP сокет (нужны права или ping_group_range)"""
+        try:
+            sock, _ = cls._open_socket()
+            sock.close()
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _open_socket():
+        """Открытие ICMP сокета: сначала непривилегированный datagram, затем raw"""
+        try:
+            return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+        except OSError:
+            return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+
+    def open(self):
+        """Открытие сокета мультиплексора"""
+        if self._sock is not None:
+            return
+
+        self._sock, self._is_raw = self._open_socket()
+        self._sock.setblocking(False)
+        try:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF)
+        except OSError as e:
+            logger.debug(f"Could not enlarge ICMP receive buffer: {str(e)}")
+
+        logger.debug(f"Opened {'raw' if self._is_raw else 'datagram'} ICMP socket")
+
+    def close(self):
+        """Закрытие сокета мультиплексора"""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _next_sequence(self) -> int:
+        self._sequence = (self._sequence + 1) & 0xFFFF
+        return self._sequence
+
+    def _build_packet(self, sequence: int) -> bytes:
+        payload = struct.pack('!d', time.perf_counter()).ljust(PAYLOAD_SIZE, b'Q')
+        return build_echo_request(self.identifier, sequence, payload)
+
+    def _send(self, ip_address: str, sequence: int):
+        """Отправка echo request, при переполнении буфера ждём готовности сокета"""
+        packet = self._build_packet(sequence)
+
+        while True:
+            try:
+                self._sock.sendto(packet, (ip_address, 0))
+                return
+            except (BlockingIOError, InterruptedError):
+                select.select([], [self._sock], [], 0.01)
+
+    def _read_replies(self):
+        """Чтение всех доступных в сокете echo reply: (ip, sequence, время приёма)"""
+        while True:
+            try:
+                packet, (source_ip, _port) = self._sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+
+            received_at = time.perf_counter()
+            parsed = parse_echo_reply(packet)
+            if parsed is None:
+                continue
+
+            identifier, sequence = parsed
+            # Raw-сокет получает все ICMP пакеты хоста - отбрасываем чужие
+            if self._is_raw and identifier != self.identifier:
+                continue
+
+            yield source_ip, sequence, received_at
+
+    def _receive(self, wait: float, pending: Dict[Tuple[str, int], Tuple[int, float]]):
+        """Приём всех доступных ответов в течение wait секунд: (индекс, результат)"""
+        readable, _, _ = select.select([self._sock], [], [], max(wait, 0))
+        if not readable:
+            return
+
+        for source_ip, sequence, received_at in self._read_replies():
+            entry = pending.pop((source_ip, sequence), None)
+            if entry is None:
+                continue  # опоздавший или повторный ответ
+
+            index, sent_at = entry
+            yield index, self._make_result(source_ip, 'up', (received_at - sent_at) * 1000)
+
+    @staticmethod
+    def _make_result(ip_address: str, status: str, response_time: Optional[float] = None,
+                     error_message: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            'ip_address': ip_address,
+            'status': status,
+            'response_time': response_time,
+            'timestamp': datetime.utcnow(),
+            'error_message': error_message
+        }
+
+    def iter_ping(self, ip_addresses: List[str], timeout: Optional[float] = None,
+                  timeouts: Optional[List[float]] = None, retries: int = 0,
+                  max_timeout: Optional[float] = None):
+        """Пинг списка IPv4 адресов из одного потока с окном max_in_flight.
+
+        timeouts задаёт таймаут первой попытки для каждого адреса (иначе общий timeout).
+        Повтор отправляется только адресу, не ответившему вовремя; таймаут повтора
+        удваивается, но не больше max_timeout. Если задан pacer, запросы (и повторы)
+        уходят в его темпе, а ответы в паузах продолжают приниматься.
+        Отдаёт (индекс во входном списке, результат) по мере получения ответов или истечения таймаутов.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        max_timeout = max(timeout, max_timeout or timeout)
+        # (ip, sequence) -> (индекс во входном списке, время отправки)
+        pending: Dict[Tuple[str, int], Tuple[int, float]] = {}
+        # Куча (срок ожидания, ip, sequence): таймауты у адресов разные
+        deadlines = []
+        # индекс -> (номер попытки, таймаут текущей попытки)
+        attempts: Dict[int, Tuple[int, float]] = {}
+        # Повторы, ожидающие отправки: (индекс, номер попытки, таймаут)
+        resend = deque()
+
+        opened_here = self._sock is None
+        self.open()
+
+        def send(index: int, attempt: int, attempt_timeout: float):
+            ip_address = ip_addresses[index]
+            sequence = self._next_sequence()
+            self._send(ip_address, sequence)
+            sent_at = time.perf_counter()
+            pending[(ip_address, sequence)] = (index, sent_at)
+            attempts[index] = (attempt, attempt_timeout)
+            heapq.heappush(deadlines, (sent_at + attempt_timeout, ip_address, sequence))
+
+        try:
+            next_index = 0
+            while next_index < len(ip_addresses) or pending or resend:
+                # Дозаполняем окно: новый запрос уходит, как только освободилось место
+                # (повторы - в первую очередь); пауза темпа отправки ограничивает ожидание ответов
+                pace_wait = None
+                while (resend or next_index < len(ip_addresses)) and len(pending) < self.max_in_flight:
+                    if resend:
+                        index, attempt, attempt_timeout = resend[0]
+                    else:
+                        index, attempt = next_index, 0
+                        attempt_timeout = timeouts[index] if timeouts else timeout
+
+                    if self.pacer is not None:
+                        pace_wait = self.pacer.try_acquire(ip_addresses[index]) or None
+                        if pace_wait:
+                            break
+
+                    if resend:
+                        resend.popleft()
+                    else:
+                        next_index += 1
+
+                    try:
+                        send(index, attempt, attempt_timeout)
+                    except OSError as e:
+                        logger.error(f"Error sending ICMP echo to {ip_addresses[index]}: {str(e)}")
+                        yield index, self._make_result(ip_addresses[index], 'error', error_message=str(e))
+
+                if not pending:
+                    if pace_wait:
+                        time.sleep(pace_wait)
+                    continue
+
+                # Ждём ответы до ближайшего истечения таймаута
+                while deadlines and (deadlines[0][1], deadlines[0][2]) not in pending:
+                    heapq.heappop(deadlines)
+                wait = deadlines[0][0] - time.perf_counter() if deadlines else 0
+                if pace_wait:
+                    wait = min(wait, pace_wait)
+                for index, result in self._receive(wait, pending):
+                    attempts.pop(index, None)
+                    yield index, result
+
+                # Просроченные запросы: повтор или хост не ответил
+                now = time.perf_counter()
+                while deadlines and deadlines[0][0] <= now:
+                    _, ip_address, sequence = heapq.heappop(deadlines)
+                    entry = pending.pop((ip_address, sequence), None)
+                    if entry is None:
+                        continue
+
+                    index = entry[0]
+                    attempt, attempt_timeout = attempts.pop(index)
+                    if attempt < retries:
+                        resend.append((index, attempt + 1, min(attempt_timeout * 2, max_timeout)))
+                        continue
+                    yield index, self._make_result(ip_address, 'down')
+        finally:
+            if opened_here:
+                self.close()
+
+    def ping_many(self, ip_addresses: List[str], timeout: Optional[float] = None,
+                  **options) -> List[Dict[str, Any]]:
+        """Пинг списка IPv4 адресов из одного потока; результаты в порядке входного списка"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(ip_addresses)
+        for index, result in self.iter_ping(ip_addresses, timeout, **options):
+            results[index] = result
+
+        up_count = sum(1 for r in results if r['status'] == 'up')
+        logger.debug(f"ICMP multiplexer swept {len(results)} addresses, {up_count} up")
+
+        return results
+
+class AsyncIcmpMultiplexer(IcmpMultiplexer):
+    """Asyncio-вариант мультиплексора: неблокирующий сокет в цикле событий, ответы будят ожидающие корутины"""
+
+    def __init__(self, timeout: float = 3.0, pacer=None):
+        super().__init__(timeout=timeout, pacer=pacer)
+        self._loop = None
+        # (ip, sequence) -> future с временем приёма ответа
+        self._waiters: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    async def __aenter__(self):
+        self.open()
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._sock.fileno(), self._on_readable)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self._loop is not None and self._sock is not None:
+            self._loop.remove_reader(self._sock.fileno())
+        for waiter in self._waiters.values():
+            waiter.cancel()
+        self._waiters.clear()
+        self._loop = None
+        self.close()
+
+    def _on_readable(self):
+        """Обработчик готовности сокета: раздаём ответы ожидающим корутинам"""
+        for source_ip, sequence, received_at in self._read_replies():
+            waiter = self._waiters.pop((source_ip, sequence), None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(received_at)
+
+    async def ping(self, ip_address: str, timeout: Optional[float] = None, retries: int = 0,
+                   max_timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Пинг одного IPv4 адреса без блокировки цикла событий; повтор - только при отсутствии ответа"""
+        timeout = self.timeout if timeout is None else timeout
+        max_timeout = max(timeout, max_timeout or timeout)
+
+        for attempt in range(retries + 1):
+            sequence = self._next_sequence()
+            key = (ip_address, sequence)
+            waiter = self._loop.create_future()
+            self._waiters[key] = waiter
+
+            try:
+                if self.pacer is not None:
+                    await self.pacer.acquire_async(ip_address)
+                await self._loop.sock_sendto(self._sock, self._build_packet(sequence), (ip_address, 0))
+                sent_at = time.perf_counter()
+                received_at = await asyncio.wait_for(waiter, timeout)
+                return self._make_result(ip_address, 'up', (received_at - sent_at) * 1000)
+            except asyncio.TimeoutError:
+                timeout = min(timeout * 2, max_timeout)
+            except OSError as e:
+                logger.error(f"Error sending ICMP echo to {ip_address}: {str(e)}")
+                return self._make_result(ip_address, 'error', error_message=str(e))
+            finally:
+                self._waiters.pop(key, None)
+
+        return self._make_result(ip_address, 'down')
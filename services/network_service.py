@@ -2,11 +2,14 @@ import ipaddress
 import netifaces
 import logging
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from ping3 import ping
 
 logger = logging.getLogger(__name__)
 
+# Default ICMP reply timeout in seconds
+DEFAULT_TIMEOUT = 3
+
 class NetworkService:
     def __init__(self):
         pass
@@ -63,8 +66,14 @@ class NetworkService:
         """Alias for detect_network_interfaces for backward compatibility"""
         return self.detect_network_interfaces()
     
-    def ping_address(self, ip_address: str) -> Dict[str, Any]:
-        """Ping a single IP address using ping3 library (ICMP only)"""
+    def ping_address(self, ip_address: str, timeout: float = DEFAULT_TIMEOUT, retries: int = 0,
+                     max_timeout: Optional[float] = None, pacer=None) -> Dict[str, Any]:
+        """Ping a single IP address using ping3 library (ICMP only).
+        
+        Retries are sent only when no reply arrived; each retry doubles the
+        timeout, up to max_timeout (defaults to the initial timeout).
+        If a ProbePacer is given, every attempt waits for its permission.
+        """
         result = {
             'ip_address': ip_address,
             'status': 'unknown',
@@ -73,9 +82,27 @@ class NetworkService:
             'error_message': None
         }
         
+        max_timeout = max(timeout, max_timeout or timeout)
+        attempt_timeout = timeout
+        response_time = None
+        
         try:
-            # Use ICMP ping only
-            response_time = ping(ip_address, timeout=3, unit='ms')
+            for attempt in range(retries + 1):
+                if pacer is not None:
+                    pacer.acquire(ip_address)
+                
+                # Use ICMP ping only; ping3 returns None on timeout and False on
+                # errors such as destination unreachable
+                response_time = ping(ip_address, timeout=attempt_timeout, unit='ms')
+                
+                if response_time is False:
+                    response_time = None
+                if response_time is not None:
+                    break
+                
+                attempt_timeout = min(attempt_timeout * 2, max_timeout)
+            
+            result['timestamp'] = datetime.utcnow()
             
             if response_time is not None:
                 result['status'] = 'up'
@@ -83,7 +110,7 @@ class NetworkService:
                 logger.info(f"Successfully ICMP pinged {ip_address}: {result['status']}, {response_time}ms")
             else:
                 result['status'] = 'down'
-                logger.debug(f"Host {ip_address} is down (no ICMP response)")
+                logger.debug(f"Host {ip_address} is down (no ICMP response after {retries + 1} attempts)")
                 
         except Exception as e:
             logger.error(f"Error pinging {ip_address}: {str(e)}")
@@ -1,167 +1,957 @@
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, timedelta
+import heapq
 import logging
+import os
 import atexit
+import threading
+import time
+import zlib
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.exc import SQLAlchemyError
 
 from app import app, db
-from models import NetworkAddress, PingLog, PingSettings
+from models import NetworkAddress, PingLog, PingSample, PingSettings, GroupSettings, ProbeAgent, StatusTransition
+from services.agent_sharding import LOCAL_NODE, ShardMap
+from services.result_spool import ResultSpool
+from services.retention import RETENTION_INTERVAL, get_retention_status, run_retention
+from services.rollups import mark_rollups_live, merge_rollups, rollup_rows
+from services.sqlite_tuning import SQLITE_MAINTENANCE_INTERVAL, get_sqlite_status, run_sqlite_maintenance
+from services.result_writer import ResultWriter
 from services.network_service import NetworkService
-from services.async_ping_service import AsyncPingService
+from services.probe_pool import init_probe_pool, get_probe_pool_stats, shutdown_probe_pool
 
 logger = logging.getLogger(__name__)
 
 # Global scheduler instance
 scheduler = None
+scheduler_mode = None
+_atexit_registered = False
+
+# Set by probe_daemon.py: events go to the web process over IPC instead of SocketIO
+event_publisher = None
+
+# Bulk statements for streamed results: one executemany per flush instead of
+# an ORM object per PingLog row and a dirty-tracked update per address
+_ping_log_insert = insert(PingLog.__table__)
+_ping_sample_insert = insert(PingSample.__table__)
+_status_transition_insert = insert(StatusTransition.__table__)
+_address_status_update = (
+    update(NetworkAddress.__table__)
+    .where(NetworkAddress.__table__.c.id == bindparam('b_id'))
+    .values(
+        last_status=bindparam('b_status'),
+        last_ping_time=bindparam('b_ping_time'),
+        consecutive_failures=bindparam('b_failures')
+    )
+)
+
+# Statuses a probe agent may report
+AGENT_RESULT_STATUSES = ('up', 'down', 'error')
+
+# Storage modes: a PingLog row per probe, or rows on status changes only
+# plus a PingSample per address and window
+STORAGE_FULL = 'full'
+STORAGE_COMPACT = 'compact'
+
+# Scheduling modes: sweep every address at once, or spread them over the interval
+SCHEDULE_BURST = 'burst'
+SCHEDULE_STAGGERED = 'staggered'
+
+# The schedule is checked for due addresses this often (seconds)
+SCHEDULER_TICK = 1
+
+# Address list and interval overrides are re-read from the database this often (seconds)
+SCHEDULE_SYNC_INTERVAL = 10
+
+# A cycle overruns when its probes start this share of their interval late
+OVERRUN_LAG_RATIO = 0.5
+# Consecutive overrunning cycles that switch to degraded mode, and calm cycles that end it
+OVERRUN_CYCLES = 3
+RECOVERY_CYCLES = 5
+# In degraded mode normal-priority addresses are probed this many times less often
+DEGRADED_INTERVAL_FACTOR = 2
+
+# Ticks run concurrently so a slow probe never holds back other due addresses; an address
+# is probed by one cycle at a time (in-flight addresses are skipped until their probe ends)
+MAX_CONCURRENT_CYCLES = 8
+
+# A manual ping waits this long for its result to be written (seconds)
+MANUAL_PING_WRITE_TIMEOUT = 5
+
+# What a tick needs to probe an address and reconcile its result. The schedule keeps
+# it in memory, so probing goes on (into the spool) while the database is unreachable
+ScheduledAddress = namedtuple('ScheduledAddress',
+                              'id ip_address group_name priority last_status consecutive_failures')
+
+def address_phase(address_id, interval):
+    """Stable offset of an address within its interval, derived from a hash of its id"""
+    return zlib.crc32(str(address_id).encode()) % max(1, interval)
+
+class ProbeSchedule:
+    """Next due time of every address in one heap, so a single tick job serves
+    any mix of per-address intervals.
+    
+    With backoff set to (threshold, max interval), an address that failed
+    threshold probes in a row has its interval doubled per further failure,
+    up to the max interval, until it answers again.
+    """
+    
+    def __init__(self, staggered=False, backoff=None):
+        self.staggered = staggered
+        self.backoff = backoff
+        # address id -> consecutive failed probes
+        self._failures = {}
+        # address id -> priority (higher is probed first in degraded mode)
+        self._priorities = {}
+        # address id -> (ip address, group name) and last known status
+        self._addresses = {}
+        self._statuses = {}
+        # (due time, address id, generation); stale entries are skipped lazily
+        self._heap = []
+        # address id -> (interval, generation)
+        self._entries = {}
+        # Addresses whose previous probe has not finished yet
+        self._in_flight = set()
+        # Due probes skipped because the previous probe of the address was still running
+        self.skipped_in_flight = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+    
+    def _first_due(self, address_id, interval, now):
+        if not self.staggered:
+            return now
+        # Aligned to the wall clock, so the phase survives restarts
+        return now + (address_phase(address_id, interval) - now) % interval
+    
+    def _interval_for(self, address_id, interval):
+        """Interval stretched by backoff for hosts that keep failing"""
+        if not self.backoff:
+            return interval
+        
+        threshold, max_interval = self.backoff
+        excess = self._failures.get(address_id, 0) - threshold
+        if excess < 0:
+            return interval
+        return max(interval, min(interval * 2 ** min(excess + 1, 32), max_interval))
+    
+    def configure(self, staggered, backoff, now=None):
+        """Switch scheduling mode and backoff in place; a mode change re-phases every address"""
+        now = time.time() if now is None else now
+        
+        with self._lock:
+            self.backoff = backoff
+            if staggered == self.staggered:
+                return
+            
+            self.staggered = staggered
+            self._heap = []
+            for address_id, (interval, _) in self._entries.items():
+                self._generation += 1
+                self._entries[address_id] = (interval, self._generation)
+                self._heap.append((self._first_due(address_id, interval, now), address_id, self._generation))
+            heapq.heapify(self._heap)
+    
+    def _reschedule(self, address_id, now):
+        entry = self._entries.get(address_id)
+        if entry is None:
+            return
+        self._generation += 1
+        self._entries[address_id] = (entry[0], self._generation)
+        heapq.heappush(self._heap, (now + entry[0], address_id, self._generation))
+    
+    def sync(self, intervals, now=None, failures=None, priorities=None, addresses=None, statuses=None):
+        """Apply the current {address id: interval} map: add, drop and reschedule addresses.
+        
+        failures (consecutive failure counts, missing ids count as 0) replaces the
+        known counts, which ends the backoff of addresses whose count was cleared
+        elsewhere, e.g. by a manual ping in another process. addresses ({id: (ip
+        address, group name)}) and statuses refresh the probing snapshot.
+        """
+        now = time.time() if now is None else now
+        
+        with self._lock:
+            if priorities is not None:
+                self._priorities = priorities
+            if addresses is not None:
+                self._addresses = {address_id: addresses[address_id] for address_id in intervals}
+            if statuses is not None:
+                self._statuses = {address_id: statuses.get(address_id) for address_id in intervals}
+            
+            for address_id in list(self._entries):
+                if address_id not in intervals:
+                    del self._entries[address_id]
+                    self._failures.pop(address_id, None)
+                    self._statuses.pop(address_id, None)
+            
+            for address_id, interval in intervals.items():
+                entry = self._entries.get(address_id)
+                if entry is not None and entry[0] == interval:
+                    continue
+                
+                self._generation += 1
+                self._entries[address_id] = (interval, self._generation)
+                heapq.heappush(self._heap, (self._first_due(address_id, interval, now), address_id, self._generation))
+            
+            if failures is not None:
+                for address_id in self._entries:
+                    backed_off = self._interval_for(address_id, 1) > 1
+                    self._failures[address_id] = failures.get(address_id, 0)
+                    if backed_off and self._interval_for(address_id, 1) == 1:
+                        self._reschedule(address_id, now)
+            
+            # Drop stale heap entries once they dominate the heap
+            if len(self._heap) > 2 * len(self._entries) + 1024:
+                self._heap = [item for item in self._heap if self._entries.get(item[1], (0, None))[1] == item[2]]
+                heapq.heapify(self._heap)
+    
+    def pop_due(self, now=None, degraded=False):
+        """Addresses due for a probe, each rescheduled one interval later.
+        
+        Returns (ids by descending priority, worst start lag in seconds, worst lag
+        as a share of the address interval). In degraded mode normal-priority
+        addresses get a stretched interval so high-priority ones keep up.
+        """
+        now = time.time() if now is None else now
+        due_ids = []
+        lag = lag_ratio = 0.0
+        
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, address_id, generation = heapq.heappop(self._heap)
+                entry = self._entries.get(address_id)
+                if entry is None or entry[1] != generation:
+                    continue
+                
+                lag = max(lag, now - due)
+                lag_ratio = max(lag_ratio, (now - due) / entry[0])
+                
+                interval = self._interval_for(address_id, entry[0])
+                if degraded and self._priorities.get(address_id, 0) <= 0:
+                    interval *= DEGRADED_INTERVAL_FACTOR
+                # Keep the cadence; after a stall skip the missed rounds instead of catching up
+                next_due = due + interval
+                if next_due <= now:
+                    next_due = now + interval
+                heapq.heappush(self._heap, (next_due, address_id, generation))
+                
+                if address_id in self._in_flight:
+                    self.skipped_in_flight += 1
+                    continue
+                self._in_flight.add(address_id)
+                due_ids.append(address_id)
+            
+            due_ids.sort(key=lambda address_id: -self._priorities.get(address_id, 0))
+        
+        return due_ids, lag, lag_ratio
+    
+    def claim(self, address_ids):
+        """Mark addresses as in flight outside the schedule (full sweep); returns
+        the ones that were not already being probed"""
+        with self._lock:
+            claimed = [address_id for address_id in address_ids if address_id not in self._in_flight]
+            self._in_flight.update(claimed)
+        return claimed
+    
+    def done(self, address_ids):
+        """Mark probes as finished"""
+        with self._lock:
+            self._in_flight.difference_update(address_ids)
+    
+    def record(self, address_id, failures, status=None, now=None):
+        """Update the consecutive failure count and status after a probe; a host that
+        answers again after backing off goes straight back to its normal interval"""
+        now = time.time() if now is None else now
+        
+        with self._lock:
+            backed_off = self._interval_for(address_id, 1) > 1
+            self._failures[address_id] = failures
+            if status is not None and address_id in self._addresses:
+                self._statuses[address_id] = status
+            if backed_off and not failures:
+                self._reschedule(address_id, now)
+    
+    def backed_off(self):
+        """Ids of addresses probed at a stretched interval"""
+        with self._lock:
+            return [address_id for address_id in self._entries if self._interval_for(address_id, 1) > 1]
+    
+    def addresses(self, address_ids):
+        """Snapshots of the given addresses in the same order; unknown ids are skipped"""
+        with self._lock:
+            return [
+                ScheduledAddress(address_id, *self._addresses[address_id], self._priorities.get(address_id, 0),
+                                 self._statuses.get(address_id), self._failures.get(address_id, 0))
+                for address_id in address_ids if address_id in self._addresses
+            ]
+    
+    def stats(self):
+        with self._lock:
+            live = [item[0] for item in self._heap if self._entries.get(item[1], (0, None))[1] == item[2]]
+            intervals = {}
+            for interval, _ in self._entries.values():
+                intervals[interval] = intervals.get(interval, 0) + 1
+            
+            return {
+                'addresses': len(self._entries),
+                'in_flight': len(self._in_flight),
+                'skipped_in_flight': self.skipped_in_flight,
+                'backed_off': sum(1 for address_id in self._entries if self._interval_for(address_id, 1) > 1),
+                'next_due_in': round(max(0, min(live) - time.time()), 1) if live else None,
+                # Probes per second implied by the configured intervals
+                'probe_rate': round(sum(count / interval for interval, count in intervals.items()), 2),
+                'intervals': {str(interval): count for interval, count in sorted(intervals.items())}
+            }
+
+class SampleWindows:
+    """Per-address aggregation of probe results into fixed windows for compact storage.
+    
+    A window is closed, and its PingSample row returned, by the first result of
+    the address that falls into a later window.
+    """
+    
+    EPOCH = datetime(1970, 1, 1)
+    
+    def __init__(self):
+        self._windows = {}
+        self._lock = threading.Lock()
+    
+    def add(self, address_id, status, response_time, timestamp, window_seconds):
+        """Count one result; returns the sample row of the window it closed, if any"""
+        elapsed = int((timestamp - self.EPOCH).total_seconds())
+        window_start = elapsed - elapsed % window_seconds
+        closed = None
+        
+        with self._lock:
+            window = self._windows.get(address_id)
+            if window is not None and (window['start'] != window_start or window['seconds'] != window_seconds):
+                closed = self._row(address_id, self._windows.pop(address_id))
+                window = None
+            if window is None:
+                window = self._windows[address_id] = {
+                    'start': window_start, 'seconds': window_seconds, 'probes': 0, 'lost': 0,
+                    'answered': 0, 'rtt_sum': 0.0, 'rtt_min': None, 'rtt_max': None
+                }
+            
+            window['probes'] += 1
+            if status != 'up':
+                window['lost'] += 1
+            elif response_time is not None:
+                window['answered'] += 1
+                window['rtt_sum'] += response_time
+                window['rtt_min'] = response_time if window['rtt_min'] is None else min(window['rtt_min'], response_time)
+                window['rtt_max'] = response_time if window['rtt_max'] is None else max(window['rtt_max'], response_time)
+        return closed
+    
+    def drain(self):
+        """Sample rows of every open window (on stop or storage change); partial windows included"""
+        with self._lock:
+            windows, self._windows = self._windows, {}
+        return [self._row(address_id, window) for address_id, window in windows.items()]
+    
+    def _row(self, address_id, window):
+        return {
+            'network_address_id': address_id,
+            'window_start': self.EPOCH + timedelta(seconds=window['start']),
+            'window_seconds': window['seconds'],
+            'probes': window['probes'],
+            'lost': window['lost'],
+            'rtt_min': window['rtt_min'],
+            'rtt_avg': window['rtt_sum'] / window['answered'] if window['answered'] else None,
+            'rtt_max': window['rtt_max']
+        }
+
+sample_windows = SampleWindows()
+
+def _flush_samples():
+    """Queue the open sample windows for writing"""
+    for row in sample_windows.drain():
+        result_writer.submit(None, None, sample_row=row)
+
+# Global probe schedule, created by start_scheduler
+probe_schedule = None
+# In-flight tracking for full sweeps while the scheduler is not running
+_unscheduled_probes = ProbeSchedule()
+# The live rollup marker is in the database (checked once per process)
+_rollup_state = {'marked': False}
+_schedule_state = {'synced_at': 0.0, 'dashboard_at': 0.0, 'settings_updated_at': None}
+
+# Cycle timing: start lag against the schedule, duration and overrun tracking
+_cycle_stats = {
+    'cycles': 0,
+    'running': 0,
+    'last_started': None,
+    'last_lag': 0.0,
+    'last_duration': 0.0,
+    'last_addresses': 0,
+    'max_lag': 0.0,
+    'avg_duration': 0.0,
+    'overruns': 0,
+    'calm': 0,
+    'degraded': False
+}
+_cycle_stats_lock = threading.Lock()
+# Only one tick re-reads the address list at a time; the others use the current schedule
+_sync_lock = threading.Lock()
+
+def _record_cycle(started, lag, lag_ratio, duration, address_count):
+    """Update cycle timing and enter or leave degraded mode on sustained overrun"""
+    with _cycle_stats_lock:
+        _update_cycle_stats(_cycle_stats, started, lag, lag_ratio, duration, address_count)
+
+def _update_cycle_stats(stats, started, lag, lag_ratio, duration, address_count):
+    stats['cycles'] += 1
+    stats['last_started'] = datetime.utcfromtimestamp(started).isoformat()
+    stats['last_lag'] = round(lag, 3)
+    stats['last_duration'] = round(duration, 3)
+    stats['last_addresses'] = address_count
+    stats['max_lag'] = round(max(stats['max_lag'], lag), 3)
+    stats['avg_duration'] = round(duration if stats['cycles'] == 1 else 0.9 * stats['avg_duration'] + 0.1 * duration, 3)
+    
+    if lag_ratio >= OVERRUN_LAG_RATIO:
+        stats['overruns'] += 1
+        stats['calm'] = 0
+        logger.warning(f"Ping cycle started {lag:.1f}s behind schedule and took {duration:.1f}s "
+                      f"for {address_count} addresses")
+        if not stats['degraded'] and stats['overruns'] >= OVERRUN_CYCLES:
+            stats['degraded'] = True
+            logger.warning("Ping cycles keep overrunning, entering degraded mode: "
+                          "high-priority addresses first, others probed less often")
+    else:
+        stats['calm'] += 1
+        stats['overruns'] = 0
+        if stats['degraded'] and stats['calm'] >= RECOVERY_CYCLES:
+            stats['degraded'] = False
+            logger.info("Ping cycles are back on schedule, leaving degraded mode")
+
+def refresh_schedule():
+    """Make the next tick re-read addresses and interval overrides"""
+    _schedule_state['synced_at'] = 0.0
+
+def sync_settings():
+    """Apply ping settings saved by another process (the leader election tick):
+    with several workers the settings form is usually handled by a follower"""
+    with app.app_context():
+        updated_at = db.session.query(db.func.max(PingSettings.updated_at)).scalar()
+    
+    if updated_at is not None and updated_at != _schedule_state['settings_updated_at']:
+        logger.info("Ping settings changed in another process, reconfiguring scheduler")
+        PingSettings.invalidate_cache()
+        reconfigure_scheduler()
+
+def _address_schedule(settings, node=LOCAL_NODE):
+    """Effective interval of every active address (own override, then group, then
+    global), the priorities of addresses that have one, and the stored state of
+    each address as {id: (ip address, group name, last status, consecutive failures)}.
+    
+    Only addresses whose shard belongs to node are included; while no probe
+    agents are connected every address belongs to the coordinator.
+    """
+    group_intervals = GroupSettings.intervals()
+    shard_map = ShardMap.from_agents(ProbeAgent.alive())
+    rows = db.session.query(
+        NetworkAddress.id, NetworkAddress.ip_address, NetworkAddress.ping_interval,
+        NetworkAddress.group_name, NetworkAddress.priority,
+        NetworkAddress.last_status, NetworkAddress.consecutive_failures
+    ).filter_by(is_active=True)
+    
+    intervals = {}
+    priorities = {}
+    states = {}
+    for address_id, ip_address, interval, group_name, priority, last_status, failures in rows:
+        if shard_map.distributed and shard_map.owner(ip_address, group_name) != node:
+            continue
+        intervals[address_id] = interval or group_intervals.get(group_name) or settings.ping_interval
+        if priority:
+            priorities[address_id] = priority
+        states[address_id] = (ip_address, group_name, last_status, failures or 0)
+    return intervals, priorities, states
+
+def _sync_schedule(schedule, settings, now):
+    """Re-read active addresses, intervals and stored state into the schedule.
+    Addresses with results still in the write buffer keep their newer state"""
+    intervals, priorities, states = _address_schedule(settings)
+    addresses = {}
+    statuses = {}
+    failures = {}
+    for address_id, (ip_address, group_name, last_status, stored_failures) in states.items():
+        addresses[address_id] = (ip_address, group_name)
+        pending = result_writer.pending_state(address_id)
+        statuses[address_id], failures[address_id] = pending if pending is not None else (last_status, stored_failures)
+    schedule.sync(intervals, now, failures=failures, priorities=priorities, addresses=addresses, statuses=statuses)
+
+def agent_shard(agent_name):
+    """Addresses a probe agent should ping now, with their intervals"""
+    settings = PingSettings.get_cached()
+    intervals, priorities, states = _address_schedule(settings, node=agent_name)
+    return [
+        {'id': address_id, 'ip_address': states[address_id][0], 'interval': interval,
+         'priority': priorities.get(address_id, 0)}
+        for address_id, interval in intervals.items()
+    ]
+
+def store_agent_results(results):
+    """Queue probe results pushed by a remote agent for writing; returns how many were accepted"""
+    by_id = {}
+    for result in results:
+        if result.get('status') in AGENT_RESULT_STATUSES and isinstance(result.get('id'), int):
+            by_id[result['id']] = result
+    if not by_id:
+        return 0
+    
+    addresses = NetworkAddress.query.filter(NetworkAddress.id.in_(list(by_id))).all()
+    stream = []
+    for address in addresses:
+        result = by_id[address.id]
+        try:
+            timestamp = datetime.fromisoformat(result['timestamp'])
+        except (KeyError, TypeError, ValueError):
+            timestamp = datetime.utcnow()
+        stream.append({
+            'ip_address': address.ip_address,
+            'status': result['status'],
+            'response_time': result.get('response_time'),
+            'error_message': result.get('error_message'),
+            'timestamp': timestamp
+        })
+    
+    _persist_results(stream, addresses, dashboard_update=False)
+    return len(stream)
+
+def _emit(event, data):
+    """Push an event to dashboards, directly or through the web process"""
+    if event_publisher is not None:
+        event_publisher(event, data)
+        return
+    from app import socketio
+    socketio.emit(event, data)
+
+def _write_results(log_rows, address_rows, status_changes, sample_rows):
+    """Write one batch from the result writer in one executemany statement per
+    table, commit and push its status changes; raises so the writer retries the batch"""
+    with app.app_context():
+        try:
+            if log_rows:
+                db.session.execute(_ping_log_insert, log_rows)
+            if address_rows:
+                db.session.execute(_address_status_update, address_rows)
+            if sample_rows:
+                db.session.execute(_ping_sample_insert, sample_rows)
+            if status_changes:
+                db.session.execute(_status_transition_insert, [{
+                    'network_address_id': change['id'],
+                    'old_status': change['old_status'],
+                    'new_status': change['new_status'],
+                    'timestamp': datetime.fromisoformat(change['timestamp']),
+                    'response_time': change['response_time'],
+                    'error_message': change.get('error_message')
+                } for change in status_changes])
+            # Minute, hour and day rollups grow in the same transaction as the results;
+            # the first write records where backfill_rollups.py has to stop
+            marking = address_rows and not _rollup_state['marked']
+            if marking:
+                mark_rollups_live(db.session, min(row['b_ping_time'] for row in address_rows))
+            merge_rollups(db.session, rollup_rows(
+                (row['b_id'], row['b_ping_time'], row['b_status'], row.get('b_response_time'))
+                for row in address_rows
+            ))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    if marking:
+        _rollup_state['marked'] = True
+    
+    # Send WebSocket updates if there were status changes
+    if status_changes:
+        try:
+            _emit('status_update', {
+                'type': 'status_changes',
+                'data': status_changes
+            })
+            logger.info(f"Sent WebSocket update for {len(status_changes)} status changes")
+        except Exception as e:
+            logger.error(f"Error sending WebSocket update: {str(e)}")
+
+def _written_dashboard_update():
+    """Dashboard totals once the results queued before the request are written"""
+    with app.app_context():
+        _emit_dashboard_update()
+
+def _spool_directory():
+    """Local spool for results the database could not take (PING_SPOOL_DIR, default instance/spool)"""
+    return os.environ.get('PING_SPOOL_DIR') or os.path.join(app.instance_path, 'spool')
+
+# Probes hand results to this writer and move on: a slow commit or a database
+# outage no longer holds up the cycle, and results written while the database
+# is down are spooled to disk and replayed in order once it is back
+result_writer = ResultWriter(_write_results, on_dashboard=_written_dashboard_update,
+                             spool=ResultSpool(_spool_directory()))
+atexit.register(result_writer.stop)
+# Registered after the writer so it runs first at exit
+atexit.register(_flush_samples)
 
 def ping_all_addresses():
     """Ping all active network addresses using async service"""
+    schedule = probe_schedule or _unscheduled_probes
+    
     with app.app_context():
+        address_ids = []
         try:
-            # Get all active addresses
-            addresses = NetworkAddress.query.filter_by(is_active=True).all()
+            # Get all active addresses, high-priority first
+            addresses = NetworkAddress.query.filter_by(is_active=True).order_by(NetworkAddress.priority.desc()).all()
             
+            # Addresses still being probed by a scheduled cycle are left to it
+            address_ids = set(schedule.claim([addr.id for addr in addresses]))
+            addresses = [addr for addr in addresses if addr.id in address_ids]
             if not addresses:
                 logger.info("No active addresses to ping")
                 return
             
-            # Get current settings
-            settings = PingSettings.get_current()
-            
-            # Extract IP addresses
-            ip_addresses = [addr.ip_address for addr in addresses]
+            _ping_addresses(addresses, PingSettings.get_cached())
             
-            logger.info(f"Pinging {len(ip_addresses)} addresses with {settings.max_threads} threads, batch size {settings.batch_size}")
-            
-            # Use async ping service
-            async_service = AsyncPingService(
-                max_threads=settings.max_threads,
-                batch_size=settings.batch_size
-            )
+        except Exception as e:
+            logger.error(f"Error in ping_all_addresses: {str(e)}")
+            db.session.rollback()
+        finally:
+            schedule.done(address_ids)
+
+def ping_due_addresses():
+    """Ping the addresses whose interval has elapsed (one scheduler tick)"""
+    schedule = probe_schedule
+    if schedule is None:
+        return
+    
+    # Cycles overlap: a tick probes the due addresses that are not still in flight
+    # in an earlier, slower cycle (those are skipped until their probe ends)
+    with _cycle_stats_lock:
+        _cycle_stats['running'] += 1
+    
+    with app.app_context():
+        address_ids = []
+        try:
+            settings = PingSettings.get_cached()
+            now = time.time()
             
-            # Progress callback for large batches
-            def progress_callback(progress, batch_num, total_batches):
-                logger.info(f"Async ping progress: {progress:.1f}% (batch {batch_num}/{total_batches})")
+            if now - _schedule_state['synced_at'] >= SCHEDULE_SYNC_INTERVAL and _sync_lock.acquire(blocking=False):
+                try:
+                    _sync_schedule(schedule, settings, now)
+                except SQLAlchemyError as e:
+                    # Database unreachable: keep probing the addresses known from the last sync
+                    db.session.rollback()
+                    logger.warning(f"Schedule sync failed, probing the last known addresses: {str(e)}")
+                finally:
+                    _schedule_state['synced_at'] = now
+                    _sync_lock.release()
             
-            # Ping all addresses asynchronously
-            results = async_service.ping_all_async(ip_addresses, progress_callback)
+            address_ids, lag, lag_ratio = schedule.pop_due(now, degraded=_cycle_stats['degraded'])
+            if not address_ids:
+                return
             
-            # Process results and track status changes
-            status_changes = []
+            # From the schedule's snapshot, not the database (sorted by priority by pop_due)
+            addresses = schedule.addresses(address_ids)
             
-            for result in results:
-                # Find the corresponding address
-                address = next((addr for addr in addresses if addr.ip_address == result['ip_address']), None)
-                
-                if address:
-                    # Store old status for comparison
-                    old_status = address.last_status
-                    
-                    # Update address status
-                    address.last_status = result['status']
-                    address.last_ping_time = result['timestamp']
-                    
-                    # Create ping log
-                    ping_log = PingLog(
-                        network_address_id=address.id,
-                        status=result['status'],
-                        response_time=result['response_time'],
-                        error_message=result.get('error_message')
-                    )
-                    
-                    db.session.add(ping_log)
-                    
-                    # Check if status changed
-                    if old_status != result['status']:
-                        status_changes.append({
-                            'id': address.id,
-                            'ip_address': address.ip_address,
-                            'old_status': old_status,
-                            'new_status': result['status'],
-                            'group_name': address.group_name,
-                            'timestamp': result['timestamp'].isoformat(),
-                            'response_time': result['response_time']
-                        })
-            
-            # Commit all changes
-            db.session.commit()
+            if addresses:
+                # Dashboard totals are refreshed once per global interval unless something changed
+                dashboard_update = now - _schedule_state['dashboard_at'] >= settings.ping_interval
+                if dashboard_update:
+                    _schedule_state['dashboard_at'] = now
+                _ping_addresses(addresses, settings, dashboard_update=dashboard_update)
             
-            # Send WebSocket updates if there were status changes
-            if status_changes:
-                try:
-                    from app import socketio
-                    socketio.emit('status_update', {
-                        'type': 'status_changes',
-                        'data': status_changes
-                    })
-                    logger.info(f"Sent WebSocket update for {len(status_changes)} status changes")
-                except Exception as e:
-                    logger.error(f"Error sending WebSocket update: {str(e)}")
-            
-            # Always send dashboard update
-            try:
-                from app import socketio
-                # Get updated stats
-                total_addresses = NetworkAddress.query.filter_by(is_active=True).count()
-                up_count = NetworkAddress.query.filter_by(is_active=True, last_status='up').count()
-                down_count = NetworkAddress.query.filter_by(is_active=True, last_status='down').count()
-                error_count = NetworkAddress.query.filter_by(is_active=True, last_status='error').count()
-                unknown_count = total_addresses - up_count - down_count - error_count
-                
-                socketio.emit('dashboard_update', {
-                    'total': total_addresses,
-                    'up': up_count,
-                    'down': down_count,
-                    'error': error_count,
-                    'unknown': unknown_count
-                })
-            except Exception as e:
-                logger.error(f"Error sending dashboard update: {str(e)}")
-            
-            logger.info(f"Successfully processed {len(results)} ping results")
+            _record_cycle(now, lag, lag_ratio, time.time() - now, len(address_ids))
             
         except Exception as e:
-            logger.error(f"Error in ping_all_addresses: {str(e)}")
+            logger.error(f"Error in ping_due_addresses: {str(e)}")
             db.session.rollback()
+        finally:
+            schedule.done(address_ids)
+            with _cycle_stats_lock:
+                _cycle_stats['running'] -= 1
+
+def _ping_addresses(addresses, settings, dashboard_update=True):
+    """Probe the given addresses, persist the results and push updates to the dashboard"""
+    # Extract IP addresses
+    ip_addresses = [addr.ip_address for addr in addresses]
+    
+    # Use the process-wide probe pool (no-op resize when settings are unchanged)
+    async_service = init_probe_pool(settings)
+    
+    logger.info(f"Pinging {len(ip_addresses)} addresses with {async_service.engine} engine, "
+               f"{settings.max_threads} threads, batch size {settings.batch_size}")
+    
+    # Progress callback for large batches
+    def progress_callback(progress, batch_num, total_batches):
+        logger.info(f"Async ping progress: {progress:.1f}% (batch {batch_num}/{total_batches})")
+    
+    _persist_results(async_service.iter_results(ip_addresses, progress_callback), addresses, dashboard_update)
+
+def _persist_results(results, addresses, dashboard_update=True, manual=False):
+    """Reconcile a stream of probe results with their addresses, persist them
+    and push updates to the dashboard.
+    
+    Manual results clear the consecutive failure count whatever the status, so
+    a backed-off host goes back to its normal interval.
+    """
+    # Keyed snapshot of the fields we read: results are written with Core
+    # statements, the ORM instances are neither updated nor read again
+    snapshot = {
+        addr.ip_address: {'id': addr.id, 'group_name': addr.group_name, 'last_status': addr.last_status,
+                          'failures': addr.consecutive_failures or 0}
+        for addr in addresses
+    }
+    # Results still in the write buffer are newer than the database
+    for known in snapshot.values():
+        pending = result_writer.pending_state(known['id'])
+        if pending is not None:
+            known['last_status'], known['failures'] = pending
+    schedule = probe_schedule
+    settings = PingSettings.get_cached()
+    compact = settings.storage_mode == STORAGE_COMPACT
+    window_seconds = settings.sample_window or 300
+    
+    # Results are reconciled, persisted and emitted as they stream in,
+    # so a host going down is reported after its own probe, not after the cycle
+    processed_count = 0
+    changed_count = 0
+    
+    for result in results:
+        # Find the corresponding address
+        known = snapshot.get(result['ip_address'])
+        
+        if known:
+            # Store old status for comparison
+            old_status = known['last_status']
+            known['last_status'] = result['status']
+            
+            # Consecutive failures drive the backoff of long-dead hosts
+            known['failures'] = 0 if result['status'] == 'up' or manual else known['failures'] + 1
+            
+            # Check if status changed
+            status_change = None
+            if old_status != result['status']:
+                changed_count += 1
+                status_change = {
+                    'id': known['id'],
+                    'ip_address': result['ip_address'],
+                    'old_status': old_status,
+                    'new_status': result['status'],
+                    'group_name': known['group_name'],
+                    'timestamp': result['timestamp'].isoformat(),
+                    'response_time': result['response_time'],
+                    'error_message': result.get('error_message')
+                }
+            
+            # Compact storage logs status changes only; the rest goes into window samples
+            log_row = None
+            sample_row = None
+            if compact:
+                sample_row = sample_windows.add(known['id'], result['status'], result['response_time'],
+                                                result['timestamp'], window_seconds)
+            if not compact or status_change is not None:
+                log_row = {
+                    'network_address_id': known['id'],
+                    'status': result['status'],
+                    'response_time': result['response_time'],
+                    'error_message': result.get('error_message'),
+                    # Probe time, not write time: spooled results are replayed later
+                    'timestamp': result['timestamp']
+                }
+            
+            # Ping log, address status and sample rows, written in bulk batches by the writer
+            result_writer.submit(
+                log_row,
+                {
+                    'b_id': known['id'],
+                    'b_status': result['status'],
+                    'b_ping_time': result['timestamp'],
+                    'b_failures': known['failures'],
+                    # Not a column: feeds the RTT rollups
+                    'b_response_time': result['response_time']
+                },
+                status_change,
+                sample_row
+            )
+            # After the submit: the schedule sync takes the pending count over the stored one
+            if schedule is not None:
+                schedule.record(known['id'], known['failures'], known['last_status'])
+                if not manual:
+                    # Its probe is over: the next tick may probe it again while this cycle waits on others
+                    schedule.done([known['id']])
+            processed_count += 1
+    
+    # Send dashboard update once the results are written (staggered slots skip it when nothing changed)
+    if dashboard_update or changed_count:
+        result_writer.request_dashboard_update()
+    
+    logger.info(f"Successfully queued {processed_count} ping results")
+
+def ping_now(address_id):
+    """Probe one address on demand and persist the result like a scheduled probe.
+    
+    The cleared failure count ends the backoff here if this process runs the
+    schedule, otherwise the leader picks it up from the database on its next sync.
+    Returns the result, or None for an unknown address.
+    """
+    with app.app_context():
+        address = db.session.get(NetworkAddress, address_id)
+        if address is None:
+            return None
+        
+        # Where the scheduler never started (a follower worker) the pool is created here:
+        # with the configured timeout, retries and pacing, not the built-in defaults
+        probe_service = init_probe_pool(PingSettings.get_cached())
+        result = probe_service.executor.submit(probe_service.ping_single_address, address.ip_address).result()
+        _persist_results([result], [address], dashboard_update=True, manual=True)
+    
+    # The page shown after a manual ping reads the database
+    if not result_writer.flush(MANUAL_PING_WRITE_TIMEOUT):
+        logger.warning(f"Manual ping result for {result['ip_address']} is not written yet")
+    return result
+
+def _emit_dashboard_update():
+    """Push current status totals to the dashboard"""
+    try:
+        # Get updated stats
+        total_addresses = NetworkAddress.query.filter_by(is_active=True).count()
+        up_count = NetworkAddress.query.filter_by(is_active=True, last_status='up').count()
+        down_count = NetworkAddress.query.filter_by(is_active=True, last_status='down').count()
+        error_count = NetworkAddress.query.filter_by(is_active=True, last_status='error').count()
+        unknown_count = total_addresses - up_count - down_count - error_count
+        
+        _emit('dashboard_update', {
+            'total': total_addresses,
+            'up': up_count,
+            'down': down_count,
+            'error': error_count,
+            'unknown': unknown_count
+        })
+    except Exception as e:
+        logger.error(f"Error sending dashboard update: {str(e)}")
 
 def start_scheduler():
     """Start the background scheduler for periodic pings"""
-    global scheduler
+    global scheduler, scheduler_mode, probe_schedule, _atexit_registered
     
     if scheduler is not None and scheduler.running:
         logger.info("Scheduler is already running")
         return
     
     try:
-        scheduler = BackgroundScheduler()
-        
         # Get current ping settings
         with app.app_context():
-            settings = PingSettings.get_current()
+            settings = PingSettings.get_cached()
             ping_interval = settings.ping_interval
+            schedule_mode = settings.schedule_mode or SCHEDULE_BURST
+            backoff = (settings.backoff_threshold or 5, settings.backoff_max_interval or 3600) \
+                if settings.backoff_enabled else None
+            
+            # Probe pool lives for the whole process and is shared with manual pings
+            init_probe_pool(settings)
+            _schedule_state['settings_updated_at'] = settings.updated_at
+            use_sqlite = db.engine.dialect.name == 'sqlite'
+        
+        # Results spooled by a previous run are replayed before new ones
+        result_writer.start()
         
-        # Schedule ping job with configurable interval
+        # One tick job serves every interval: addresses sharing an interval are
+        # probed together in burst mode and spread by their phase in staggered mode
+        probe_schedule = ProbeSchedule(staggered=(schedule_mode == SCHEDULE_STAGGERED), backoff=backoff)
+        refresh_schedule()
+        
+        # Threads for overlapping ping cycles plus the maintenance jobs
+        scheduler = BackgroundScheduler(executors={'default': ThreadPoolExecutor(MAX_CONCURRENT_CYCLES + 2)})
+        
+        # A long cycle (dead hosts waiting out their timeout) does not hold back the next
+        # ticks: they probe the other due addresses while its own stay in flight
         scheduler.add_job(
-            func=ping_all_addresses,
-            trigger=IntervalTrigger(seconds=ping_interval),
+            func=ping_due_addresses,
+            trigger=IntervalTrigger(seconds=SCHEDULER_TICK),
             id='ping_job',
-            name='Ping all network addresses',
+            name='Ping network addresses whose interval has elapsed',
+            max_instances=MAX_CONCURRENT_CYCLES,
+            coalesce=True,
+            misfire_grace_time=SCHEDULER_TICK,
+            # First cycle right away, in the scheduler thread rather than the caller's
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+        
+        # History past its retention period is deleted in short chunked transactions
+        scheduler.add_job(
+            func=run_retention,
+            trigger=IntervalTrigger(seconds=RETENTION_INTERVAL),
+            id='retention_job',
+            name='Delete history past its retention period',
+            max_instances=1,
+            coalesce=True,
+            next_run_time=datetime.now() + timedelta(minutes=1),
             replace_existing=True
         )
         
+        # SQLite: keep the WAL file from growing under constant readers and refresh planner statistics
+        if use_sqlite:
+            scheduler.add_job(
+                func=run_sqlite_maintenance,
+                trigger=IntervalTrigger(seconds=SQLITE_MAINTENANCE_INTERVAL),
+                id='sqlite_maintenance_job',
+                name='Checkpoint the SQLite WAL and run PRAGMA optimize',
+                max_instances=1,
+                coalesce=True,
+                replace_existing=True
+            )
+        
         scheduler.start()
+        scheduler_mode = schedule_mode
         
         # Shut down the scheduler when exiting the app
-        atexit.register(lambda: scheduler.shutdown() if scheduler else None)
+        if not _atexit_registered:
+            atexit.register(lambda: scheduler.shutdown(wait=False) if scheduler and scheduler.running else None)
+            atexit.register(shutdown_probe_pool)
+            _atexit_registered = True
         
-        logger.info(f"Ping scheduler started successfully with {ping_interval}s interval")
-        
-        # Run initial ping
-        ping_all_addresses()
+        logger.info(f"Ping scheduler started successfully with {ping_interval}s interval ({schedule_mode} mode)")
         
     except Exception as e:
         logger.error(f"Error starting scheduler: {str(e)}")
 
+def reconfigure_scheduler():
+    """Apply changed ping settings to the running scheduler without restarting it:
+    resize the probe pool, swap timeouts and pacing, switch mode and backoff, and
+    let the next tick pick up new intervals"""
+    global scheduler_mode
+    
+    try:
+        with app.app_context():
+            settings = PingSettings.get_cached()
+            init_probe_pool(settings)
+            _schedule_state['settings_updated_at'] = settings.updated_at
+        
+        # Leaving compact storage: write out the windows collected so far
+        if settings.storage_mode != STORAGE_COMPACT:
+            _flush_samples()
+        
+        if scheduler is None or not scheduler.running or probe_schedule is None:
+            return
+        
+        schedule_mode = settings.schedule_mode or SCHEDULE_BURST
+        backoff = (settings.backoff_threshold or 5, settings.backoff_max_interval or 3600) \
+            if settings.backoff_enabled else None
+        probe_schedule.configure(schedule_mode == SCHEDULE_STAGGERED, backoff)
+        scheduler_mode = schedule_mode
+        
+        # Re-read intervals on a tick that runs now rather than up to a second later
+        refresh_schedule()
+        scheduler.modify_job('ping_job', next_run_time=datetime.now())
+        
+        logger.info(f"Ping scheduler reconfigured: {settings.ping_interval}s interval ({schedule_mode} mode)")
+        
+    except Exception as e:
+        logger.error(f"Error reconfiguring scheduler: {str(e)}")
+
 def restart_scheduler():
     """Restart the scheduler with updated settings"""
     global scheduler
@@ -184,6 +974,7 @@ def stop_scheduler():
     
     if scheduler and scheduler.running:
         scheduler.shutdown()
+        _flush_samples()
         logger.info("Ping scheduler stopped")
     else:
         logger.info("Scheduler is not running")
@@ -195,10 +986,21 @@ def get_scheduler_status():
     if scheduler and scheduler.running:
         return {
             'running': True,
-            'jobs': len(scheduler.get_jobs())
+            'jobs': len(scheduler.get_jobs()),
+            'mode': scheduler_mode,
+            'schedule': probe_schedule.stats() if probe_schedule else None,
+            'cycles': dict(_cycle_stats),
+            'probe_pool': get_probe_pool_stats(),
+            'writer': result_writer.stats(),
+            'retention': get_retention_status(),
+            'sqlite': get_sqlite_status()
         }
     else:
         return {
             'running': False,
-            'jobs': 0
+            'jobs': 0,
+            'probe_pool': get_probe_pool_stats(),
+            'writer': result_writer.stats(),
+            'retention': get_retention_status(),
+            'sqlite': get_sqlite_status()
         }
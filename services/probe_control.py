@@ -0,0 +1,86 @@
+import logging
+from typing import Dict, Any, Optional
+
+from services.probe_ipc import WORKER_EXTERNAL, ProbeDaemonError, get_client, worker_mode
+
+logger = logging.getLogger(__name__)
+
+# Управление планировщиком для веб-слоя: в режиме embedded вызовы идут
+# в ping_scheduler этого процесса, в режиме external - демону пинга по IPC
+
+
+def is_external() -> bool:
+    return worker_mode() == WORKER_EXTERNAL
+
+
+def start_scheduler():
+    if is_external():
+        return get_client().call('start')
+    from services.ping_scheduler import start_scheduler as start
+    from services.scheduler_leader import NotLeaderError, get_election
+    election = get_election()
+    if election is not None and not election.is_leader:
+        # Запуск при выборе лидером; занято - планировщик работает в другом процессе
+        if not election.try_lead():
+            raise NotLeaderError('ping scheduler runs in another worker process')
+        return
+    start()
+
+
+def stop_scheduler() -> bool:
+    """Остановка планировщика; False - он и так не был запущен"""
+    if is_external():
+        return get_client().call('stop')
+    from services import ping_scheduler
+    from services.scheduler_leader import NotLeaderError, is_leader
+    if not is_leader():
+        # Здесь планировщика нет, а о том, запущен ли он у лидера, этот процесс не знает
+        raise NotLeaderError('ping scheduler runs in another worker process')
+    running = bool(ping_scheduler.scheduler and ping_scheduler.scheduler.running)
+    ping_scheduler.stop_scheduler()
+    return running
+
+
+def reconfigure_scheduler():
+    if is_external():
+        return get_client().call('reconfigure')
+    from services.ping_scheduler import reconfigure_scheduler as reconfigure
+    reconfigure()
+
+
+def refresh_schedule():
+    """Перечитать адреса и интервалы на следующем тике; недоступность демона
+    не мешает сохранить изменения - он подхватит их при плановой синхронизации"""
+    if is_external():
+        try:
+            get_client().call('refresh_schedule')
+        except ProbeDaemonError as e:
+            logger.warning(f"Schedule refresh not delivered: {str(e)}")
+        return
+    from services.ping_scheduler import refresh_schedule as refresh
+    refresh()
+
+
+def ping_now(address_id: int) -> Optional[Dict[str, Any]]:
+    """Ручной пинг адреса на общем пуле проб (своём или демона); результат пишется
+    тем же путём, что и плановые, и снимает backoff. None - адреса нет"""
+    if is_external():
+        return get_client().call('ping_now', address_id=address_id)
+    from services.ping_scheduler import ping_now as ping
+    return ping(address_id)
+
+
+def get_scheduler_status() -> Dict[str, Any]:
+    if is_external():
+        try:
+            status = get_client().call('status')
+        except ProbeDaemonError as e:
+            status = {'running': False, 'jobs': 0, 'error': str(e)}
+        status['worker'] = WORKER_EXTERNAL
+        return status
+    from services.ping_scheduler import get_scheduler_status as scheduler_status
+    from services.scheduler_leader import is_leader
+    status = scheduler_status()
+    status['worker'] = worker_mode()
+    status['leader'] = is_leader()
+    return status
@@ -0,0 +1,274 @@
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Где работает планировщик пинга (переменная окружения PROBE_WORKER):
+# embedded - в веб-процессе, как раньше; external - в отдельном процессе probe_daemon.py,
+# веб-процесс только передаёт ему команды и ретранслирует события в WebSocket;
+# daemon - сам процесс демона
+WORKER_EMBEDDED = 'embedded'
+WORKER_EXTERNAL = 'external'
+WORKER_DAEMON = 'daemon'
+
+DEFAULT_PORT = 5055
+
+# Сколько ждать ответа демона на команду (сек); пинг по требованию укладывается с запасом
+CALL_TIMEOUT = 60
+
+# Пауза перед повторным подключением к подписке на события (сек)
+RELAY_RETRY_DELAY = 5
+
+# Ключ канала без PROBE_DAEMON_AUTHKEY: создаётся демоном при первом запуске, доступен только владельцу
+KEY_FILE_NAME = 'probe_daemon.key'
+MIN_KEY_LENGTH = 16
+# Секреты, опубликованные в репозитории (app.py, start_local.py), ключом быть не могут
+_PUBLIC_SECRETS = {
+    'dev-secret-key-change-in-production',
+    'NetMon_K7x9P2mQ8vL4nR6tY3uI1oE5wZ0sA7bG9dF2hJ4kM8pN6qV3xC1yB5nU'
+}
+
+# Сообщения - JSON (не pickle): даже подключившийся с ключом не выполнит код в демоне
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+class ProbeDaemonError(RuntimeError):
+    """Демон недоступен или вернул ошибку"""
+
+
+def worker_mode() -> str:
+    mode = os.environ.get('PROBE_WORKER', WORKER_EMBEDDED).strip().lower()
+    if mode not in (WORKER_EMBEDDED, WORKER_EXTERNAL, WORKER_DAEMON):
+        logger.warning(f"Unknown PROBE_WORKER value '{mode}', running the scheduler in the web process")
+        return WORKER_EMBEDDED
+    return mode
+
+
+def daemon_address():
+    """Адрес демона: только localhost, канал не предназначен для сети"""
+    return ('127.0.0.1', int(os.environ.get('PROBE_DAEMON_PORT', DEFAULT_PORT)))
+
+
+def key_file() -> Path:
+    return Path(os.environ.get('PROBE_DAEMON_KEY_FILE') or
+                Path(__file__).resolve().parent.parent / 'instance' / KEY_FILE_NAME)
+
+
+def _authkey(create: bool = False) -> bytes:
+    """Общий секрет обоих процессов: без него чужой локальный процесс не подключится.
+
+    PROBE_DAEMON_AUTHKEY или случайный ключ в файле с правами 0600 (create=True -
+    создать его, если нет: так делает демон). Известные по репозиторию секреты отвергаются.
+    """
+    key = os.environ.get('PROBE_DAEMON_AUTHKEY')
+    if key:
+        if key in _PUBLIC_SECRETS or len(key) < MIN_KEY_LENGTH:
+            raise ProbeDaemonError(f"PROBE_DAEMON_AUTHKEY must be a random secret of at least "
+                                   f"{MIN_KEY_LENGTH} characters")
+        return key.encode('utf-8')
+
+    path = key_file()
+    if create and not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass  # создал другой процесс одновременно с нами
+        else:
+            with os.fdopen(fd, 'w') as handle:
+                handle.write(secrets.token_hex(32))
+            logger.info(f"Generated probe daemon key {path}")
+    try:
+        key = path.read_text().strip()
+    except OSError as e:
+        raise ProbeDaemonError(f"probe daemon key {path} is not readable (start probe_daemon.py "
+                               f"first or set PROBE_DAEMON_AUTHKEY): {str(e)}") from e
+    if len(key) < MIN_KEY_LENGTH:
+        raise ProbeDaemonError(f"probe daemon key {path} is too short")
+    return key.encode('utf-8')
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode(value: dict):
+    if len(value) == 1 and '__datetime__' in value:
+        return datetime.fromisoformat(value['__datetime__'])
+    return value
+
+
+def send_message(conn, message: Any):
+    conn.send_bytes(json.dumps(message, default=_encode).encode('utf-8'))
+
+
+def recv_message(conn) -> Any:
+    return json.loads(conn.recv_bytes(MAX_MESSAGE_SIZE).decode('utf-8'), object_hook=_decode)
+
+
+class ProbeIpcServer:
+    """Сервер команд демона пинга.
+
+    Запрос - словарь {'op': имя, 'args': {...}}, ответ - {'ok': True, 'result': ...}
+    или {'ok': False, 'error': текст}. Запрос 'subscribe' переводит соединение
+    в поток событий: дальше по нему идут пары (событие, данные) из publish().
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[..., Any]], address=None):
+        self.handlers = handlers
+        self._listener = Listener(address or daemon_address(), authkey=_authkey(create=True))
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def address(self):
+        return self._listener.address
+
+    def serve_forever(self):
+        logger.info(f"Probe daemon listening on {self.address[0]}:{self.address[1]}")
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                if self._closed:
+                    break
+                raise
+            except Exception as e:
+                # Например, неверный ключ у подключившегося
+                logger.warning(f"Rejected IPC connection: {str(e)}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), name='probe-ipc', daemon=True).start()
+
+    def _serve_connection(self, conn):
+        try:
+            while True:
+                request = recv_message(conn)
+                if not isinstance(request, dict) or not isinstance(request.get('args', {}), dict):
+                    send_message(conn, {'ok': False, 'error': 'malformed request'})
+                    continue
+                op = request.get('op')
+
+                if op == 'subscribe':
+                    with self._lock:
+                        self._subscribers.append(conn)
+                    send_message(conn, {'ok': True, 'result': None})
+                    return  # соединение остаётся открытым для publish()
+
+                handler = self.handlers.get(op)
+                if handler is None:
+                    send_message(conn, {'ok': False, 'error': f"unknown operation '{op}'"})
+                    continue
+
+                try:
+                    send_message(conn, {'ok': True, 'result': handler(**request.get('args', {}))})
+                except Exception as e:
+                    logger.error(f"Error handling IPC operation {op}: {str(e)}")
+                    send_message(conn, {'ok': False, 'error': str(e)})
+        except (EOFError, OSError, ValueError):
+            # ValueError - не JSON или слишком длинное сообщение
+            conn.close()
+
+    def publish(self, event: str, data: Any):
+        """Рассылка события всем подписчикам; отвалившиеся отключаются"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        try:
+            message = json.dumps([event, data], default=_encode).encode('utf-8')
+        except TypeError as e:
+            logger.error(f"Event {event} cannot be sent to the web process: {str(e)}")
+            return
+
+        for conn in subscribers:
+            try:
+                conn.send_bytes(message)
+            except (OSError, ValueError):
+                with self._lock:
+                    if conn in self._subscribers:
+                        self._subscribers.remove(conn)
+                conn.close()
+
+    def close(self):
+        self._closed = True
+        self._listener.close()
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for conn in subscribers:
+            conn.close()
+
+
+class ProbeIpcClient:
+    """Отправка команд демону; соединение на каждый вызов - команды редкие"""
+
+    def __init__(self, address=None, timeout: float = CALL_TIMEOUT):
+        self.address = address or daemon_address()
+        self.timeout = timeout
+
+    def call(self, op: str, **args) -> Any:
+        try:
+            with Client(self.address, authkey=_authkey()) as conn:
+                send_message(conn, {'op': op, 'args': args})
+                if not conn.poll(self.timeout):
+                    raise ProbeDaemonError(f"probe daemon did not answer '{op}' in {self.timeout}s")
+                reply = recv_message(conn)
+        except ProbeDaemonError:
+            raise
+        except Exception as e:
+            raise ProbeDaemonError(f"probe daemon unavailable at {self.address[0]}:{self.address[1]}: {str(e)}") from e
+
+        if not reply.get('ok'):
+            raise ProbeDaemonError(reply.get('error'))
+        return reply.get('result')
+
+
+def start_event_relay(emit: Callable[[str, Any], None], address=None) -> threading.Thread:
+    """Фоновая ретрансляция событий демона (emit - например socketio.emit);
+    при потере связи переподключается, пока жив процесс"""
+    address = address or daemon_address()
+
+    def relay():
+        connected = None
+        while True:
+            try:
+                with Client(address, authkey=_authkey()) as conn:
+                    send_message(conn, {'op': 'subscribe'})
+                    recv_message(conn)
+                    if connected is not True:
+                        logger.info(f"Relaying probe daemon events from {address[0]}:{address[1]}")
+                    connected = True
+                    while True:
+                        event, data = recv_message(conn)
+                        try:
+                            emit(event, data)
+                        except Exception as e:
+                            logger.error(f"Error relaying {event} event: {str(e)}")
+            except Exception as e:
+                if connected is not False:
+                    logger.warning(f"Probe daemon event stream unavailable, retrying every {RELAY_RETRY_DELAY}s: {str(e)}")
+                connected = False
+            time.sleep(RELAY_RETRY_DELAY)
+
+    thread = threading.Thread(target=relay, name='probe-relay', daemon=True)
+    thread.start()
+    return thread
+
+
+_client: Optional[ProbeIpcClient] = None
+
+
+def get_client() -> ProbeIpcClient:
+    global _client
+    if _client is None:
+        _client = ProbeIpcClient()
+    return _client
@@ -0,0 +1,150 @@
+import asyncio
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Размер пачки по умолчанию: сколько проб можно отправить подряд после простоя
+DEFAULT_BURST = 50
+
+# Сколько подсетей держать в памяти (ведро неактивной подсети и так полное)
+MAX_SUBNET_BUCKETS = 65536
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше burst накопленных"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько секунд до появления токена (0 - токен есть)"""
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def consume(self):
+        self._tokens -= 1
+
+
+def subnet_key(ip_address: str) -> str:
+    """Подсеть адреса для ограничения по подсети: /24 для IPv4, /64 для IPv6"""
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return ip_address  # имя хоста - отдельное ведро
+
+    prefix = 24 if address.version == 4 else 64
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+class ProbePacer:
+    """Равномерная отправка проб: общий лимит пакетов в секунду и необязательный лимит на подсеть /24.
+
+    rate = 0 (или subnet_rate = 0) - без ограничения.
+    """
+
+    def __init__(self, rate: float = 0, burst: int = DEFAULT_BURST, subnet_rate: float = 0):
+        self._lock = threading.Lock()
+        self.configure(rate, burst, subnet_rate)
+
+    def configure(self, rate: float, burst: int, subnet_rate: float):
+        """Применение новых лимитов одной заменой под блокировкой; накопленные токены сбрасываются"""
+        rate = max(0, rate or 0)
+        burst = max(1, burst or 1)
+        bucket = TokenBucket(rate, burst) if rate else None
+
+        with self._lock:
+            self.rate = rate
+            self.burst = burst
+            self.subnet_rate = max(0, subnet_rate or 0)
+            self._bucket = bucket
+            self._subnet_buckets: Dict[str, TokenBucket] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rate or self.subnet_rate)
+
+    def _subnet_bucket(self, ip_address: str) -> TokenBucket:
+        key = subnet_key(ip_address)
+        bucket = self._subnet_buckets.get(key)
+        if bucket is None:
+            # Пачка на подсеть не больше её лимита за секунду
+            bucket = TokenBucket(self.subnet_rate, min(self.burst, self.subnet_rate))
+            self._subnet_buckets[key] = bucket
+            if len(self._subnet_buckets) > MAX_SUBNET_BUCKETS:
+                self._subnet_buckets.popitem(last=False)
+        else:
+            self._subnet_buckets.move_to_end(key)
+        return bucket
+
+    def try_acquire(self, ip_address: str) -> float:
+        """Неблокирующая попытка отправки: 0 - токен взят, иначе сколько секунд подождать"""
+        if not self.enabled:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            buckets = []
+            if self._bucket is not None:
+                buckets.append(self._bucket)
+            if self.subnet_rate:
+                buckets.append(self._subnet_bucket(ip_address))
+
+            wait = max(bucket.wait_time(now) for bucket in buckets)
+            if wait > 0:
+                return wait
+
+            for bucket in buckets:
+                bucket.consume()
+            return 0.0
+
+    def acquire(self, ip_address: str):
+        """Блокирующее ожидание разрешения на отправку (для потоков пула)"""
+        while True:
+            wait = self.try_acquire(ip_address)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, ip_address: str):
+        """Ожидание разрешения на отправку без блокировки цикла событий"""
+        while True:
+            wait = self.try_acquire(ip_address)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def order(self, ip_addresses: List[str]) -> Optional[List[int]]:
+        """Порядок опроса с чередованием подсетей, чтобы лимит одной подсети
+        не задерживал очередь остальных; None - порядок менять не нужно"""
+        if not self.subnet_rate:
+            return None
+
+        groups: Dict[str, List[int]] = OrderedDict()
+        for index, ip_address in enumerate(ip_addresses):
+            groups.setdefault(subnet_key(ip_address), []).append(index)
+
+        if len(groups) < 2:
+            return None
+
+        ordered = []
+        queues = [iter(indexes) for indexes in groups.values()]
+        while queues:
+            remaining = []
+            for indexes in queues:
+                index = next(indexes, None)
+                if index is not None:
+                    ordered.append(index)
+                    remaining.append(indexes)
+            queues = remaining
+        return ordered
@@ -0,0 +1,191 @@
+import concurrent.futures
+import threading
+import time
+from typing import Dict, Any, Optional
+import logging
+
+from services.async_ping_service import AsyncPingService
+from services.network_service import DEFAULT_TIMEOUT
+from services.probe_pacer import DEFAULT_BURST
+
+logger = logging.getLogger(__name__)
+
+# Верхняя граница числа потоков пула (совпадает с ограничением настроек)
+MAX_POOL_THREADS = 200
+
+
+class ProbePool(concurrent.futures.Executor):
+    """Долгоживущий пул потоков проб с изменением размера на лету и учётом загрузки"""
+
+    def __init__(self, max_workers: int = 50):
+        self._lock = threading.Lock()
+        self._max_workers = self._clamp(max_workers)
+        self._executor = self._create_executor(self._max_workers)
+        self._shutdown = False
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._resizes = 0
+        self._started_at = time.time()
+
+    @staticmethod
+    def _clamp(max_workers: int) -> int:
+        return max(1, min(int(max_workers or 1), MAX_POOL_THREADS))
+
+    @staticmethod
+    def _create_executor(max_workers: int) -> concurrent.futures.ThreadPoolExecutor:
+        # Потоки создаются лениво и переиспользуются между циклами планировщика
+        return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='probe')
+
+    def submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        """Постановка задачи в текущий пул"""
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+            self._queued += 1
+            executor = self._executor
+        try:
+            future = executor.submit(self._run, fn, args, kwargs)
+        except Exception:
+            self._dequeue()
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _dequeue(self):
+        with self._lock:
+            self._queued -= 1
+
+    def _on_done(self, future: concurrent.futures.Future):
+        # Отменённая до старта задача (зависшее окно, shutdown с cancel_futures) не попала в _run
+        if future.cancelled():
+            self._dequeue()
+
+    def _run(self, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+
+    def resize(self, max_workers: int):
+        """Изменение размера пула без остановки: новые задачи идут в новый пул,
+        начатые дорабатывают в старом, после чего его потоки завершаются"""
+        max_workers = self._clamp(max_workers)
+
+        with self._lock:
+            if self._shutdown or max_workers == self._max_workers:
+                return
+            old_executor = self._executor
+            self._executor = self._create_executor(max_workers)
+            old_size, self._max_workers = self._max_workers, max_workers
+            self._resizes += 1
+
+        old_executor.shutdown(wait=False)
+        logger.info(f"Probe pool resized from {old_size} to {max_workers} threads")
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            self._shutdown = True
+            executor = self._executor
+        executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def stats(self) -> Dict[str, Any]:
+        """Загрузка пула для мониторинга"""
+        with self._lock:
+            return {
+                'max_workers': self._max_workers,
+                'active': self._active,
+                'queued': self._queued,
+                'completed': self._completed,
+                'utilization': round(self._active / self._max_workers * 100, 1),
+                'resizes': self._resizes,
+                'uptime': round(time.time() - self._started_at, 1)
+            }
+
+
+# Общие для процесса пул и сервис пинга
+_probe_pool: Optional[ProbePool] = None
+_probe_service: Optional[AsyncPingService] = None
+_init_lock = threading.Lock()
+
+
+def init_probe_pool(settings=None) -> AsyncPingService:
+    """Создание пула при первом вызове, при повторных - применение новых настроек.
+
+    settings - объект PingSettings (или None для значений по умолчанию).
+    """
+    global _probe_pool, _probe_service
+
+    max_threads = getattr(settings, 'max_threads', None) or 50
+    batch_size = getattr(settings, 'batch_size', None) or 100
+    timeout = getattr(settings, 'timeout', None) or DEFAULT_TIMEOUT
+    max_retries = getattr(settings, 'max_retries', None) or 1
+    adaptive_timeout = bool(getattr(settings, 'adaptive_timeout', False))
+    probe_rate = getattr(settings, 'probe_rate', None) or 0
+    probe_burst = getattr(settings, 'probe_burst', None) or DEFAULT_BURST
+    subnet_rate = getattr(settings, 'subnet_rate', None) or 0
+    processes = getattr(settings, 'probe_processes', None) or 1
+
+    with _init_lock:
+        if _probe_pool is None:
+            _probe_pool = ProbePool(max_threads)
+            _probe_service = AsyncPingService(
+                max_threads=max_threads,
+                batch_size=batch_size,
+                executor=_probe_pool,
+                timeout=timeout,
+                max_retries=max_retries,
+                adaptive_timeout=adaptive_timeout,
+                probe_rate=probe_rate,
+                probe_burst=probe_burst,
+                subnet_rate=subnet_rate,
+                processes=processes
+            )
+            logger.info(f"Probe pool created with {max_threads} threads, {_probe_service.engine} engine")
+        else:
+            _probe_pool.resize(max_threads)
+            _probe_service.update_settings(max_threads, batch_size, timeout, max_retries, adaptive_timeout,
+                                           probe_rate, probe_burst, subnet_rate, processes)
+
+    return _probe_service
+
+
+def get_probe_service() -> AsyncPingService:
+    """Общий сервис пинга; пул создаётся с настройками по умолчанию, если ещё не запущен"""
+    if _probe_service is None:
+        return init_probe_pool()
+    return _probe_service
+
+
+def get_probe_pool_stats() -> Dict[str, Any]:
+    """Статистика пула для мониторинга"""
+    if _probe_pool is None:
+        return {'running': False}
+
+    stats = _probe_pool.stats()
+    stats['running'] = True
+    stats['engine'] = _probe_service.engine
+    stats['processes'] = _probe_service.processes
+    stats['pacing'] = {
+        'rate': _probe_service.pacer.rate,
+        'burst': _probe_service.pacer.burst,
+        'subnet_rate': _probe_service.pacer.subnet_rate
+    }
+    return stats
+
+
+def shutdown_probe_pool():
+    """Остановка пула при завершении процесса"""
+    global _probe_pool, _probe_service
+
+    with _init_lock:
+        if _probe_pool is not None:
+            _probe_pool.shutdown(wait=False)
+            _probe_service.close()
+            _probe_pool = None
+            _probe_service = None
@@ -0,0 +1,252 @@
+import logging
+import os
+import pickle
+import struct
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+from services.scheduler_leader import FileLock
+
+logger = logging.getLogger(__name__)
+
+# Запись: длина и crc32 данных (big-endian), затем сами данные (pickle)
+RECORD_HEADER = struct.Struct('>II')
+
+# Размер сегмента: полностью переданный в БД сегмент удаляется целиком (байт)
+SPOOL_SEGMENT_SIZE = 16 * 1024 * 1024
+
+SEGMENT_PREFIX = 'results-'
+SEGMENT_SUFFIX = '.spool'
+OFFSET_FILE_NAME = 'replay.offset'
+LOCK_FILE_NAME = 'spool.lock'
+# Результаты, которые БД отвергает при любой попытке (нарушение ограничений, неверные данные)
+QUARANTINE_FILE_NAME = 'quarantine.bad'
+
+
+def _segment_name(number: int) -> str:
+    return f"{SEGMENT_PREFIX}{number:08d}{SEGMENT_SUFFIX}"
+
+
+def _fsync_directory(path: str):
+    """Фиксация создания/удаления файлов в каталоге (на Windows не нужна и недоступна)"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class ResultSpool:
+    """Журнал результатов на локальном диске на время недоступности БД.
+
+    Только дозапись: записи с длиной и crc32 складываются в сегменты, fsync -
+    один на пакет записей, а не на каждую. Чтение идёт строго по порядку с
+    позиции, сохранённой в replay.offset, - после сбоя процесса передача в БД
+    продолжается с неё же; оборванная при сбое запись в хвосте отбрасывается.
+    Каталог журнала занимает один процесс (блокировка spool.lock).
+    """
+
+    def __init__(self, directory: str, segment_size: int = SPOOL_SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        self._lock = FileLock(os.path.join(directory, LOCK_FILE_NAME))
+        self._opened = False
+        self._write_file = None
+        self._write_segment = 0
+        # Позиция чтения: (номер сегмента, смещение)
+        self._read_position = (0, 0)
+        self.pending = 0
+
+    @property
+    def opened(self) -> bool:
+        return self._opened
+
+    def has_data(self) -> bool:
+        """Остались ли в каталоге записи (в том числе от прошлого запуска)"""
+        if self._opened:
+            return self.pending > 0
+        return bool(self._segments())
+
+    def open(self) -> bool:
+        """Захват каталога и восстановление позиции; False - журнал занят другим процессом"""
+        if self._opened:
+            return True
+        if not self._lock.acquire():
+            return False
+
+        segments = self._segments()
+        self._read_position = self._load_offset(segments)
+        self.pending = 0
+        for number in segments:
+            start = self._read_position[1] if number == self._read_position[0] else 0
+            if number < self._read_position[0]:
+                continue
+            count, valid_size = self._scan(number, start)
+            self.pending += count
+            if valid_size < os.path.getsize(self._path(number)):
+                # Хвост, оборванный при сбое: дописывать будем после последней целой записи
+                logger.warning(f"Truncating torn record at the end of {_segment_name(number)}")
+                with open(self._path(number), 'r+b') as segment:
+                    segment.truncate(valid_size)
+
+        self._write_segment = segments[-1] if segments else max(self._read_position[0], 1)
+        if not segments:
+            self._read_position = (self._write_segment, 0)
+        self._opened = True
+        if self.pending:
+            logger.info(f"Result spool {self.directory}: {self.pending} results to replay")
+        return True
+
+    def close(self):
+        if self._write_file is not None:
+            self._write_file.close()
+            self._write_file = None
+        self._opened = False
+        self._lock.release()
+
+    def _path(self, number: int) -> str:
+        return os.path.join(self.directory, _segment_name(number))
+
+    def _segments(self) -> List[int]:
+        if not os.path.isdir(self.directory):
+            return []
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(numbers)
+
+    def _load_offset(self, segments: List[int]) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, OFFSET_FILE_NAME)) as offset_file:
+                number, offset = (int(value) for value in offset_file.read().split())
+        except (OSError, ValueError):
+            return (segments[0], 0) if segments else (0, 0)
+        if number not in segments:
+            # Сегмент позиции уже удалён - читаем со следующего
+            later = [segment for segment in segments if segment > number]
+            return (later[0], 0) if later else (number, 0)
+        return number, offset
+
+    def _save_offset(self):
+        path = os.path.join(self.directory, OFFSET_FILE_NAME)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as offset_file:
+            offset_file.write(f"{self._read_position[0]} {self._read_position[1]}")
+            offset_file.flush()
+            os.fsync(offset_file.fileno())
+        os.replace(temp_path, path)
+
+    def _read_records(self, segment, limit: Optional[int] = None):
+        """Целые записи с текущей позиции файла; конец - по обрыву или несовпадению crc"""
+        records = []
+        while limit is None or len(records) < limit:
+            header = segment.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            length, checksum = RECORD_HEADER.unpack(header)
+            payload = segment.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            records.append((payload, segment.tell()))
+        return records
+
+    def _scan(self, number: int, start: int) -> Tuple[int, int]:
+        """Количество целых записей сегмента после start и конец последней из них"""
+        with open(self._path(number), 'rb') as segment:
+            segment.seek(start)
+            records = self._read_records(segment)
+        return len(records), records[-1][1] if records else start
+
+    def append(self, records: list):
+        """Дозапись пакета с одним fsync на весь пакет"""
+        if not self._opened:
+            raise RuntimeError('result spool is not open')
+        if not records:
+            return
+
+        created = False
+        if self._write_file is None or self._write_file.tell() >= self.segment_size:
+            if self._write_file is not None:
+                self._write_file.close()
+                self._write_segment += 1
+            os.makedirs(self.directory, exist_ok=True)
+            created = not os.path.exists(self._path(self._write_segment))
+            self._write_file = open(self._path(self._write_segment), 'ab')
+
+        data = bytearray()
+        for record in records:
+            payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+            data += RECORD_HEADER.pack(len(payload), zlib.crc32(payload))
+            data += payload
+        self._write_file.write(data)
+        self._write_file.flush()
+        os.fsync(self._write_file.fileno())
+        if created:
+            _fsync_directory(self.directory)
+        self.pending += len(records)
+
+    def read(self, limit: int) -> Tuple[list, List[Tuple[int, int]]]:
+        """До limit записей с позиции чтения и позиция после каждой из них (для commit)"""
+        number, offset = self._read_position
+        while self.pending:
+            path = self._path(number)
+            if os.path.exists(path):
+                with open(path, 'rb') as segment:
+                    segment.seek(offset)
+                    records = self._read_records(segment, limit)
+                if records:
+                    return ([pickle.loads(payload) for payload, _ in records],
+                            [(number, end) for _, end in records])
+            if number >= self._write_segment:
+                break
+            # Сегмент дочитан - переходим к следующему
+            number, offset = number + 1, 0
+        return [], []
+
+    def commit(self, position: Tuple[int, int], count: int):
+        """Записи до position переданы в БД: сохраняем позицию, удаляем пройденные сегменты"""
+        self._read_position = position
+        self.pending = max(0, self.pending - count)
+        self._save_offset()
+
+        if not self.pending:
+            # Журнал пуст: следующий сбой начнёт новый сегмент
+            if self._write_file is not None:
+                self._write_file.close()
+                self._write_file = None
+            self._write_segment = max(self._write_segment, position[0]) + 1
+            self._read_position = (self._write_segment, 0)
+            self._save_offset()
+
+        removed = False
+        for number in self._segments():
+            if number < self._read_position[0]:
+                os.remove(self._path(number))
+                removed = True
+        if removed:
+            _fsync_directory(self.directory)
+
+    def quarantine(self, records: list, error: str):
+        """Отвергнутые БД записи - в отдельный файл того же формата для разбора вручную"""
+        os.makedirs(self.directory, exist_ok=True)
+        data = bytearray()
+        for record in records:
+            payload = pickle.dumps({'time': time.time(), 'error': error, 'record': record},
+                                   protocol=pickle.HIGHEST_PROTOCOL)
+            data += RECORD_HEADER.pack(len(payload), zlib.crc32(payload))
+            data += payload
+        with open(os.path.join(self.directory, QUARANTINE_FILE_NAME), 'ab') as quarantine_file:
+            quarantine_file.write(data)
+            quarantine_file.flush()
+            os.fsync(quarantine_file.fileno())
+
+    def size(self) -> int:
+        """Объём журнала на диске (байт)"""
+        return sum(os.path.getsize(self._path(number)) for number in self._segments())
@@ -0,0 +1,413 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from services.result_spool import ResultSpool
+
+logger = logging.getLogger(__name__)
+
+# Сколько результатов держать в памяти, пока БД не принимает запись
+WRITE_BUFFER_SIZE = 100000
+
+# Пакет записи: не больше WRITE_BATCH_SIZE результатов и не дольше WRITE_BATCH_INTERVAL сек ожидания
+WRITE_BATCH_SIZE = 1000
+WRITE_BATCH_INTERVAL = 1.0
+
+# Пауза между повторами неудачной записи пакета (сек), растёт до WRITE_RETRY_MAX_DELAY
+WRITE_RETRY_DELAY = 1.0
+WRITE_RETRY_MAX_DELAY = 30.0
+
+# Сколько пакетов журнала передавать в БД за раз, прежде чем принять свежие результаты из буфера
+SPOOL_REPLAY_BATCHES = 10
+
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Недоступность БД (соединение, блокировка, нехватка места): пакет пройдёт позже.
+    Остальные ошибки (ограничения, неверные значения) повторятся при любой попытке"""
+    if isinstance(error, OperationalError):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+# Маркер в очереди: после записи всего, что было до него, обновить сводку на дашборде
+_DASHBOARD_MARKER = object()
+# Маркер остановки потока записи
+_STOP_MARKER = object()
+
+
+class ResultWriter:
+    """Отложенная запись результатов пинга отдельным потоком.
+
+    Пробы кладут результаты в ограниченный буфер и сразу идут дальше; поток
+    записи сохраняет их пакетами по размеру или времени. Если БД недоступна,
+    пакет уходит в журнал на диске (spool), и все следующие пакеты идут за ним,
+    пока журнал не будет передан в БД по порядку. Повторяются только ошибки
+    доступности БД; пакет, отвергнутый по другой причине, записывается по одному
+    результату, а отвергнутые результаты уходят в карантин (quarantine.bad в
+    каталоге журнала) и не задерживают следующие. Без журнала (или если он занят
+    другим процессом) пакет повторяется в памяти, а буфер копит новые результаты;
+    при переполнении новые результаты отбрасываются с подсчётом, но пробы не ждут БД.
+
+    write_batch(log_rows, address_rows, status_changes, sample_rows) записывает
+    пакет и должен бросить исключение при ошибке; on_dashboard вызывается по маркеру.
+    """
+
+    def __init__(self, write_batch: Callable[[List[dict], List[dict], List[dict], List[dict]], None],
+                 on_dashboard: Optional[Callable[[], None]] = None, max_size: int = WRITE_BUFFER_SIZE,
+                 spool: Optional[ResultSpool] = None):
+        self.write_batch = write_batch
+        self.on_dashboard = on_dashboard
+        self.spool = spool
+        self._spool_busy_logged = False
+        # Номер последнего результата, ушедшего в журнал, и время следующей попытки передачи
+        self._spooled_sequence = 0
+        self._next_replay = 0.0
+        self._replay_delay = WRITE_RETRY_DELAY
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._idle = threading.Condition(self._lock)
+        self._unwritten = 0
+        self._sequence = 0
+        # id адреса -> (номер, статус, отказов подряд) последнего ещё не записанного результата
+        self._pending_state: Dict[int, tuple] = {}
+        self._stats = {
+            'written': 0,
+            'dropped': 0,
+            'batches': 0,
+            'failures': 0,
+            'spooled': 0,
+            'replayed': 0,
+            'quarantined': 0,
+            'max_depth': 0,
+            'last_flush_latency': None,
+            'max_flush_latency': 0.0,
+            'last_error': None
+        }
+        self._latency_total = 0.0
+
+    def start(self):
+        """Запуск потока записи заранее: журнал от прошлого запуска передаётся в БД, не дожидаясь проб"""
+        with self._lock:
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='result-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, log_row: Optional[dict], address_row: Optional[dict], status_change: Optional[dict] = None,
+               sample_row: Optional[dict] = None) -> bool:
+        """Постановка результата в буфер; False - буфер полон, результат отброшен.
+        Любая из строк может отсутствовать (компактное хранение, запись одного замера)"""
+        with self._lock:
+            self._ensure_thread()
+            self._sequence += 1
+            sequence = self._sequence
+            try:
+                self._queue.put_nowait((sequence, log_row, address_row, status_change, sample_row))
+            except queue.Full:
+                self._stats['dropped'] += 1
+                if self._stats['dropped'] % 1000 == 1:
+                    logger.warning(f"Result buffer is full, {self._stats['dropped']} results dropped so far")
+                return False
+            self._unwritten += 1
+            if address_row is not None:
+                self._pending_state[address_row['b_id']] = (sequence, address_row['b_status'],
+                                                            address_row['b_failures'])
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._queue.qsize())
+        return True
+
+    def request_dashboard_update(self):
+        with self._lock:
+            self._ensure_thread()
+        try:
+            self._queue.put_nowait(_DASHBOARD_MARKER)
+        except queue.Full:
+            pass  # сводка обновится со следующим маркером
+
+    def pending_state(self, address_id: int):
+        """(статус, отказов подряд) ещё не записанного результата адреса или None.
+        Нужен, чтобы следующий цикл не сравнивал новый статус с устаревшим из БД"""
+        with self._lock:
+            state = self._pending_state.get(address_id)
+        return None if state is None else state[1:]
+
+    def _next_batch(self, timeout: Optional[float]):
+        """Пакет результатов и флаг маркера сводки; None - поток останавливают"""
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return [], False
+        if item is _STOP_MARKER:
+            return None
+
+        batch = []
+        dashboard = False
+        deadline = time.monotonic() + WRITE_BATCH_INTERVAL
+        while True:
+            if item is _STOP_MARKER:
+                self._queue.put(_STOP_MARKER)  # допишем этот пакет и остановимся на следующем шаге
+                break
+            if item is _DASHBOARD_MARKER:
+                dashboard = True
+                break  # сводка должна учесть всё, что было до маркера
+            batch.append(item)
+            if len(batch) >= WRITE_BATCH_SIZE:
+                break
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+        return batch, dashboard
+
+    @staticmethod
+    def _rows(batch):
+        log_rows = [item[1] for item in batch if item[1] is not None]
+        address_rows = [item[2] for item in batch if item[2] is not None]
+        status_changes = [item[3] for item in batch if item[3] is not None]
+        sample_rows = [item[4] for item in batch if item[4] is not None]
+        return log_rows, address_rows, status_changes, sample_rows
+
+    def _record_failure(self, error: Exception):
+        with self._lock:
+            self._stats['failures'] += 1
+            self._stats['last_error'] = str(error)
+
+    def _open_spool(self) -> bool:
+        if self.spool is None:
+            return False
+        try:
+            opened = self.spool.open()
+        except OSError as e:
+            logger.error(f"Error opening result spool {self.spool.directory}: {str(e)}")
+            return False
+        if not opened and not self._spool_busy_logged:
+            logger.warning(f"Result spool {self.spool.directory} is used by another process, "
+                           f"results are kept in memory while the database is unavailable")
+            self._spool_busy_logged = True
+        return opened
+
+    def _spool_pending(self) -> bool:
+        return self.spool is not None and self.spool.opened and self.spool.pending > 0
+
+    def _to_spool(self, batch) -> bool:
+        try:
+            self.spool.append(batch)
+        except OSError as e:
+            logger.error(f"Error spooling {len(batch)} ping results: {str(e)}")
+            return False
+        with self._lock:
+            self._spooled_sequence = batch[-1][0]
+            self._stats['spooled'] += len(batch)
+            self._unwritten -= len(batch)
+            self._idle.notify_all()
+        return True
+
+    def _write(self, batch):
+        delay = WRITE_RETRY_DELAY
+
+        while True:
+            if self._spool_pending():
+                # Журнал ещё не передан: пакет встаёт за ним, чтобы сохранить порядок результатов
+                if self._to_spool(batch):
+                    return
+            else:
+                started = time.monotonic()
+                try:
+                    self.write_batch(*self._rows(batch))
+                    self._written(batch, time.monotonic() - started)
+                    return
+                except Exception as e:
+                    self._record_failure(e)
+                    if not is_transient_error(e):
+                        logger.error(f"Database rejected a batch of {len(batch)} ping results, "
+                                     f"writing them one by one: {str(e)}")
+                        written, rejected, batch, e = self._write_each(batch)
+                        if written:
+                            self._written(written, time.monotonic() - started)
+                        if rejected:
+                            self._quarantine(rejected)
+                            with self._lock:
+                                self._settle([item for item, _ in rejected])
+                        if not batch:
+                            return
+                    if self._open_spool() and self._to_spool(batch):
+                        logger.error(f"Error writing {len(batch)} ping results, spooled to disk "
+                                     f"until the database recovers: {str(e)}")
+                        self._replay_delay = WRITE_RETRY_DELAY
+                        self._next_replay = time.monotonic() + self._replay_delay
+                        return
+                    logger.error(f"Error writing {len(batch)} ping results, retrying in {delay:.0f}s "
+                                 f"({self._queue.qsize()} buffered): {str(e)}")
+            time.sleep(delay)
+            delay = min(delay * 2, WRITE_RETRY_MAX_DELAY)
+
+    def _settle(self, batch):
+        """Результаты пакета покинули буфер (вызывается под self._lock)"""
+        for sequence, _, address_row, _, _ in batch:
+            if address_row is None:
+                continue
+            state = self._pending_state.get(address_row['b_id'])
+            if state is not None and state[0] == sequence:
+                del self._pending_state[address_row['b_id']]
+        self._unwritten -= len(batch)
+        self._idle.notify_all()
+
+    def _written(self, batch, latency: float):
+        with self._lock:
+            self._settle(batch)
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['last_flush_latency'] = round(latency, 4)
+            self._stats['max_flush_latency'] = round(max(self._stats['max_flush_latency'], latency), 4)
+            self._latency_total += latency
+
+    def _quarantine(self, rejected):
+        """Отвергнутые БД результаты [(результат, ошибка)] - в файл карантина (или только в лог)"""
+        for item, error in rejected:
+            logger.error(f"Ping result rejected by the database, quarantined: {item[1:]}: {str(error)}")
+        if self._open_spool():
+            try:
+                for item, error in rejected:
+                    self.spool.quarantine([item], str(error))
+            except OSError as e:
+                logger.error(f"Error writing {len(rejected)} rejected ping results to quarantine: {str(e)}")
+        with self._lock:
+            self._stats['quarantined'] += len(rejected)
+
+    def _write_each(self, batch):
+        """Пакет, отвергнутый не из-за недоступности БД: запись по одному результату.
+
+        Возвращает (записанные, отвергнутые [(результат, ошибка)], незаписанный остаток,
+        ошибка доступности БД, на которой запись прервалась, или None).
+        """
+        written, rejected = [], []
+        for index, item in enumerate(batch):
+            try:
+                self.write_batch(*self._rows([item]))
+            except Exception as e:
+                if is_transient_error(e):
+                    return written, rejected, batch[index:], e
+                rejected.append((item, e))
+                continue
+            written.append(item)
+        return written, rejected, [], None
+
+    def _replay(self):
+        """Передача журнала в БД по порядку, не больше SPOOL_REPLAY_BATCHES пакетов за вызов"""
+        if not self._spool_pending() or time.monotonic() < self._next_replay:
+            return
+
+        for _ in range(SPOOL_REPLAY_BATCHES):
+            records, positions = self.spool.read(WRITE_BATCH_SIZE)
+            if not records:
+                break
+            try:
+                self.write_batch(*self._rows(records))
+            except Exception as e:
+                self._record_failure(e)
+                if is_transient_error(e):
+                    self._replay_failed(e)
+                    return
+                # Отвергнутые результаты не должны держать позицию журнала
+                logger.error(f"Database rejected {len(records)} spooled ping results, "
+                             f"replaying them one by one: {str(e)}")
+                written, rejected, remaining, e = self._write_each(records)
+                if rejected:
+                    self._quarantine(rejected)
+                done = len(records) - len(remaining)
+                if done:
+                    self.spool.commit(positions[done - 1], done)
+                with self._lock:
+                    self._stats['replayed'] += len(written)
+                if remaining:
+                    self._replay_failed(e)
+                    return
+                continue
+            self.spool.commit(positions[-1], len(records))
+            with self._lock:
+                self._stats['replayed'] += len(records)
+            self._replay_delay = WRITE_RETRY_DELAY
+
+        if not self.spool.pending:
+            with self._lock:
+                # Всё, что ушло в журнал, теперь в БД: состояние адресов читается из неё
+                for address_id, state in list(self._pending_state.items()):
+                    if state[0] <= self._spooled_sequence:
+                        del self._pending_state[address_id]
+            logger.info(f"Spooled ping results replayed, {self._stats['replayed']} in total")
+
+    def _replay_failed(self, error: Exception):
+        logger.warning(f"Database still unavailable, {self.spool.pending} spooled results "
+                       f"wait for replay: {str(error)}")
+        self._next_replay = time.monotonic() + self._replay_delay
+        self._replay_delay = min(self._replay_delay * 2, WRITE_RETRY_MAX_DELAY)
+
+    def _replay_timeout(self) -> Optional[float]:
+        """Сколько ждать новых результатов до следующей передачи журнала; None - журнал пуст"""
+        if not self._spool_pending():
+            return None
+        return max(0.0, self._next_replay - time.monotonic())
+
+    def _run(self):
+        if self.spool is not None and self.spool.has_data():
+            # Журнал прошлого запуска: передаём его раньше новых результатов
+            self._open_spool()
+
+        while True:
+            next_batch = self._next_batch(self._replay_timeout())
+            if next_batch is None:
+                return
+            batch, dashboard = next_batch
+
+            if batch:
+                self._write(batch)
+            self._replay()
+            if dashboard and self.on_dashboard:
+                try:
+                    self.on_dashboard()
+                except Exception as e:
+                    logger.error(f"Error sending dashboard update: {str(e)}")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Ожидание записи всего буфера; False - не успели за timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._unwritten:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        """Дописать буфер и остановить поток (при завершении процесса)"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        if not self.flush(timeout):
+            logger.warning(f"Result writer stopped with {self._unwritten} unwritten results")
+        try:
+            self._queue.put(_STOP_MARKER, timeout=1)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=1)
+        if self.spool is not None and self.spool.opened:
+            self.spool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина буфера и задержка записи для мониторинга"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['depth'] = self._queue.qsize()
+            stats['unwritten'] = self._unwritten
+            stats['avg_flush_latency'] = round(self._latency_total / stats['batches'], 4) if stats['batches'] else None
+        if self.spool is not None and self.spool.opened:
+            stats['spool_pending'] = self.spool.pending
+            stats['spool_bytes'] = self.spool.size()
+        return stats
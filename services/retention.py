@@ -0,0 +1,283 @@
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import column as column_clause, select, table as table_clause, text
+
+from models import NetworkAddress, PingLog, PingRollup, PingSample, RetentionPolicy, StatusTransition
+
+logger = logging.getLogger(__name__)
+
+# Как часто запускать очистку (сек)
+RETENTION_INTERVAL = 3600
+
+# Строк за одно удаление и пауза между порциями: короткие транзакции не держат блокировки
+RETENTION_CHUNK = 5000
+RETENTION_CHUNK_PAUSE = 0.05
+
+# Секционированные по времени таблицы PostgreSQL: таблица -> столбец ключа секций
+PARTITIONED_TABLES = {
+    PingLog.__tablename__: 'timestamp',
+    PingSample.__tablename__: 'window_start'
+}
+
+# На сколько дней вперёд заранее создавать дневные секции
+PARTITION_PREMAKE_DAYS = 3
+
+_ROLLUP_TARGETS = {'rollup_minute': 60, 'rollup_hour': 3600, 'rollup_day': 86400}
+
+_PARTITION_UPPER = re.compile(r"TO \('([^']+)'\)")
+
+_retention_state = {
+    'last_run': None,
+    'last_duration': None,
+    'deleted': {},
+    'dropped_partitions': [],
+    'last_error': None
+}
+
+
+def _targets() -> Dict[str, Tuple[object, object, list]]:
+    """Цель политики -> (таблица, столбец времени, доп. условия)"""
+    rollup = PingRollup.__table__
+    targets = {
+        'ping_log': (PingLog.__table__, PingLog.__table__.c.timestamp, []),
+        'ping_sample': (PingSample.__table__, PingSample.__table__.c.window_start, []),
+        'status_transition': (StatusTransition.__table__, StatusTransition.__table__.c.timestamp, [])
+    }
+    for target, resolution in _ROLLUP_TARGETS.items():
+        targets[target] = (rollup, rollup.c.bucket_start, [rollup.c.resolution == resolution])
+    return targets
+
+
+def delete_in_chunks(session, table, conditions, chunk: int = RETENTION_CHUNK,
+                     pause: float = RETENTION_CHUNK_PAUSE) -> int:
+    """Удаление строк по условию порциями по chunk, каждая - в своей транзакции"""
+    deleted = 0
+    while True:
+        ids = select(table.c.id).where(*conditions).limit(chunk).scalar_subquery()
+        count = session.execute(table.delete().where(table.c.id.in_(ids))).rowcount
+        session.commit()
+        deleted += count
+        if count < chunk:
+            return deleted
+        time.sleep(pause)
+
+
+# --- Секционирование PostgreSQL ---
+
+def _quote(connection, name: str) -> str:
+    return connection.dialect.identifier_preparer.quote(name)
+
+
+def is_partitioned(connection, table_name: str) -> bool:
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {'name': table_name}).first() is not None
+
+
+def list_partitions(connection, table_name: str) -> List[Tuple[str, Optional[datetime]]]:
+    """Секции таблицы и их верхние границы (None - секция DEFAULT)"""
+    rows = connection.execute(text(
+        "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+        "FROM pg_inherits i JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :name AND pg_table_is_visible(parent.oid)"
+    ), {'name': table_name}).all()
+    partitions = []
+    for name, bound in rows:
+        match = _PARTITION_UPPER.search(bound or '')
+        partitions.append((name, datetime.fromisoformat(match.group(1)) if match else None))
+    return sorted(partitions, key=lambda partition: partition[1] or datetime.max)
+
+
+def ensure_partitions(connection, table_name: str, days_ahead: int = PARTITION_PREMAKE_DAYS) -> List[str]:
+    """Дневные секции от последней существующей до сегодня + days_ahead и секция DEFAULT"""
+    column = PARTITIONED_TABLES[table_name]
+    partitions = list_partitions(connection, table_name)
+    created = []
+
+    if not any(upper is None for _, upper in partitions):
+        # Сюда попадут строки вне дневных секций (например, из журнала после удаления их секции)
+        name = f"{table_name}_default"
+        connection.execute(text(f"CREATE TABLE {_quote(connection, name)} "
+                                f"PARTITION OF {_quote(connection, table_name)} DEFAULT"))
+        created.append(name)
+
+    uppers = [upper for _, upper in partitions if upper is not None]
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    day = max(uppers) if uppers else today
+    while day < today + timedelta(days=days_ahead + 1):
+        name = f"{table_name}_p{day:%Y%m%d}"
+        try:
+            with connection.begin_nested():
+                connection.execute(text(
+                    f"CREATE TABLE {_quote(connection, name)} PARTITION OF {_quote(connection, table_name)} "
+                    f"FOR VALUES FROM ('{day:%Y-%m-%d}') TO ('{day + timedelta(days=1):%Y-%m-%d}')"
+                ))
+            created.append(name)
+        except Exception as e:
+            # Строки этого дня уже лежат в DEFAULT (секции не успели создать) - остаются там
+            logger.warning(f"Partition {name} not created: {str(e)}")
+        day += timedelta(days=1)
+
+    if created:
+        logger.info(f"Created partitions of {table_name} ({column}): {', '.join(created)}")
+    return created
+
+
+def drop_expired_partitions(connection, table_name: str, cutoff: datetime) -> List[str]:
+    """Удаление секций целиком, если все их строки старше cutoff"""
+    dropped = []
+    for name, upper in list_partitions(connection, table_name):
+        if upper is not None and upper <= cutoff:
+            connection.execute(text(f"ALTER TABLE {_quote(connection, table_name)} "
+                                    f"DETACH PARTITION {_quote(connection, name)}"))
+            connection.execute(text(f"DROP TABLE {_quote(connection, name)}"))
+            dropped.append(name)
+    if dropped:
+        logger.info(f"Dropped expired partitions of {table_name}: {', '.join(dropped)}")
+    return dropped
+
+
+def convert_to_partitioned(engine, table_name: str):
+    """Перевод таблицы PostgreSQL в секционированную по дням (однократно, в одной транзакции).
+
+    Прежняя таблица становится секцией FROM (MINVALUE) TO (дня после её последней
+    строки) и удаляется политикой целиком, когда вся её история устареет.
+    """
+    if engine.dialect.name != 'postgresql':
+        raise RuntimeError('time partitioning needs PostgreSQL')
+    column = PARTITIONED_TABLES[table_name]
+    table = PingLog.metadata.tables[table_name]
+    legacy = f"{table_name}_legacy"
+
+    with engine.begin() as connection:
+        if is_partitioned(connection, table_name):
+            logger.info(f"{table_name} is already partitioned")
+            return
+
+        def q(name):
+            return _quote(connection, name)
+
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                                      {'table': table_name}).scalar()
+        connection.execute(text(f"ALTER TABLE {q(table_name)} RENAME TO {q(legacy)}"))
+        # Имена индексов уникальны в схеме: освобождаем их для новой таблицы
+        for (index_name,) in connection.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE tablename = :table"), {'table': legacy}).all():
+            connection.execute(text(f"ALTER INDEX {q(index_name)} RENAME TO {q(index_name + '_legacy')}"))
+
+        # Первичный ключ секционированной таблицы обязан включать ключ секций
+        connection.execute(text(
+            f"CREATE TABLE {q(table_name)} (LIKE {q(legacy)} INCLUDING DEFAULTS) PARTITION BY RANGE ({q(column)})"
+        ))
+        connection.execute(text(f"ALTER TABLE {q(table_name)} ADD PRIMARY KEY (id, {q(column)})"))
+        for foreign_key in table.foreign_key_constraints:
+            columns = ', '.join(q(element.parent.name) for element in foreign_key.elements)
+            referred = ', '.join(q(element.column.name) for element in foreign_key.elements)
+            connection.execute(text(
+                f"ALTER TABLE {q(table_name)} ADD FOREIGN KEY ({columns}) "
+                f"REFERENCES {q(foreign_key.referred_table.name)} ({referred})"
+            ))
+        for index in table.indexes:
+            index.create(connection)
+        if sequence:
+            # Иначе последовательность id удалится вместе с прежней таблицей
+            connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {q(table_name)}.id"))
+
+        last = connection.execute(text(f"SELECT max({q(column)}) FROM {q(legacy)}")).scalar()
+        if last is None:
+            connection.execute(text(f"DROP TABLE {q(legacy)}"))
+        else:
+            upper = last.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            connection.execute(text(f"ALTER TABLE {q(legacy)} ALTER COLUMN {q(column)} SET NOT NULL"))
+            connection.execute(text(
+                f"ALTER TABLE {q(table_name)} ATTACH PARTITION {q(legacy)} "
+                f"FOR VALUES FROM (MINVALUE) TO ('{upper:%Y-%m-%d}')"
+            ))
+        ensure_partitions(connection, table_name)
+
+    logger.info(f"{table_name} converted to daily partitions by {column}")
+
+
+# --- Очистка ---
+
+def apply_retention(session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Один проход очистки по всем политикам; возвращает удалённые строки по целям"""
+    now = now or datetime.utcnow()
+    policies = RetentionPolicy.get_all()
+    deleted = {}
+    dropped = []
+
+    connection = session.connection()
+    for table_name in PARTITIONED_TABLES:
+        if is_partitioned(connection, table_name):
+            ensure_partitions(connection, table_name)
+    session.commit()
+
+    for target, (table, column, conditions) in _targets().items():
+        keep_days = policies.get(target) or 0
+        if keep_days <= 0:
+            continue
+        cutoff = now - timedelta(days=keep_days)
+
+        if table.name in PARTITIONED_TABLES and is_partitioned(session.connection(), table.name):
+            # Устаревшие дни уходят целиком; построчно чистится только секция DEFAULT
+            dropped += drop_expired_partitions(session.connection(), table.name, cutoff)
+            session.commit()
+            default_partition = next((name for name, upper in list_partitions(session.connection(), table.name)
+                                      if upper is None), None)
+            if default_partition:
+                partition = table_clause(default_partition, column_clause('id'), column_clause(column.name))
+                deleted[target] = delete_in_chunks(
+                    session, partition, [partition.c[column.name] < cutoff]
+                )
+            continue
+
+        deleted[target] = delete_in_chunks(session, table, [column < cutoff] + conditions)
+
+    keep_days = policies.get('inactive_address') or 0
+    if keep_days > 0:
+        cutoff = now - timedelta(days=keep_days)
+        removed = [address_id for (address_id,) in session.execute(
+            select(NetworkAddress.id).where(NetworkAddress.is_active.is_(False), NetworkAddress.updated_at < cutoff)
+        ).all()]
+        count = 0
+        for table in (PingLog.__table__, PingSample.__table__, PingRollup.__table__, StatusTransition.__table__):
+            for address_id in removed:
+                count += delete_in_chunks(session, table, [table.c.network_address_id == address_id])
+        deleted['inactive_address'] = count
+
+    _retention_state['deleted'] = deleted
+    _retention_state['dropped_partitions'] = dropped
+    return deleted
+
+
+def run_retention():
+    """Задание планировщика: очистка по политикам в контексте приложения"""
+    from app import app, db
+    started = time.monotonic()
+    with app.app_context():
+        try:
+            deleted = apply_retention(db.session)
+            _retention_state['last_error'] = None
+            total = sum(deleted.values())
+            if total or _retention_state['dropped_partitions']:
+                logger.info(f"Retention removed {total} rows ({deleted}), "
+                            f"dropped {len(_retention_state['dropped_partitions'])} partitions")
+        except Exception as e:
+            db.session.rollback()
+            _retention_state['last_error'] = str(e)
+            logger.error(f"Error applying retention: {str(e)}")
+    _retention_state['last_run'] = datetime.utcnow().isoformat()
+    _retention_state['last_duration'] = round(time.monotonic() - started, 3)
+
+
+def get_retention_status() -> Dict[str, object]:
+    return dict(_retention_state)
@@ -0,0 +1,145 @@
+import bisect
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, select
+
+from models import BackfillState, PingRollup, ROLLUP_RESOLUTIONS, RTT_HISTOGRAM_BOUNDS
+
+EPOCH = datetime(1970, 1, 1)
+
+# Столько точек (не больше) отдаёт история: разрешение выбирается по длине периода
+HISTORY_MAX_POINTS = 3000
+
+# Строка backfill_state с временем первой пробы, попавшей в свёртки при записи:
+# граница, до которой backfill_rollups.py дополняет их из ping_log
+LIVE_MARKER = 'rollup_live'
+
+_table = PingRollup.__table__
+_marker_table = BackfillState.__table__
+_KEY = ('network_address_id', 'resolution', 'bucket_start')
+_SUMMED = ('probes', 'lost', 'rtt_count', 'rtt_sum') + PingRollup.HISTOGRAM_COLUMNS
+
+
+def bucket_start(timestamp: datetime, resolution: int) -> datetime:
+    elapsed = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=elapsed - elapsed % resolution)
+
+
+def history_resolution(start: datetime, end: datetime) -> int:
+    """Самое подробное разрешение, при котором период укладывается в HISTORY_MAX_POINTS точек"""
+    span = (end - start).total_seconds()
+    for resolution in ROLLUP_RESOLUTIONS:
+        if span / resolution <= HISTORY_MAX_POINTS:
+            return resolution
+    return ROLLUP_RESOLUTIONS[-1]
+
+
+def _empty_row(key) -> dict:
+    row = dict(zip(_KEY, key))
+    row.update({column: 0 for column in _SUMMED})
+    row['rtt_sum'] = 0.0
+    row['rtt_min'] = None
+    row['rtt_max'] = None
+    return row
+
+
+def rollup_rows(probes: Iterable[Tuple[int, datetime, str, Optional[float]]],
+                resolutions: Tuple[int, ...] = ROLLUP_RESOLUTIONS) -> List[dict]:
+    """Прирост строк свёртки по пробам (id адреса, время, статус, RTT) - по строке на адрес,
+    разрешение и интервал; складывается с уже записанными через merge_rollups"""
+    rows: Dict[tuple, dict] = {}
+    for address_id, timestamp, status, response_time in probes:
+        histogram_column = None
+        if status == 'up' and response_time is not None:
+            histogram_column = PingRollup.HISTOGRAM_COLUMNS[bisect.bisect_left(RTT_HISTOGRAM_BOUNDS, response_time)]
+
+        for resolution in resolutions:
+            key = (address_id, resolution, bucket_start(timestamp, resolution))
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = _empty_row(key)
+            row['probes'] += 1
+            if status != 'up':
+                row['lost'] += 1
+            elif histogram_column is not None:
+                row['rtt_count'] += 1
+                row['rtt_sum'] += response_time
+                row[histogram_column] += 1
+                row['rtt_min'] = response_time if row['rtt_min'] is None else min(row['rtt_min'], response_time)
+                row['rtt_max'] = response_time if row['rtt_max'] is None else max(row['rtt_max'], response_time)
+    return list(rows.values())
+
+
+def _upsert_statement(dialect: str):
+    """INSERT ... ON CONFLICT DO UPDATE, прибавляющий прирост к строке интервала"""
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(_table)
+    excluded = statement.excluded
+    values = {column: _table.c[column] + excluded[column] for column in _SUMMED}
+    values['rtt_min'] = case(
+        (_table.c.rtt_min.is_(None), excluded.rtt_min),
+        (excluded.rtt_min < _table.c.rtt_min, excluded.rtt_min),
+        else_=_table.c.rtt_min
+    )
+    values['rtt_max'] = case(
+        (_table.c.rtt_max.is_(None), excluded.rtt_max),
+        (excluded.rtt_max > _table.c.rtt_max, excluded.rtt_max),
+        else_=_table.c.rtt_max
+    )
+    return statement.on_conflict_do_update(index_elements=list(_KEY), set_=values)
+
+
+def _merge_generic(session, rows: List[dict]):
+    """Для прочих СУБД: чтение существующих строк и обновление по одной"""
+    for row in rows:
+        existing = session.execute(select(_table).where(
+            *[_table.c[column] == row[column] for column in _KEY]
+        )).mappings().first()
+        if existing is None:
+            session.execute(_table.insert(), row)
+            continue
+        values = {column: existing[column] + row[column] for column in _SUMMED}
+        values['rtt_min'] = min((value for value in (existing['rtt_min'], row['rtt_min']) if value is not None),
+                                default=None)
+        values['rtt_max'] = max((value for value in (existing['rtt_max'], row['rtt_max']) if value is not None),
+                                default=None)
+        session.execute(_table.update().where(_table.c.id == existing['id']).values(**values))
+
+
+def merge_rollups(session, rows: List[dict]):
+    """Прибавление прироста к свёрткам в текущей транзакции (коммит - за вызывающим)"""
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        session.execute(_upsert_statement(dialect), rows)
+    else:
+        _merge_generic(session, rows)
+
+
+def mark_rollups_live(session, first_timestamp: Optional[datetime]):
+    """Отметка о начале ведения свёрток при записи - время первой так записанной пробы
+    (в транзакции этой записи, до merge_rollups). Пишется один раз; если свёртки
+    уже велись без отметки, время неизвестно, и отметка остаётся пустой."""
+    marker = _marker_table.c
+    if session.execute(select(marker.id).where(marker.target == LIVE_MARKER)).first() is not None:
+        return
+    if session.execute(select(_table.c.id).limit(1)).first() is not None:
+        first_timestamp = None
+
+    values = {'target': LIVE_MARKER, 'until': first_timestamp, 'last_id': 0, 'completed': True,
+              'updated_at': datetime.utcnow()}
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        session.execute(_marker_table.insert(), values)
+        return
+    # Другой процесс мог отметить одновременно: его отметка не раньше этой записи
+    session.execute(insert(_marker_table).on_conflict_do_nothing(index_elements=['target']), values)
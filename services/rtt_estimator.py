@@ -0,0 +1,99 @@
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+# Коэффициенты сглаживания из RFC 6298
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+
+# Нижняя граница адаптивного таймаута (сек): RFC-шный минимум в 1 с слишком велик для ICMP в LAN
+MIN_TIMEOUT = 0.05
+
+
+class RttEstimator:
+    """Сглаженные RTT и его разброс по каждому адресу (RFC 6298) для расчёта индивидуального таймаута.
+
+    Оценка учится только на ответах, уложившихся в таймаут. Если RTT хоста вырос выше
+    RTO, ответы всегда опаздывают и оценка не меняется, поэтому после таймаута RTO
+    удваивается (RFC 6298, 5.5), пока ответ не придёт, а с ответом считается заново.
+    """
+
+    def __init__(self, min_timeout: float = MIN_TIMEOUT):
+        self.min_timeout = min_timeout
+        # ip -> (SRTT, RTTVAR) в секундах
+        self._state: Dict[str, Tuple[float, float]] = {}
+        # ip -> RTO, увеличенный таймаутами (сек)
+        self._backoff: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, ip_address: str, rtt: float):
+        """Учёт измеренного RTT (в секундах)"""
+        with self._lock:
+            self._backoff.pop(ip_address, None)
+            state = self._state.get(ip_address)
+            if state is None:
+                self._state[ip_address] = (rtt, rtt / 2)
+                return
+
+            srtt, rttvar = state
+            rttvar = (1 - BETA) * rttvar + BETA * abs(srtt - rtt)
+            srtt = (1 - ALPHA) * srtt + ALPHA * rtt
+            self._state[ip_address] = (srtt, rttvar)
+
+    def timed_out(self, ip_address: str, max_timeout: float):
+        """Учёт пробы без ответа: RTO адреса удваивается, не выше max_timeout"""
+        with self._lock:
+            state = self._state.get(ip_address)
+            if state is None:
+                return  # без измерений и так берётся max_timeout
+            rto = self._backoff.get(ip_address) or self._rto(state, max_timeout)
+            self._backoff[ip_address] = min(rto * 2, max_timeout)
+
+    def _rto(self, state: Tuple[float, float], max_timeout: float) -> float:
+        srtt, rttvar = state
+        return max(self.min_timeout, min(srtt + K * rttvar, max_timeout))
+
+    def timeout_for(self, ip_address: str, max_timeout: float) -> float:
+        """RTO = SRTT + K * RTTVAR (или увеличенный таймаутами) в пределах
+        [min_timeout, max_timeout]; для адресов без измерений - max_timeout"""
+        with self._lock:
+            state = self._state.get(ip_address)
+            backoff = self._backoff.get(ip_address)
+
+        if state is None:
+            return max_timeout
+        if backoff is not None:
+            return min(backoff, max_timeout)
+        return self._rto(state, max_timeout)
+
+    def forget(self, ip_address: str):
+        with self._lock:
+            self._state.pop(ip_address, None)
+            self._backoff.pop(ip_address, None)
+
+    def get_state(self, ip_address: str) -> Optional[Dict[str, Any]]:
+        """Текущие SRTT/RTTVAR адреса в миллисекундах"""
+        with self._lock:
+            state = self._state.get(ip_address)
+
+        if state is None:
+            return None
+        return {'srtt': state[0] * 1000, 'rttvar': state[1] * 1000}
+
+    def export(self, ip_addresses: List[str]) -> Dict[str, Tuple[float, float, Optional[float]]]:
+        """Оценки для заданных адресов (для передачи в процесс шарда): SRTT, RTTVAR
+        и RTO после таймаутов (None - не увеличен)"""
+        with self._lock:
+            return {ip: self._state[ip] + (self._backoff.get(ip),) for ip in ip_addresses if ip in self._state}
+
+    def load(self, state: Dict[str, Tuple[float, float, Optional[float]]]):
+        with self._lock:
+            for ip, (srtt, rttvar, backoff) in state.items():
+                self._state[ip] = (srtt, rttvar)
+                if backoff is None:
+                    self._backoff.pop(ip, None)
+                else:
+                    self._backoff[ip] = backoff
+
+    def __len__(self):
+        return len(self._state)
@@ -0,0 +1,246 @@
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки PostgreSQL ('PING'), общий для всех процессов приложения
+ADVISORY_LOCK_KEY = 0x50494E47
+
+# Как часто ведомые пытаются перехватить лидерство, а лидер проверяет, что блокировка цела (сек)
+LEADER_CHECK_INTERVAL = 10
+
+LOCK_FILE_NAME = 'ping_scheduler.lock'
+
+
+class NotLeaderError(RuntimeError):
+    """Команда планировщику пришла в процесс, который не лидер: планировщик работает
+    в другом воркере, и достучаться до него отсюда нельзя"""
+
+
+class FileLock:
+    """Блокировка файла на время жизни процесса (flock / msvcrt).
+
+    ОС снимает её сама, когда процесс-владелец завершается, в том числе аварийно.
+    Работает в пределах одной машины.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        if self._file is not None:
+            return True
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        lock_file = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        # Для диагностики: кто держит блокировку
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def check(self) -> bool:
+        return self._file is not None
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+class AdvisoryLock:
+    """Сессионная advisory-блокировка PostgreSQL на отдельном соединении.
+
+    Снимается сервером при обрыве соединения, поэтому работает и между машинами:
+    упавший лидер освобождает её без участия остальных.
+    """
+
+    def __init__(self, engine, key: int = ADVISORY_LOCK_KEY):
+        self.engine = engine
+        self.key = key
+        self._connection = None
+
+    def acquire(self) -> bool:
+        if self._connection is not None:
+            return True
+
+        connection = self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            acquired = connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': self.key}).scalar()
+        except Exception:
+            connection.close()
+            raise
+
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def check(self) -> bool:
+        """Соединение живо - блокировка за нами. Оборвалось - блокировка берётся заново на
+        новом соединении; занята - лидером стал другой процесс.
+
+        Пока база недоступна (обслуживание), блокировку не может взять никто: процесс
+        остаётся лидером, и пинг продолжается в журнал на диске. Если же база недоступна
+        только этому процессу, до её возвращения пинговать могут два лидера.
+        """
+        # result_spool берёт отсюда FileLock
+        from services.result_writer import is_transient_error
+        
+        if self._connection is not None:
+            try:
+                self._connection.execute(text('SELECT 1'))
+                return True
+            except Exception as e:
+                logger.warning(f"Lost scheduler advisory lock connection: {str(e)}")
+                self._connection.invalidate()
+                self._connection = None
+        
+        try:
+            return self.acquire()
+        except Exception as e:
+            if not is_transient_error(e):
+                return False
+            logger.warning(f"Database unreachable, keeping ping scheduler leadership: {str(e)}")
+            return True
+
+    def release(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': self.key})
+        except Exception:
+            pass  # блокировка уйдёт вместе с соединением
+        finally:
+            self._connection.close()
+            self._connection = None
+
+
+class LeaderElection:
+    """Выбор единственного процесса, в котором работает планировщик пинга.
+
+    Кто первым взял блокировку - лидер и вызывает on_elected. Остальные раз в
+    LEADER_CHECK_INTERVAL пытаются её взять и становятся лидером, когда прежний
+    завершится. Лидер на каждой проверке вызывает on_tick, а при потере
+    блокировки - on_lost.
+    """
+
+    def __init__(self, lock, on_elected: Callable[[], None], on_lost: Optional[Callable[[], None]] = None,
+                 on_tick: Optional[Callable[[], None]] = None, interval: float = LEADER_CHECK_INTERVAL):
+        self.lock = lock
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.on_tick = on_tick
+        self.interval = interval
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def try_lead(self) -> bool:
+        """Попытка стать лидером прямо сейчас; True - процесс лидер"""
+        if self.is_leader:
+            return True
+        try:
+            if not self.lock.acquire():
+                return False
+        except Exception as e:
+            logger.error(f"Error acquiring scheduler lock: {str(e)}")
+            return False
+
+        self.is_leader = True
+        logger.info(f"Process {os.getpid()} became the ping scheduler leader")
+        self.on_elected()
+        return True
+
+    def _check(self):
+        if not self.is_leader:
+            self.try_lead()
+            return
+
+        if not self.lock.check():
+            self.is_leader = False
+            logger.warning(f"Process {os.getpid()} lost ping scheduler leadership")
+            if self.on_lost:
+                self.on_lost()
+            # Блокировка может быть свободна - попробовать снова сразу
+            self.try_lead()
+            return
+
+        if self.on_tick:
+            self.on_tick()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._check()
+            except Exception as e:
+                logger.error(f"Error in scheduler leader election: {str(e)}")
+
+    def start(self):
+        if not self.try_lead():
+            logger.info(f"Ping scheduler is owned by another process, process {os.getpid()} stands by")
+        self._thread = threading.Thread(target=self._run, name='scheduler-leader', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.is_leader:
+            self.is_leader = False
+            self.lock.release()
+
+
+_election: Optional[LeaderElection] = None
+
+
+def create_lock(engine, instance_path: str):
+    """Advisory-блокировка для PostgreSQL (работает между машинами), иначе блокировка файла"""
+    if engine.dialect.name == 'postgresql':
+        return AdvisoryLock(engine)
+    path = os.environ.get('PING_LEADER_LOCK') or os.path.join(instance_path, LOCK_FILE_NAME)
+    return FileLock(path)
+
+
+def start_leader_election(lock, on_elected, on_lost=None, on_tick=None) -> LeaderElection:
+    global _election
+    _election = LeaderElection(lock, on_elected, on_lost, on_tick)
+    _election.start()
+    return _election
+
+
+def get_election() -> Optional[LeaderElection]:
+    return _election
+
+
+def is_leader() -> bool:
+    """Работает ли планировщик в этом процессе; без выбора лидера процесс единственный"""
+    return _election is None or _election.is_leader
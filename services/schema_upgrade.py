@@ -0,0 +1,48 @@
+import logging
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade_schema(db):
+    """Add columns and indexes declared in the models but missing from existing tables.
+
+    db.create_all() only creates missing tables, so databases created by an
+    older version would otherwise fail on new columns. Columns are added as
+    nullable with the model's scalar default as the server default.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if isinstance(default, bool):
+                    ddl += f' DEFAULT {"TRUE" if default else "FALSE"}' if db.engine.dialect.name != 'sqlite' \
+                        else f' DEFAULT {int(default)}'
+                elif isinstance(default, (int, float)):
+                    ddl += f' DEFAULT {default}'
+                elif isinstance(default, str):
+                    ddl += " DEFAULT '{}'".format(default.replace("'", "''"))
+
+                connection.execute(text(ddl))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+                    logger.info(f"Created index {index.name} on {table.name}")
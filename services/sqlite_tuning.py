@@ -0,0 +1,112 @@
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+# Профиль SQLite для локальной/автономной установки.
+# WAL: чтение страниц не ждёт коммитов планировщика, а запись идёт в журнал без
+# перезаписи файла базы. synchronous=NORMAL в режиме WAL не портит базу при сбое,
+# но последние транзакции до сбоя питания могут пропасть.
+SQLITE_SYNCHRONOUS = 'NORMAL'
+# Файл базы отображается в память (байт): чтение без копирования через системные вызовы
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+# Кэш страниц на соединение (отрицательное значение - в КиБ)
+SQLITE_CACHE_SIZE = -64 * 1024
+# Сколько ждать освободившуюся блокировку записи вместо ошибки "database is locked" (мс)
+SQLITE_BUSY_TIMEOUT = 10000
+# Временные таблицы и сортировки - в памяти
+SQLITE_TEMP_STORE = 'MEMORY'
+
+# Как часто переносить журнал WAL в файл базы и обновлять статистику (сек)
+SQLITE_MAINTENANCE_INTERVAL = 600
+
+# WAL не работает на сетевых дисках: SQLITE_WAL=0 переводит базу на обычный журнал
+WAL_ENABLED = os.environ.get('SQLITE_WAL', '1') != '0'
+
+_maintenance_state = {
+    'journal_mode': None,
+    'last_run': None,
+    'last_duration': None,
+    'checkpoint': None,
+    'last_error': None
+}
+
+
+def _is_memory_database(engine) -> bool:
+    return engine.url.database in (None, '', ':memory:')
+
+
+def _on_connect(dbapi_connection, connection_record):
+    """Настройки соединения: journal_mode хранится в файле базы, остальные - на соединение"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT}")
+        # Режим журнала хранится в файле базы: база, уже переведённая в WAL, возвращается
+        # к обычному журналу только явной командой
+        journal_mode = 'WAL' if WAL_ENABLED else 'DELETE'
+        result = cursor.execute(f"PRAGMA journal_mode = {journal_mode}").fetchone()[0]
+        if result.upper() != journal_mode and result != _maintenance_state['journal_mode']:
+            # Выйти из WAL нельзя, пока базу держат другие соединения (например, второй процесс)
+            logger.warning(f"SQLite journal_mode is {result}, {journal_mode} requested")
+        _maintenance_state['journal_mode'] = result
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA temp_store = {SQLITE_TEMP_STORE}")
+    finally:
+        cursor.close()
+
+
+def configure_sqlite(engine) -> bool:
+    """Подключение профиля к движку SQLite (для прочих СУБД ничего не делает)"""
+    if engine.dialect.name != 'sqlite' or _is_memory_database(engine):
+        return False
+    if not event.contains(engine, 'connect', _on_connect):
+        event.listen(engine, 'connect', _on_connect)
+        # Уже открытые соединения пула настроены по-старому
+        engine.dispose()
+        logger.info(f"SQLite profile: WAL {'on' if WAL_ENABLED else 'off'}, synchronous={SQLITE_SYNCHRONOUS}, "
+                    f"mmap {SQLITE_MMAP_SIZE // (1024 * 1024)} MB, cache {-SQLITE_CACHE_SIZE // 1024} MB")
+    return True
+
+
+def sqlite_maintenance(engine):
+    """Перенос журнала WAL в файл базы и PRAGMA optimize.
+
+    Автоматический checkpoint SQLite не успевает за постоянными читателями, и
+    журнал растёт; PASSIVE не ждёт ни читателей, ни писателей - что не удалось
+    перенести сейчас, перенесётся в следующий раз.
+    """
+    started = time.monotonic()
+    try:
+        with engine.connect() as connection:
+            if WAL_ENABLED:
+                busy, log_frames, checkpointed = connection.execute(
+                    text("PRAGMA wal_checkpoint(PASSIVE)")).one()
+                _maintenance_state['checkpoint'] = {
+                    'busy': bool(busy), 'log_frames': log_frames, 'checkpointed': checkpointed
+                }
+            connection.execute(text("PRAGMA optimize"))
+            connection.commit()
+        _maintenance_state['last_error'] = None
+    except Exception as e:
+        _maintenance_state['last_error'] = str(e)
+        logger.error(f"Error during SQLite maintenance: {str(e)}")
+    _maintenance_state['last_run'] = datetime.utcnow().isoformat()
+    _maintenance_state['last_duration'] = round(time.monotonic() - started, 3)
+
+
+def run_sqlite_maintenance():
+    """Задание планировщика: обслуживание базы приложения"""
+    from app import app, db
+    with app.app_context():
+        sqlite_maintenance(db.engine)
+
+
+def get_sqlite_status() -> Dict[str, object]:
+    return dict(_maintenance_state)
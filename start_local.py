@@ -131,6 +131,13 @@ def main():
             from app import db
             db.create_all()
             print("✅ База данных инициализирована")
+            if db.engine.dialect.name == 'sqlite':
+                from services.sqlite_tuning import WAL_ENABLED, get_sqlite_status
+                # Режим, который база реально приняла: WAL может не включиться (сетевой диск, только чтение)
+                journal_mode = (get_sqlite_status()['journal_mode'] or 'неизвестен').upper()
+                requested = 'WAL' if WAL_ENABLED else 'DELETE'
+                note = '' if journal_mode == requested else f" (запрошен {requested})"
+                print(f"⚡ SQLite: journal_mode={journal_mode}{note}, synchronous=NORMAL")
             
             # Создаем пользователя admin, если его нет
             from models import User, UserRole
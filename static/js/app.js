@@ -177,6 +177,17 @@ function resetPingSettingsToDefaults() {
     document.getElementById('max_retries').value = '3';
     document.getElementById('max_threads').value = '50';
     document.getElementById('batch_size').value = '100';
+    document.getElementById('probe_processes').value = '1';
+    document.getElementById('adaptive_timeout').checked = false;
+    document.getElementById('probe_rate').value = '0';
+    document.getElementById('probe_burst').value = '50';
+    document.getElementById('subnet_rate').value = '0';
+    document.getElementById('schedule_mode').value = 'burst';
+    document.getElementById('backoff_enabled').checked = false;
+    document.getElementById('backoff_threshold').value = '5';
+    document.getElementById('backoff_max_interval').value = '3600';
+    document.getElementById('storage_mode').value = 'full';
+    document.getElementById('sample_window').value = '300';
     
     showToast('Значения сброшены к настройкам по умолчанию', 'info');
 }
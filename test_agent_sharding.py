@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Тесты распределения адресов между агентами (services/agent_sharding.py)
+"""
+
+from services.agent_sharding import HashRing, ShardMap, LOCAL_NODE
+
+ADDRESSES = [f"10.0.{number // 256}.{number % 256}" for number in range(2000)]
+
+
+def _owners(ring):
+    return {ip: ring.node_for(ip) for ip in ADDRESSES}
+
+
+def test_agent_leave_moves_only_its_addresses():
+    """Уход агента переносит только его адреса, остальные остаются у прежних владельцев"""
+    before = _owners(HashRing([LOCAL_NODE, 'agent-1', 'agent-2', 'agent-3']))
+    after = _owners(HashRing([LOCAL_NODE, 'agent-1', 'agent-3']))
+
+    for ip in ADDRESSES:
+        if before[ip] == 'agent-2':
+            assert after[ip] != 'agent-2'
+        else:
+            assert after[ip] == before[ip]
+
+
+def test_agent_join_takes_a_fair_share():
+    """Новый агент забирает около 1/N адресов, и только у других узлов"""
+    before = _owners(HashRing([LOCAL_NODE, 'agent-1', 'agent-2']))
+    after = _owners(HashRing([LOCAL_NODE, 'agent-1', 'agent-2', 'agent-3']))
+
+    moved = [ip for ip in ADDRESSES if before[ip] != after[ip]]
+    assert all(after[ip] == 'agent-3' for ip in moved)
+    assert 0.15 < len(moved) / len(ADDRESSES) < 0.35
+
+
+def test_distribution_is_even():
+    """Доли узлов отличаются от средней не больше чем в полтора раза"""
+    nodes = [LOCAL_NODE, 'agent-1', 'agent-2', 'agent-3']
+    owners = _owners(HashRing(nodes))
+    share = len(ADDRESSES) / len(nodes)
+    for node in nodes:
+        count = sum(1 for owner in owners.values() if owner == node)
+        assert share / 1.5 < count < share * 1.5
+
+
+def test_group_agents():
+    """Агент с группами получает только адреса своих групп, прочие делятся между остальными"""
+    shards = ShardMap([('agent-1', []), ('dc-2', ['DC-2'])])
+
+    assert all(shards.owner(ip, 'DC-2') == 'dc-2' for ip in ADDRESSES)
+    assert {shards.owner(ip, 'Office') for ip in ADDRESSES} == {LOCAL_NODE, 'agent-1'}
+    assert {shards.owner(ip) for ip in ADDRESSES} == {LOCAL_NODE, 'agent-1'}
+
+
+def test_without_agents():
+    """Без агентов и без координатора в кольце всё пингует координатор"""
+    assert not ShardMap([]).distributed
+    assert ShardMap([], include_local=False).owner(ADDRESSES[0]) == LOCAL_NODE
+    assert ShardMap([('dc-2', ['DC-2'])], include_local=False).owner(ADDRESSES[0], 'Office') == 'dc-2'
+
+
+if __name__ == "__main__":
+    print("Тестирование распределения адресов между агентами")
+    print("=" * 50)
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")
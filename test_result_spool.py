@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Тесты журнала результатов (services/result_spool.py) и его передачи в БД (services/result_writer.py)
+"""
+
+import os
+import pickle
+import tempfile
+import time
+import zlib
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from services.result_spool import ResultSpool, RECORD_HEADER, QUARANTINE_FILE_NAME, _segment_name
+from services.result_writer import ResultWriter
+
+
+def _records(count, start=0):
+    return [{'b_id': number, 'status': 'up'} for number in range(start, start + count)]
+
+
+def _segment_path(directory, number=1):
+    return os.path.join(directory, _segment_name(number))
+
+
+def test_append_read_commit():
+    """Записи читаются по порядку, после commit журнал пуст"""
+    with tempfile.TemporaryDirectory() as directory:
+        spool = ResultSpool(directory)
+        assert spool.open()
+        spool.append(_records(3))
+        assert spool.pending == 3
+
+        records, positions = spool.read(10)
+        assert records == _records(3)
+        spool.commit(positions[-1], len(records))
+        assert spool.pending == 0
+        assert spool.read(10) == ([], [])
+        spool.close()
+
+        assert not ResultSpool(directory).has_data()
+
+
+def test_torn_record_is_truncated():
+    """Запись, оборванная при сбое, отбрасывается, и дозапись идёт после последней целой"""
+    with tempfile.TemporaryDirectory() as directory:
+        spool = ResultSpool(directory)
+        spool.open()
+        spool.append(_records(3))
+        spool.close()
+
+        path = _segment_path(directory)
+        with open(path, 'r+b') as segment:
+            segment.truncate(os.path.getsize(path) - 5)
+
+        spool = ResultSpool(directory)
+        spool.open()
+        assert spool.pending == 2
+        spool.append(_records(1, start=10))
+        records, _ = spool.read(10)
+        assert records == _records(2) + _records(1, start=10)
+        spool.close()
+
+
+def test_bad_crc_stops_replay():
+    """Запись с неверной crc и всё после неё в сегменте не передаются"""
+    with tempfile.TemporaryDirectory() as directory:
+        spool = ResultSpool(directory)
+        spool.open()
+        spool.append(_records(3))
+        spool.close()
+
+        with open(_segment_path(directory), 'r+b') as segment:
+            # Пропускаем первую запись и портим первый байт второй
+            length, _ = RECORD_HEADER.unpack(segment.read(RECORD_HEADER.size))
+            segment.seek(length + RECORD_HEADER.size, os.SEEK_CUR)
+            byte = segment.read(1)
+            segment.seek(-1, os.SEEK_CUR)
+            segment.write(bytes([byte[0] ^ 0xFF]))
+
+        spool = ResultSpool(directory)
+        spool.open()
+        assert spool.pending == 1
+        records, _ = spool.read(10)
+        assert records == _records(1)
+        spool.close()
+
+
+def test_resume_after_partial_replay():
+    """После сбоя посреди передачи журнал продолжается с сохранённой позиции"""
+    with tempfile.TemporaryDirectory() as directory:
+        spool = ResultSpool(directory)
+        spool.open()
+        spool.append(_records(5))
+        records, positions = spool.read(2)
+        assert records == _records(2)
+        spool.commit(positions[-1], len(records))
+        spool.close()
+
+        spool = ResultSpool(directory)
+        spool.open()
+        assert spool.pending == 3
+        records, positions = spool.read(10)
+        assert records == _records(3, start=2)
+        spool.commit(positions[-1], len(records))
+        assert spool.pending == 0
+        spool.close()
+
+
+def test_segments_rollover():
+    """Пакеты сверх segment_size уходят в новые сегменты, пройденные сегменты удаляются"""
+    with tempfile.TemporaryDirectory() as directory:
+        spool = ResultSpool(directory, segment_size=1)
+        spool.open()
+        for start in range(0, 9, 3):
+            spool.append(_records(3, start=start))
+        assert len(spool._segments()) == 3
+
+        replayed = []
+        while spool.pending:
+            records, positions = spool.read(2)
+            replayed += records
+            spool.commit(positions[-1], len(records))
+        assert replayed == _records(9)
+        assert spool.size() == 0
+        spool.close()
+
+
+def test_quarantine_file():
+    """Карантин - записи того же формата с текстом ошибки"""
+    with tempfile.TemporaryDirectory() as directory:
+        spool = ResultSpool(directory)
+        spool.quarantine(_records(1), 'value too long')
+
+        with open(os.path.join(directory, QUARANTINE_FILE_NAME), 'rb') as quarantine_file:
+            length, checksum = RECORD_HEADER.unpack(quarantine_file.read(RECORD_HEADER.size))
+            payload = quarantine_file.read(length)
+        assert zlib.crc32(payload) == checksum
+        entry = pickle.loads(payload)
+        assert entry['error'] == 'value too long'
+        assert entry['record'] == _records(1)[0]
+
+
+def _wait(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_writer_replays_spool_after_outage():
+    """Пока БД недоступна, результаты копятся в журнале и передаются по порядку после восстановления"""
+    with tempfile.TemporaryDirectory() as directory:
+        written = []
+        database = {'up': False}
+
+        def write_batch(log_rows, address_rows, status_changes, sample_rows):
+            if not database['up']:
+                raise OperationalError('INSERT', {}, Exception('database is locked'))
+            written.extend(row['b_id'] for row in log_rows)
+
+        writer = ResultWriter(write_batch, spool=ResultSpool(directory))
+        for row in _records(3):
+            writer.submit(row, None)
+        assert writer.flush(10)
+        assert writer.stats()['spooled'] == 3
+
+        # Новые результаты встают в журнал за прежними, чтобы сохранить порядок
+        database['up'] = True
+        for row in _records(2, start=3):
+            writer.submit(row, None)
+        assert _wait(lambda: len(written) == 5)
+        assert written == list(range(5))
+        assert writer.stats()['replayed'] == 5
+        writer.stop()
+
+
+def test_writer_quarantines_rejected_result():
+    """Отвергнутый БД результат уходит в карантин, остальные результаты пакета записываются"""
+    with tempfile.TemporaryDirectory() as directory:
+        written = []
+
+        def write_batch(log_rows, address_rows, status_changes, sample_rows):
+            if any(row['b_id'] == 1 for row in log_rows):
+                raise IntegrityError('INSERT', {}, Exception('constraint failed'))
+            written.extend(row['b_id'] for row in log_rows)
+
+        writer = ResultWriter(write_batch, spool=ResultSpool(directory))
+        for row in _records(3):
+            writer.submit(row, None)
+        assert writer.flush(10)
+        assert written == [0, 2]
+        assert writer.stats()['quarantined'] == 1
+        writer.stop()
+        assert os.path.exists(os.path.join(directory, QUARANTINE_FILE_NAME))
+
+
+if __name__ == "__main__":
+    print("Тестирование журнала результатов")
+    print("=" * 50)
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")
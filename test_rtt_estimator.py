@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Тесты адаптивного таймаута пинга (services/rtt_estimator.py)
+"""
+
+from services.rtt_estimator import RttEstimator, MIN_TIMEOUT
+
+IP = '192.168.1.1'
+MAX_TIMEOUT = 3.0
+
+
+def test_unknown_address_uses_max_timeout():
+    estimator = RttEstimator()
+    assert estimator.timeout_for(IP, MAX_TIMEOUT) == MAX_TIMEOUT
+    estimator.timed_out(IP, MAX_TIMEOUT)
+    assert estimator.timeout_for(IP, MAX_TIMEOUT) == MAX_TIMEOUT
+
+
+def test_converges_to_steady_rtt():
+    """При постоянном RTT SRTT сходится к нему, а разброс - к нулю"""
+    estimator = RttEstimator(min_timeout=0.001)
+    estimator.observe(IP, 0.5)
+    for _ in range(100):
+        estimator.observe(IP, 0.02)
+
+    state = estimator.get_state(IP)
+    assert abs(state['srtt'] - 20) < 0.1
+    assert state['rttvar'] < 0.1
+    assert abs(estimator.timeout_for(IP, MAX_TIMEOUT) - 0.02) < 0.001
+
+
+def test_timeout_bounds():
+    """Таймаут не ниже min_timeout и не выше максимума из настроек"""
+    estimator = RttEstimator()
+    for _ in range(50):
+        estimator.observe(IP, 0.001)
+    assert estimator.timeout_for(IP, MAX_TIMEOUT) == MIN_TIMEOUT
+
+    estimator.observe('10.0.0.1', 5.0)
+    assert estimator.timeout_for('10.0.0.1', MAX_TIMEOUT) == MAX_TIMEOUT
+
+
+def test_timeouts_back_off_until_reply():
+    """Таймауты удваивают RTO до максимума, ответ возвращает его к оценке по RTT"""
+    estimator = RttEstimator()
+    for _ in range(50):
+        estimator.observe(IP, 0.1)
+    rto = estimator.timeout_for(IP, MAX_TIMEOUT)
+
+    timeouts = []
+    for _ in range(8):
+        estimator.timed_out(IP, MAX_TIMEOUT)
+        timeouts.append(estimator.timeout_for(IP, MAX_TIMEOUT))
+    assert timeouts[0] == rto * 2
+    assert timeouts[1] == rto * 4
+    assert timeouts == sorted(timeouts)
+    assert timeouts[-1] == MAX_TIMEOUT
+
+    estimator.observe(IP, 0.1)
+    assert estimator.timeout_for(IP, MAX_TIMEOUT) < timeouts[0]
+
+
+def test_export_load():
+    """Оценки и увеличенный RTO переносятся в другой процесс без изменений"""
+    estimator = RttEstimator()
+    estimator.observe(IP, 0.1)
+    estimator.timed_out(IP, MAX_TIMEOUT)
+    estimator.observe('10.0.0.1', 0.2)
+
+    state = estimator.export([IP, '10.0.0.1', '10.0.0.2'])
+    assert set(state) == {IP, '10.0.0.1'}
+    assert state['10.0.0.1'][2] is None
+
+    copy = RttEstimator()
+    copy.load(state)
+    for ip in state:
+        assert copy.timeout_for(ip, MAX_TIMEOUT) == estimator.timeout_for(ip, MAX_TIMEOUT)
+
+    copy.forget(IP)
+    assert copy.timeout_for(IP, MAX_TIMEOUT) == MAX_TIMEOUT
+
+
+if __name__ == "__main__":
+    print("Тестирование адаптивного таймаута")
+    print("=" * 50)
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")